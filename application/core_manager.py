@@ -1,7 +1,23 @@
 from application.model.device_model import DeviceModel
 from application.model.location_model import LocationModel
+from application.monitoring.metrics import METRICS
+from application.monitoring.structured_logging import get_logger
+from application.processing import telemetry_downsampling
+from application.streaming.telemetry_hub import TelemetryHub
 from communication.mqtt.dto.telemetry_message import TelemetryMessage
 from data.manager.data_manager import DataManager
+import threading
+import time
+
+TELEMETRY_READINGS = METRICS.counter("iot_telemetry_readings_total",
+                                     "Telemetry readings handled by the Core Manager by result",
+                                     ("result",))
+_READINGS_STORED = TELEMETRY_READINGS.labels("stored")
+_READINGS_INVALID = TELEMETRY_READINGS.labels("invalid_message")
+_READINGS_NOT_REGISTERED = TELEMETRY_READINGS.labels("device_not_registered")
+_READINGS_STORE_ERROR = TELEMETRY_READINGS.labels("store_error")
+
+LOGGER = get_logger("core")
 
 
 class CoreManager:
@@ -11,10 +27,40 @@ class CoreManager:
     Additional dedicated methods are used to handle telemetry data from devices with a specific application logic
     """
 
+    # Seconds the telemetry store statistics are reused by the metrics gauges of a scrape
+    STORE_STATISTICS_MAX_AGE = 1.0
+
     def __init__(self, data_manager: DataManager):
         """Initialize the CoreManager with a Data Manager"""
         self.data_manager = data_manager
 
+        # Fan-out of the stored readings to the live telemetry subscribers
+        self.telemetry_hub = TelemetryHub(self.data_manager.get_device_location_id)
+
+        # Inventory and telemetry store size gauges (computed when the metrics are scraped)
+        self._store_statistics = None
+        self._store_statistics_time = 0
+        self._store_statistics_lock = threading.Lock()
+        METRICS.callback_gauge("iot_inventory_locations", "Registered locations",
+                               lambda: len(self.data_manager.location_dictionary))
+        METRICS.callback_gauge("iot_inventory_devices", "Registered devices",
+                               lambda: len(self.data_manager.device_index))
+        METRICS.callback_gauge("iot_telemetry_series", "Telemetry series (devices with telemetry data)",
+                               lambda: self.get_telemetry_store_statistics()["series"])
+        METRICS.callback_gauge("iot_telemetry_points", "Telemetry readings kept in the series",
+                               lambda: self.get_telemetry_store_statistics()["points"])
+        METRICS.callback_gauge("iot_telemetry_bytes", "Estimated bytes of the telemetry series columns",
+                               lambda: self.get_telemetry_store_statistics()["bytes"])
+
+    def get_telemetry_store_statistics(self):
+        """Return the telemetry store statistics of the data manager (reused for STORE_STATISTICS_MAX_AGE seconds)"""
+        with self._store_statistics_lock:
+            if self._store_statistics is None or \
+                    time.monotonic() - self._store_statistics_time > self.STORE_STATISTICS_MAX_AGE:
+                self._store_statistics = self.data_manager.get_telemetry_store_statistics()
+                self._store_statistics_time = time.monotonic()
+            return self._store_statistics
+
     def add_location(self, new_location: LocationModel):
         """Add a new location using the data manager"""
         self.data_manager.add_location(new_location)
@@ -55,33 +101,246 @@ class CoreManager:
         """Return a list of devices by location"""
         return self.data_manager.get_devices_by_location(location_id)
 
+    def add_locations_batch(self, location_list: list, validate_only: bool = False):
+        """Add a batch of new locations at once (nothing is added if an entry is invalid)
+        :return: List of (position in the batch, reason) of the invalid entries"""
+        return self.data_manager.add_locations_batch(location_list, validate_only)
+
+    def add_devices_batch(self, device_list: list, validate_only: bool = False):
+        """Add a batch of new devices (list of (location id, DeviceModel)) at once
+        (nothing is added if an entry is invalid)
+        :return: List of (position in the batch, reason) of the invalid entries"""
+        return self.data_manager.add_devices_batch(device_list, validate_only)
+
+    def search_devices(self, filters: dict, location_id: str = None, limit: int = None, after_device_id: str = None):
+        """Search the devices across the locations (or in a location) through the secondary indexes
+        :return: (list of DeviceModel in device id order, total number of matching devices)"""
+        return self.data_manager.search_devices(filters, location_id, limit, after_device_id)
+
+    def get_locations_in_area(self, min_latitude: float, min_longitude: float, max_latitude: float,
+                              max_longitude: float, limit: int = None):
+        """Return the locations inside a bounding box through the spatial index
+        :return: (list of LocationModel in location id order, total number of locations in the box)"""
+        return self.data_manager.get_locations_in_area(min_latitude, min_longitude, max_latitude, max_longitude, limit)
+
+    def get_devices_in_area(self, min_latitude: float, min_longitude: float, max_latitude: float,
+                            max_longitude: float, limit: int = None):
+        """Return the devices inside a bounding box through the spatial index
+        :return: (list of DeviceModel in device id order, total number of devices in the box)"""
+        return self.data_manager.get_devices_in_area(min_latitude, min_longitude, max_latitude, max_longitude, limit)
+
+    def get_nearest_locations(self, latitude: float, longitude: float, count: int, max_distance: float = None):
+        """Return the (distance in meters, LocationModel) of the count locations nearest to a point"""
+        return self.data_manager.get_nearest_locations(latitude, longitude, count, max_distance)
+
+    def get_nearest_devices(self, latitude: float, longitude: float, count: int, max_distance: float = None):
+        """Return the (distance in meters, DeviceModel) of the count devices nearest to a point"""
+        return self.data_manager.get_nearest_devices(latitude, longitude, count, max_distance)
+
+    def get_inventory_version(self):
+        """Return an opaque version of the whole inventory changing at every inventory write"""
+        return "{}-{}".format(self.data_manager.generation_epoch, self.data_manager.get_inventory_generation())
+
+    def get_location_version(self, location_id: str):
+        """Return an opaque version of a location and its devices or None if the location is not registered"""
+        generation = self.data_manager.get_location_generation(location_id)
+        if generation is None:
+            return None
+        return "{}-{}".format(self.data_manager.generation_epoch, generation)
+
+    def get_device_version(self, location_id: str, device_id: str):
+        """Return an opaque version of a device or None if the device is not registered in the location"""
+        generation = self.data_manager.get_device_generation(device_id)
+        if generation is None or self.data_manager.get_device_location_id(device_id) != location_id:
+            return None
+        return "{}-{}".format(self.data_manager.generation_epoch, generation)
+
+    def get_telemetry_version(self, device_id: str):
+        """Return an opaque version of the telemetry data of a device changing at every new reading"""
+        return "{}-{}-{}".format(self.data_manager.generation_epoch,
+                                 self.data_manager.get_device_generation(device_id),
+                                 self.data_manager.get_telemetry_version(device_id))
+
     def add_device_telemetry_data(self, device_id: str, telemetry_data: TelemetryMessage):
         """Add telemetry data for a device using the data manager"""
         self.data_manager.add_device_telemetry_data(device_id, telemetry_data)
+        self.telemetry_hub.publish([(device_id, telemetry_data)])
 
     def handle_mqtt_device_telemetry_data(self, device_id: str, device_telemetry_data: TelemetryMessage):
         """ Handle telemetry data from device """
 
         # Check request not None and instance of TelemetryMessage
         if device_telemetry_data is None or not isinstance(device_telemetry_data, TelemetryMessage):
+            _READINGS_INVALID.inc()
             raise ValueError("Invalid TelemetryMessage")
         else:
 
             # If the device is registered, update the telemetry data
             if self.data_manager.get_device_by_id(device_id) is not None:
                 self.data_manager.add_device_telemetry_data(device_id, device_telemetry_data)
-                print(f'Telemetry data received from device {device_id}')
+                _READINGS_STORED.inc()
+                self.telemetry_hub.publish([(device_id, device_telemetry_data)])
+                LOGGER.info("telemetry_received", "Telemetry data received from device", device_id=device_id)
             else:
+                _READINGS_NOT_REGISTERED.inc()
                 raise ValueError("Device not registered")
 
+    def handle_mqtt_device_telemetry_batch(self, telemetry_batch: list):
+        """
+        Handle a batch of telemetry data received from devices
+        Readings of registered devices are stored with a single batch call to the data manager,
+        only the readings it stored are published to the live subscribers
+        :param telemetry_batch: List of (device_id, TelemetryMessage) tuples
+        :return: List of (device_id, error reason) tuples for the rejected readings
+        """
+
+        accepted_batch = []
+        rejected_list = []
+        invalid_count = 0
+        not_registered_count = 0
+
+        for device_id, device_telemetry_data in telemetry_batch:
+            if device_telemetry_data is None or not isinstance(device_telemetry_data, TelemetryMessage):
+                rejected_list.append((device_id, "Invalid TelemetryMessage"))
+                invalid_count += 1
+            elif self.data_manager.get_device_by_id(device_id) is None:
+                rejected_list.append((device_id, "Device not registered"))
+                not_registered_count += 1
+            else:
+                accepted_batch.append((device_id, device_telemetry_data))
+
+        if len(accepted_batch) > 0:
+            store_error_list = self.data_manager.add_device_telemetry_data_batch(accepted_batch)
+            if len(store_error_list) > 0:
+                # Readings rejected by the data manager (e.g. a value that is not a number)
+                rejected_positions = set()
+                for position, reason in store_error_list:
+                    rejected_positions.add(position)
+                    rejected_list.append((accepted_batch[position][0], reason))
+                LOGGER.warning("store_error", "Telemetry readings rejected by the data manager",
+                               readings=len(store_error_list), reason=store_error_list[0][1])
+                accepted_batch = [reading for position, reading in enumerate(accepted_batch)
+                                  if position not in rejected_positions]
+            _READINGS_STORED.inc(len(accepted_batch))
+            self.telemetry_hub.publish(accepted_batch)
+
+        # Count the rejected readings once per batch
+        if invalid_count > 0:
+            _READINGS_INVALID.inc(invalid_count)
+        if not_registered_count > 0:
+            _READINGS_NOT_REGISTERED.inc(not_registered_count)
+        if len(rejected_list) > invalid_count + not_registered_count:
+            _READINGS_STORE_ERROR.inc(len(rejected_list) - invalid_count - not_registered_count)
+
+        return rejected_list
+
+    def subscribe_device_telemetry(self, device_id: str):
+        """Subscribe to the live telemetry readings of a device (TelemetrySubscription)"""
+        return self.telemetry_hub.subscribe(TelemetryHub.SCOPE_DEVICE, device_id)
+
+    def subscribe_location_telemetry(self, location_id: str):
+        """Subscribe to the live telemetry readings of the devices of a location (TelemetrySubscription)"""
+        return self.telemetry_hub.subscribe(TelemetryHub.SCOPE_LOCATION, location_id)
+
+    def unsubscribe_telemetry(self, subscription):
+        """Remove a live telemetry subscription"""
+        self.telemetry_hub.unsubscribe(subscription)
+
     def get_telemetry_data_by_device_id(self, device_id: str):
         """
         Get telemetry data by device id from data manager
         :param device_id: Device id associated with telemetry data
-        :return: List of telemetry data
+        :return: TelemetrySeries of the device (readings available through rows(), timestamps(), values()) or None
         """
         return self.data_manager.get_telemetry_data_by_device_id(device_id)
 
+    def get_latest_telemetry(self, device_id: str):
+        """Return the latest reading of each data type of a device (data type -> (timestamp, value))"""
+        return self.data_manager.get_latest_values(device_id)
+
+    def get_location_latest_telemetry(self, location_id: str):
+        """Return the (device id, latest readings) of every device of a location (None if the location is not found)"""
+        return self.data_manager.get_location_latest_values(location_id)
+
+    def get_telemetry_data_in_range(self, device_id: str, from_timestamp=None, to_timestamp=None, limit=None,
+                                    downsample=None, data_type=None):
+        """
+        Get the telemetry data of a device in a time range with an optional server-side downsampling
+        :param device_id: Device id associated with telemetry data
+        :param from_timestamp: Optional lower bound (included) of the time range
+        :param to_timestamp: Optional upper bound (included) of the time range
+        :param limit: Maximum number of readings. Without downsampling the most recent readings are returned,
+                      with downsampling it is the number of points of each data type
+        :param downsample: None, "avg" (bucket average) or "lttb" (Largest-Triangle-Three-Buckets)
+        :param data_type: Optional data type filter
+        :return: List of (timestamp, data_type, value) tuples in chronological order or None if the device has no data
+        """
+
+        if downsample is not None and downsample not in telemetry_downsampling.SUPPORTED_DOWNSAMPLE_MODES:
+            raise ValueError("Unsupported downsample mode ! Supported modes: " +
+                             ", ".join(telemetry_downsampling.SUPPORTED_DOWNSAMPLE_MODES))
+
+        range_limit = limit if downsample is None else None
+        telemetry_columns = self.data_manager.get_telemetry_data_in_range(device_id,
+                                                                          from_timestamp,
+                                                                          to_timestamp,
+                                                                          data_type,
+                                                                          range_limit)
+        if telemetry_columns is None:
+            return None
+
+        timestamps, data_types, values = telemetry_columns
+
+        if downsample is None or limit is None:
+            return list(zip(timestamps, data_types, values))
+
+        # Downsample each data type independently to never mix different measurements
+        type_columns = {}
+        for timestamp, reading_data_type, value in zip(timestamps, data_types, values):
+            type_timestamps, type_values = type_columns.setdefault(reading_data_type, ([], []))
+            type_timestamps.append(timestamp)
+            type_values.append(value)
+
+        downsample_function = telemetry_downsampling.bucket_average \
+            if downsample == telemetry_downsampling.DOWNSAMPLE_BUCKET_AVERAGE else telemetry_downsampling.lttb
+
+        result_list = []
+        for reading_data_type, (type_timestamps, type_values) in type_columns.items():
+            sampled_timestamps, sampled_values = downsample_function(type_timestamps, type_values, limit)
+            result_list.extend((timestamp, reading_data_type, value)
+                               for timestamp, value in zip(sampled_timestamps, sampled_values))
+
+        if len(type_columns) > 1:
+            result_list.sort(key=lambda reading: reading[0])
+
+        return result_list
+
+    def get_telemetry_page(self, device_id: str, page_size: int, cursor_timestamp=None, cursor_skip: int = 0):
+        """
+        Get a page of the telemetry data of a device from the newest to the oldest reading
+        :param page_size: Maximum number of readings of the page
+        :param cursor_timestamp: Timestamp of the cursor returned by the previous page (None for the first page)
+        :param cursor_skip: Number of readings with timestamp == cursor_timestamp already returned
+        :return: (iterator of (timestamp, data_type, value) tuples from the newest to the oldest reading,
+                  (cursor_timestamp, cursor_skip) of the next page or None, total number of readings)
+        """
+        telemetry_page = self.data_manager.get_telemetry_page(device_id, page_size, cursor_timestamp, cursor_skip)
+        if telemetry_page is None:
+            return iter(()), None, 0
+
+        (timestamps, data_types, values), next_cursor, total_count = telemetry_page
+        return zip(reversed(timestamps), reversed(data_types), reversed(values)), next_cursor, total_count
+
+    def get_telemetry_rollup(self, device_id: str, resolution: str, from_timestamp=None, to_timestamp=None,
+                             data_type=None):
+        """
+        Get the aggregated telemetry data (count, min, max, mean per bucket) of a device
+        Rollups are maintained on ingest so the cost depends on the number of buckets and not on the raw readings
+        :param resolution: Bucket width ("1m", "1h" or "1d")
+        :return: Dictionary data type -> list of (bucket_start, count, min, max, mean) tuples or None if the device has no data
+        """
+        return self.data_manager.get_telemetry_rollup(device_id, resolution, from_timestamp, to_timestamp, data_type)
+
     def is_location_registered(self, location_id: str):
         """Check if a location is registered"""
         return self.data_manager.is_location_registered(location_id)
\ No newline at end of file
@@ -1,13 +1,29 @@
 import json
+from operator import attrgetter
+
+# Shared encoder producing the cached JSON representations
+_JSON_ENCODER = json.JSONEncoder()
 
 
 class DeviceModel:
+    """
+    Inventory device. The JSON representation is serialized once and cached as bytes together with
+    the attribute values it was built from: it is serialized again only when an attribute has been updated.
+    """
 
     DEVICE_TYPE_DEFAULT = "device.default"
     DEVICE_TYPE_MOBILE = "device.mobile"
     DEVICE_TYPE_SENSOR = "device.sensor"
     DEVICE_TYPE_ACTUATOR = "device.actuator"
 
+    # Serialized attributes (in order)
+    JSON_FIELDS = ("uuid", "name", "locationId", "type", "manufacturer", "software_version", "latitude", "longitude")
+
+    __slots__ = JSON_FIELDS + ("_json",)
+
+    # Return the tuple of the serialized attribute values
+    _json_values = staticmethod(attrgetter(*JSON_FIELDS))
+
     def __init__(self, uuid, name, location_id, device_type, manufacturer, software_version, latitude, longitude):
         self.uuid = uuid
         self.name = name
@@ -18,5 +34,20 @@ class DeviceModel:
         self.latitude = latitude
         self.longitude = longitude
 
+        # (attribute values, UTF-8 JSON representation)
+        self._json = None
+
+    def to_dict(self):
+        return dict(zip(self.JSON_FIELDS, self._json_values(self)))
+
+    def to_json_bytes(self):
+        """Return the cached UTF-8 JSON representation serializing it again if an attribute has been updated"""
+        values = self._json_values(self)
+        cached_json = self._json
+        if cached_json is None or cached_json[0] != values:
+            cached_json = (values, _JSON_ENCODER.encode(dict(zip(self.JSON_FIELDS, values))).encode("utf-8"))
+            self._json = cached_json
+        return cached_json[1]
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return self.to_json_bytes().decode("utf-8")
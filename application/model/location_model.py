@@ -1,7 +1,23 @@
 import json
+from operator import attrgetter
+
+# Shared encoder producing the cached JSON representations
+_JSON_ENCODER = json.JSONEncoder()
 
 
 class LocationModel:
+    """
+    Inventory location. The JSON representation (with the id list of its devices) is serialized once and cached
+    as bytes together with the attribute values and the device dictionary it was built from: it is serialized
+    again only when an attribute has been updated or the device dictionary has been replaced (copy-on-write).
+    """
+
+    JSON_FIELDS = ("uuid", "name", "latitude", "longitude")
+
+    __slots__ = JSON_FIELDS + ("device_dictionary", "_json")
+
+    # Return the tuple of the serialized attribute values
+    _json_values = staticmethod(attrgetter(*JSON_FIELDS))
 
     def __init__(self, uuid, name, latitude, longitude):
         self.uuid = uuid
@@ -10,6 +26,9 @@ class LocationModel:
         self.longitude = longitude
         self.device_dictionary = {}
 
+        # (attribute values, device dictionary, UTF-8 JSON representation)
+        self._json = None
+
     @staticmethod
     def from_creation_dto(location_creation_request):
         return LocationModel(location_creation_request.uuid,
@@ -17,5 +36,22 @@ class LocationModel:
                              location_creation_request.latitude,
                              location_creation_request.longitude)
 
+    def to_dict(self):
+        location_dict = dict(zip(self.JSON_FIELDS, self._json_values(self)))
+        location_dict["device_list"] = list(self.device_dictionary.keys())
+        return location_dict
+
+    def to_json_bytes(self):
+        """Return the cached UTF-8 JSON representation serializing it again if the location has been updated"""
+        values = self._json_values(self)
+        device_dictionary = self.device_dictionary
+        cached_json = self._json
+        if cached_json is None or cached_json[1] is not device_dictionary or cached_json[0] != values:
+            location_dict = dict(zip(self.JSON_FIELDS, values))
+            location_dict["device_list"] = list(device_dictionary.keys())
+            cached_json = (values, device_dictionary, _JSON_ENCODER.encode(location_dict).encode("utf-8"))
+            self._json = cached_json
+        return cached_json[2]
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return self.to_json_bytes().decode("utf-8")
@@ -0,0 +1,320 @@
+"""
+Low-overhead in-process metrics (counters, gauges and latency histograms) rendered in the Prometheus text format.
+Metrics are declared once at module level on the default METRICS registry and updated on the hot paths:
+an update is a dictionary lookup for the labeled child (cached by the caller when the labels are fixed)
+and a few arithmetic operations under an uncontended lock. Gauges that describe the state of a component
+(queue depth, store size, ...) are computed by a callback only when the metrics are scraped.
+"""
+import bisect
+import math
+import re
+import threading
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds (from 100 microseconds to 10 seconds)
+DEFAULT_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                           2.5, 5.0, 10.0)
+
+_METRIC_NAME_PATTERN = re.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")
+_LABEL_NAME_PATTERN = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(label_names, label_values, extra_label=None):
+    pairs = ['{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+             for name, value in zip(label_names, label_values)]
+    if extra_label is not None:
+        pairs.append('{}="{}"'.format(*extra_label))
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+class CounterValue:
+    """Monotonic counter of a single label set
+    (explicit acquire/release: about twice as fast as a with block on the hot paths)"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        self._lock.acquire()
+        try:
+            self.value += amount
+        finally:
+            self._lock.release()
+
+
+class GaugeValue:
+    """Gauge of a single label set"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self._lock.acquire()
+        try:
+            self.value += amount
+        finally:
+            self._lock.release()
+
+    def dec(self, amount=1):
+        self._lock.acquire()
+        try:
+            self.value -= amount
+        finally:
+            self._lock.release()
+
+
+class HistogramValue:
+    """Histogram of a single label set: observation count of each bucket, sum and count"""
+
+    __slots__ = ("upper_bounds", "bucket_counts", "sum", "count", "_lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        # The last bucket counts the observations greater than every upper bound (+Inf)
+        self.bucket_counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        self._lock.acquire()
+        try:
+            self.bucket_counts[index] += 1
+            self.sum += value
+            self.count += 1
+        finally:
+            self._lock.release()
+
+
+class Metric:
+    """
+    Metric family with optional labels: labels(*values) returns the child of a label set creating it if needed.
+    A metric without labels forwards the updates to its single child.
+    """
+
+    metric_type = None
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        if not _METRIC_NAME_PATTERN.match(name):
+            raise ValueError("Error creating the metric ! Invalid name: {} !".format(name))
+        for label_name in label_names:
+            if not _LABEL_NAME_PATTERN.match(label_name) or label_name == "le":
+                raise ValueError("Error creating the metric {} ! Invalid label name: {} !".format(name, label_name))
+
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._children_lock = threading.Lock()
+        if len(self.label_names) == 0:
+            self._default_child = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *label_values):
+        """Return the child of a label set (values in the order of the label names)"""
+        child = self._children.get(label_values)
+        if child is None:
+            if len(label_values) != len(self.label_names):
+                raise ValueError("Error updating the metric {} ! Expected the labels {} !".format(self.name,
+                                                                                                self.label_names))
+            with self._children_lock:
+                child = self._children.setdefault(tuple(str(value) for value in label_values), self._new_child())
+                self._children[label_values] = child
+        return child
+
+    def _samples(self):
+        """Return the (suffix, label values, extra label, value) samples of the metric"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.documentation.replace("\\", "\\\\").replace("\n", "\\n")),
+                 "# TYPE {} {}".format(self.name, self.metric_type)]
+        for suffix, label_values, extra_label, value in self._samples():
+            lines.append("{}{}{} {}".format(self.name, suffix, _format_labels(self.label_names, label_values,
+                                                                               extra_label), _format_value(value)))
+        return lines
+
+    def _label_sets(self):
+        """Return the distinct (label values, child) pairs (children are cached under the raw and the str values)"""
+        with self._children_lock:
+            children = list(self._children.items())
+        seen = set()
+        label_sets = []
+        for label_values, child in children:
+            if id(child) not in seen:
+                seen.add(id(child))
+                label_sets.append((tuple(str(value) for value in label_values), child))
+        return sorted(label_sets, key=lambda item: item[0])
+
+
+class Counter(Metric):
+    """Monotonic counter (by convention the name ends with _total)"""
+    metric_type = "counter"
+
+    def _new_child(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self._default_child.inc(amount)
+
+    def _samples(self):
+        return [("", label_values, None, child.value) for label_values, child in self._label_sets()]
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return GaugeValue()
+
+    def set(self, value):
+        self._default_child.set(value)
+
+    def inc(self, amount=1):
+        self._default_child.inc(amount)
+
+    def dec(self, amount=1):
+        self._default_child.dec(amount)
+
+    def _samples(self):
+        return [("", label_values, None, child.value) for label_values, child in self._label_sets()]
+
+
+class CallbackGauge(Metric):
+    """
+    Gauge computed when the metrics are scraped: the callback returns a number
+    (no labels) or a dictionary label values tuple -> number
+    """
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback, label_names: tuple = ()):
+        self.callback = callback
+        super().__init__(name, documentation, label_names)
+
+    def _new_child(self):
+        return None
+
+    def _samples(self):
+        result = self.callback()
+        if len(self.label_names) == 0:
+            return [("", (), None, result)]
+        return [("", tuple(str(value) for value in label_values), None, value)
+                for label_values, value in sorted(result.items())]
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        self.upper_bounds = tuple(sorted(float(bucket) for bucket in buckets if bucket != math.inf))
+        super().__init__(name, documentation, label_names)
+
+    def _new_child(self):
+        return HistogramValue(self.upper_bounds)
+
+    def observe(self, value):
+        self._default_child.observe(value)
+
+    def _samples(self):
+        samples = []
+        for label_values, child in self._label_sets():
+            with child._lock:
+                bucket_counts = list(child.bucket_counts)
+                histogram_sum = child.sum
+                histogram_count = child.count
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(self.upper_bounds + (math.inf,), bucket_counts):
+                cumulative_count += bucket_count
+                samples.append(("_bucket", label_values, ("le", _format_value(upper_bound)), cumulative_count))
+            samples.append(("_sum", label_values, None, histogram_sum))
+            samples.append(("_count", label_values, None, histogram_count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Registry of the metrics of the application rendered in the Prometheus text format.
+    Declaring a metric that already exists returns the registered one (callback gauges are replaced
+    so the last created component instance is reported).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is not None:
+                if type(metric) is not metric_class:
+                    raise ValueError("Error registering the metric {} ! Already registered as a {} !".format(
+                        name, metric.metric_type))
+                return metric
+            metric = metric_class(name, *args, **kwargs)
+            self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()):
+        return self._register(Counter, name, documentation, label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()):
+        return self._register(Gauge, name, documentation, label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: tuple = (),
+                  buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def callback_gauge(self, name: str, documentation: str, callback, label_names: tuple = ()):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is not None and type(metric) is not CallbackGauge:
+                raise ValueError("Error registering the metric {} ! Already registered as a {} !".format(
+                    name, metric.metric_type))
+            metric = CallbackGauge(name, documentation, callback, label_names)
+            self._metrics[name] = metric
+            return metric
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Return all the metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # A failing callback must not hide the other metrics
+                lines.append("# Error collecting {}: {}".format(metric.name, str(e).replace("\n", " ")))
+        return "\n".join(lines) + "\n"
+
+
+# Default registry of the application
+METRICS = MetricsRegistry()
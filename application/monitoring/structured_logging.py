@@ -0,0 +1,272 @@
+"""
+Structured logging of the application components (mqtt, core, api, web, data, main).
+Components log named events with fields through a StructuredLogger:
+- the events of a component can be sampled (one event out of N, per event name) and the warnings and errors
+  are rate limited (at most N events per interval, per event name, the next logged event reports how many
+  have been suppressed), both decided before any LogRecord is created
+- records are handed to a bounded queue (QueueHandler) and formatted and written by a background thread
+  (QueueListener), so the hot paths never wait for the console; records are dropped and counted when the
+  queue is full
+The output (JSON lines or text), the levels, the sampling and the rate limits are configured per component
+in config/logging_conf.yaml. Without configure_logging() only warnings and errors are printed (stderr).
+"""
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+import yaml
+
+from application.monitoring.metrics import METRICS
+
+ROOT_LOGGER_NAME = "iot"
+
+LOG_FORMAT_JSON = "json"
+LOG_FORMAT_TEXT = "text"
+
+# Default logging configuration (config/logging_conf.yaml)
+DEFAULT_LOGGING_CONFIGURATION = {
+    "format": LOG_FORMAT_TEXT,
+    "level": "INFO",
+    "queue_size": 10000,
+    "components": {}
+}
+
+# Default settings of a component
+DEFAULT_COMPONENT_SETTINGS = {
+    "level": None,
+    "sample_rates": {},
+    "rate_limit": {"events": 10, "interval": 60}
+}
+
+LOG_RECORDS_DROPPED = METRICS.counter("iot_log_records_dropped_total",
+                                      "Log records dropped because the logging queue was full")
+LOG_EVENTS_SUPPRESSED = METRICS.counter("iot_log_events_suppressed_total",
+                                        "Log events not emitted because of sampling or rate limiting",
+                                        ("component", "reason"))
+
+
+class ComponentLogPolicy:
+    """Sampling intervals and rate limit of the events of a component"""
+
+    def __init__(self, sample_rates: dict = None, rate_limit_events: int = 10, rate_limit_interval: float = 60):
+        # Event name -> keep one event out of N (0: drop every event), event name -> count of the sampled events
+        # (itertools.count is incremented atomically without a lock)
+        self.sample_intervals = {}
+        self._sample_counters = {}
+        for event, sample_rate in (sample_rates or {}).items():
+            sample_rate = float(sample_rate)
+            if not 0 <= sample_rate <= 1:
+                raise ValueError("Error configuring the logging ! Invalid sample rate of {}: {} !".format(event,
+                                                                                                    sample_rate))
+            self.sample_intervals[event] = 0 if sample_rate == 0 else max(1, round(1 / sample_rate))
+            self._sample_counters[event] = itertools.count()
+        self.rate_limit_events = rate_limit_events
+        self.rate_limit_interval = rate_limit_interval
+
+        # Event name -> [window start, events in window, suppressed]
+        self._rate_windows = {}
+        self._lock = threading.Lock()
+
+    def sample(self, event: str):
+        """
+        Return the sampling interval if the event is kept (1 for the events that are not sampled),
+        0 if it is dropped
+        """
+        sample_interval = self.sample_intervals.get(event)
+        if sample_interval is None:
+            return 1
+        if sample_interval == 0:
+            return 0
+        return sample_interval if next(self._sample_counters[event]) % sample_interval == 0 else 0
+
+    def allow(self, event: str):
+        """
+        Apply the rate limit of the event
+        :return: None if the event is suppressed, otherwise the number of events suppressed since the last one
+        """
+        if self.rate_limit_events is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            window = self._rate_windows.get(event)
+            if window is None or now - window[0] >= self.rate_limit_interval:
+                suppressed = window[2] if window is not None else 0
+                self._rate_windows[event] = [now, 1, 0]
+                return suppressed
+            if window[1] < self.rate_limit_events:
+                window[1] += 1
+                suppressed = window[2]
+                window[2] = 0
+                return suppressed
+            window[2] += 1
+            return None
+
+
+# Component name -> ComponentLogPolicy (replaced by configure_logging)
+_component_policies = {}
+_default_policy = ComponentLogPolicy()
+
+
+class StructuredLogger:
+    """
+    Logger of a component emitting named events with fields, e.g.
+    LOGGER.warning("decode_error", "Error decoding MQTT message", device_id=device_id, reason=str(e))
+    """
+
+    def __init__(self, component: str):
+        self.component = component
+        self.logger = logging.getLogger("{}.{}".format(ROOT_LOGGER_NAME, component))
+        self._suppressed_sampled = LOG_EVENTS_SUPPRESSED.labels(component, "sampled")
+        self._suppressed_rate_limited = LOG_EVENTS_SUPPRESSED.labels(component, "rate_limited")
+
+    def is_enabled_for(self, level: int):
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, event: str, message: str, fields: dict, exc_info=None):
+        if not self.logger.isEnabledFor(level):
+            return
+
+        policy = _component_policies.get(self.component, _default_policy)
+        sample_interval = policy.sample(event)
+        if sample_interval == 0:
+            self._suppressed_sampled.inc()
+            return
+
+        suppressed = 0
+        if level >= logging.WARNING:
+            suppressed = policy.allow(event)
+            if suppressed is None:
+                self._suppressed_rate_limited.inc()
+                return
+
+        self.logger.log(level, message, exc_info=exc_info,
+                        extra={"event": event, "fields": fields, "sample_interval": sample_interval,
+                               "suppressed": suppressed})
+
+    def debug(self, event: str, message: str, **fields):
+        self.log(logging.DEBUG, event, message, fields)
+
+    def info(self, event: str, message: str, **fields):
+        self.log(logging.INFO, event, message, fields)
+
+    def warning(self, event: str, message: str, **fields):
+        self.log(logging.WARNING, event, message, fields)
+
+    def error(self, event: str, message: str, exc_info=None, **fields):
+        self.log(logging.ERROR, event, message, fields, exc_info=exc_info)
+
+
+def get_logger(component: str):
+    """Return the StructuredLogger of a component"""
+    return StructuredLogger(component)
+
+
+def _record_fields(record):
+    """Return the component, the event and the fields of a record (also for records of other loggers)"""
+    component = record.name[len(ROOT_LOGGER_NAME) + 1:] if record.name.startswith(ROOT_LOGGER_NAME + ".") \
+        else record.name
+    fields = dict(getattr(record, "fields", None) or {})
+    if getattr(record, "sample_interval", 1) > 1:
+        fields["sample_interval"] = record.sample_interval
+    if getattr(record, "suppressed", 0):
+        fields["suppressed"] = record.suppressed
+    return component, getattr(record, "event", None), fields
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per record: time, level, component, event, message and the fields of the event"""
+
+    def format(self, record):
+        component, event, fields = _record_fields(record)
+        document = {"time": record.created, "level": record.levelname, "component": component, "event": event,
+                    "message": record.getMessage()}
+        document.update(fields)
+        if record.exc_info:
+            document["exception"] = self.formatException(record.exc_info)
+        return json.dumps(document, default=str)
+
+
+class TextLogFormatter(logging.Formatter):
+    """Human readable line: time, level, component, event, message and key=value fields"""
+
+    def format(self, record):
+        component, event, fields = _record_fields(record)
+        line = "{} {} {} {}{}".format(self.formatTime(record), record.levelname, component,
+                                      "{}: ".format(event) if event else "", record.getMessage())
+        if len(fields) > 0:
+            line += " " + " ".join("{}={}".format(key, value) for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler handing the records to the listener thread without formatting them
+    and dropping (and counting) the records when the queue is full
+    """
+
+    def prepare(self, record):
+        # Records stay in the process: formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def configure_logging(config_file: str = None):
+    """
+    Configure the logging of the application from a configuration file (relative to the main application
+    directory) and start the background writer thread
+    :return: QueueListener of the background writer (stop() flushes the queued records)
+    """
+    global _component_policies
+
+    configuration = dict(DEFAULT_LOGGING_CONFIGURATION)
+    if config_file is not None:
+        main_app_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        with open(os.path.join(main_app_path, config_file), 'r') as file:
+            configuration.update(yaml.safe_load(file) or {})
+
+    if configuration["format"] == LOG_FORMAT_JSON:
+        formatter = JsonLogFormatter()
+    elif configuration["format"] == LOG_FORMAT_TEXT:
+        formatter = TextLogFormatter()
+    else:
+        raise ValueError("Error configuring the logging ! Unsupported format: {} !".format(configuration["format"]))
+
+    # Levels and policies of the components
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    root_logger.setLevel(configuration["level"])
+    component_policies = {}
+    for component, component_configuration in (configuration.get("components") or {}).items():
+        settings = dict(DEFAULT_COMPONENT_SETTINGS)
+        settings.update(component_configuration or {})
+        logging.getLogger("{}.{}".format(ROOT_LOGGER_NAME, component)).setLevel(settings["level"] or logging.NOTSET)
+        rate_limit = settings["rate_limit"]
+        component_policies[component] = ComponentLogPolicy(settings["sample_rates"],
+                                                           rate_limit["events"] if rate_limit else None,
+                                                           rate_limit["interval"] if rate_limit else 0)
+    _component_policies = component_policies
+
+    # Bounded queue drained by the background writer thread
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+    log_queue = queue.Queue(maxsize=int(configuration["queue_size"]))
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(DroppingQueueHandler(log_queue))
+    root_logger.propagate = False
+
+    queue_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    queue_listener.start()
+    return queue_listener
@@ -0,0 +1,107 @@
+"""
+Server-side downsampling of telemetry time-series.
+Both functions work on chronologically sorted timestamp and value sequences
+and return the downsampled (timestamps, values) lists.
+"""
+
+DOWNSAMPLE_BUCKET_AVERAGE = "avg"
+DOWNSAMPLE_LTTB = "lttb"
+
+SUPPORTED_DOWNSAMPLE_MODES = (DOWNSAMPLE_BUCKET_AVERAGE, DOWNSAMPLE_LTTB)
+
+
+def bucket_average(timestamps, values, bucket_count):
+    """
+    Split the time interval covered by the readings in bucket_count equal-width buckets
+    and return the average timestamp and value of every non-empty bucket
+    """
+    size = len(timestamps)
+    if bucket_count <= 0 or size <= bucket_count:
+        return list(timestamps), list(values)
+
+    first_timestamp = timestamps[0]
+    bucket_width = (timestamps[-1] - first_timestamp) / bucket_count
+    if bucket_width <= 0:
+        return [sum(timestamps) / size], [sum(values) / size]
+
+    result_timestamps = []
+    result_values = []
+
+    current_bucket = None
+    timestamp_sum = value_sum = 0.0
+    count = 0
+
+    for timestamp, value in zip(timestamps, values):
+        bucket = min(int((timestamp - first_timestamp) / bucket_width), bucket_count - 1)
+        if bucket != current_bucket:
+            if count > 0:
+                result_timestamps.append(timestamp_sum / count)
+                result_values.append(value_sum / count)
+            current_bucket = bucket
+            timestamp_sum = value_sum = 0.0
+            count = 0
+        timestamp_sum += timestamp
+        value_sum += value
+        count += 1
+
+    if count > 0:
+        result_timestamps.append(timestamp_sum / count)
+        result_values.append(value_sum / count)
+
+    return result_timestamps, result_values
+
+
+def lttb(timestamps, values, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling: keep threshold readings (first and last included)
+    selecting in each bucket the reading forming the largest triangle with the previously selected
+    reading and the average of the next bucket, preserving the visual shape of the series
+    """
+    size = len(timestamps)
+    if threshold <= 0 or threshold >= size:
+        return list(timestamps), list(values)
+    if threshold < 3:
+        indexes = [0, size - 1][:threshold]
+        return [timestamps[index] for index in indexes], [values[index] for index in indexes]
+
+    result_timestamps = [timestamps[0]]
+    result_values = [values[0]]
+
+    # Readings between the first and the last one are split in threshold - 2 buckets
+    bucket_size = (size - 2) / (threshold - 2)
+    selected = 0
+
+    for bucket in range(threshold - 2):
+
+        # Average point of the next bucket (the last reading for the last bucket)
+        next_start = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, size)
+        if next_start >= next_end:
+            next_start, next_end = size - 1, size
+        next_count = next_end - next_start
+        average_timestamp = sum(timestamps[next_start:next_end]) / next_count
+        average_value = sum(values[next_start:next_end]) / next_count
+
+        # Select the reading of the current bucket with the largest triangle area
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        selected_timestamp = timestamps[selected]
+        selected_value = values[selected]
+
+        max_area = -1.0
+        max_index = start
+        for index in range(start, end):
+            area = abs((selected_timestamp - average_timestamp) * (values[index] - selected_value) -
+                       (selected_timestamp - timestamps[index]) * (average_value - selected_value))
+            if area > max_area:
+                max_area = area
+                max_index = index
+
+        result_timestamps.append(timestamps[max_index])
+        result_values.append(values[max_index])
+        selected = max_index
+
+    result_timestamps.append(timestamps[-1])
+    result_values.append(values[-1])
+
+    return result_timestamps, result_values
@@ -0,0 +1,165 @@
+"""
+Fan-out hub of the live telemetry readings: subscribers (e.g. the Server-Sent Events streams of the Web Server)
+receive the new readings of a device or of all the devices of a location as they are stored.
+The ingest path only hands each stored batch to a bounded queue (nothing at all when nobody is subscribed);
+a dispatcher thread resolves the subscribers and appends the readings to their bounded buffers.
+A subscriber whose buffer is full is closed (slow consumer) instead of slowing down the dispatch
+or growing without bound.
+"""
+import collections
+import queue
+import threading
+
+from application.monitoring.metrics import METRICS
+
+HUB_BATCHES_DROPPED = METRICS.counter("iot_telemetry_hub_batches_dropped_total",
+                                      "Telemetry batches not dispatched to the live subscribers because the hub "
+                                      "queue was full")
+HUB_SLOW_SUBSCRIBERS = METRICS.counter("iot_telemetry_hub_slow_subscribers_total",
+                                       "Live telemetry subscribers closed because their buffer was full")
+
+
+class TelemetrySubscription:
+    """
+    Subscription to the live readings of a device or a location: readings are buffered
+    until they are taken by the subscriber with wait_readings()
+    """
+
+    def __init__(self, hub, scope: str, key: str, buffer_size: int):
+        self.hub = hub
+        self.scope = scope
+        self.key = key
+        self.buffer_size = buffer_size
+        self.closed = False
+        # True if the subscription was closed because its buffer was full
+        self.overflowed = False
+        self._readings = collections.deque()
+        self._ready_event = threading.Event()
+
+    def push(self, device_id: str, telemetry_data):
+        """Buffer a reading (called by the dispatcher thread)
+        :return: False if the buffer is full"""
+        if len(self._readings) >= self.buffer_size:
+            return False
+        self._readings.append((device_id, telemetry_data))
+        self._ready_event.set()
+        return True
+
+    def wait_readings(self, timeout: float):
+        """
+        Wait at most timeout seconds for new readings
+        :return: List of (device_id, TelemetryMessage) tuples (empty on timeout or when the subscription is closed)
+        """
+        if len(self._readings) == 0 and not self.closed:
+            self._ready_event.wait(timeout)
+        # Clear before draining: a reading pushed after the drain sets the event again
+        self._ready_event.clear()
+        readings = []
+        while self._readings:
+            readings.append(self._readings.popleft())
+        return readings
+
+    def close(self, overflowed: bool = False):
+        self.overflowed = self.overflowed or overflowed
+        self.closed = True
+        self._ready_event.set()
+
+
+class TelemetryHub:
+    """
+    Fan-out hub of the stored telemetry readings to the live subscribers of a device or a location
+    :param location_resolver: Function returning the location id of a device (or None)
+    """
+
+    SCOPE_DEVICE = "device"
+    SCOPE_LOCATION = "location"
+
+    DEFAULT_BUFFER_SIZE = 1000
+    DEFAULT_QUEUE_SIZE = 10000
+
+    def __init__(self, location_resolver, buffer_size: int = DEFAULT_BUFFER_SIZE, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.location_resolver = location_resolver
+        self.buffer_size = buffer_size
+
+        # Device id / location id -> tuple of subscriptions (copy-on-write: the dispatcher iterates them without lock)
+        self._subscribers = {self.SCOPE_DEVICE: {}, self.SCOPE_LOCATION: {}}
+        self._subscriber_count = 0
+        self._lock = threading.Lock()
+
+        # Stored batches waiting for the dispatcher thread (started with the first subscription)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._dispatcher_thread = None
+
+        METRICS.callback_gauge("iot_telemetry_hub_subscribers", "Live telemetry subscribers",
+                               lambda: self._subscriber_count)
+
+    def subscribe(self, scope: str, key: str):
+        """Subscribe to the live readings of a device (SCOPE_DEVICE) or of the devices of a location (SCOPE_LOCATION)"""
+        if scope not in self._subscribers:
+            raise ValueError("Error subscribing to the telemetry ! Unsupported scope: {} !".format(scope))
+
+        subscription = TelemetrySubscription(self, scope, key, self.buffer_size)
+        with self._lock:
+            scope_subscribers = dict(self._subscribers[scope])
+            scope_subscribers[key] = scope_subscribers.get(key, ()) + (subscription,)
+            self._subscribers[scope] = scope_subscribers
+            self._subscriber_count += 1
+
+            if self._dispatcher_thread is None:
+                self._dispatcher_thread = threading.Thread(target=self.dispatch, name="telemetry-hub", daemon=True)
+                self._dispatcher_thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: TelemetrySubscription, overflowed: bool = False):
+        """Remove and close a subscription (nothing happens if it was already removed)"""
+        with self._lock:
+            scope_subscribers = self._subscribers[subscription.scope]
+            key_subscribers = scope_subscribers.get(subscription.key, ())
+            if subscription in key_subscribers:
+                scope_subscribers = dict(scope_subscribers)
+                key_subscribers = tuple(item for item in key_subscribers if item is not subscription)
+                if len(key_subscribers) > 0:
+                    scope_subscribers[subscription.key] = key_subscribers
+                else:
+                    del scope_subscribers[subscription.key]
+                self._subscribers[subscription.scope] = scope_subscribers
+                self._subscriber_count -= 1
+        subscription.close(overflowed)
+
+    def get_subscriber_count(self):
+        return self._subscriber_count
+
+    def publish(self, telemetry_batch: list):
+        """
+        Hand a batch of stored (device_id, TelemetryMessage) tuples to the dispatcher thread without blocking:
+        the batch is dropped if nobody is subscribed or if the hub queue is full
+        """
+        if self._subscriber_count == 0:
+            return
+        try:
+            self._queue.put_nowait(telemetry_batch)
+        except queue.Full:
+            HUB_BATCHES_DROPPED.inc()
+
+    def dispatch(self):
+        """Append the published readings to the buffers of their subscribers"""
+        while True:
+            telemetry_batch = self._queue.get()
+
+            device_subscribers = self._subscribers[self.SCOPE_DEVICE]
+            location_subscribers = self._subscribers[self.SCOPE_LOCATION]
+            overflowed_list = []
+
+            for device_id, telemetry_data in telemetry_batch:
+                subscriptions = device_subscribers.get(device_id, ())
+                if len(location_subscribers) > 0:
+                    subscriptions += location_subscribers.get(self.location_resolver(device_id), ())
+                for subscription in subscriptions:
+                    if not subscription.push(device_id, telemetry_data) and not subscription.closed:
+                        overflowed_list.append(subscription)
+
+            # Close the slow subscribers (a subscription can overflow on several readings of the batch)
+            for subscription in set(overflowed_list):
+                if not subscription.closed:
+                    HUB_SLOW_SUBSCRIBERS.inc()
+                    self.unsubscribe(subscription, overflowed=True)
@@ -0,0 +1,41 @@
+import json
+
+from communication.codec.schema_decoder import FIELD_NUMBER, FIELD_STRING, SchemaDecoder, SchemaField
+
+
+class DeviceImportRequest:
+    """Device line of a bulk import (same fields as the exported device representation)"""
+
+    __slots__ = ("uuid", "name", "location_id", "type", "manufacturer", "software_version", "latitude", "longitude")
+
+    def __init__(self, uuid, name, location_id, device_type, manufacturer, software_version, latitude, longitude):
+        self.uuid = uuid
+        self.name = name
+        self.location_id = location_id
+        self.type = device_type
+        self.manufacturer = manufacturer
+        self.software_version = software_version
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @staticmethod
+    def from_json(payload):
+        """Decode and validate a JSON line (bytes or str) raising a DecodeError with the invalid fields"""
+        return DEVICE_IMPORT_REQUEST_DECODER.decode(payload)
+
+    def to_json(self):
+        return json.dumps({"uuid": self.uuid, "name": self.name, "locationId": self.location_id, "type": self.type,
+                           "manufacturer": self.manufacturer, "software_version": self.software_version,
+                           "latitude": self.latitude, "longitude": self.longitude})
+
+
+DEVICE_IMPORT_REQUEST_DECODER = SchemaDecoder(DeviceImportRequest, (
+    SchemaField("uuid", FIELD_STRING),
+    SchemaField("name", FIELD_STRING),
+    SchemaField("locationId", FIELD_STRING),
+    SchemaField("type", FIELD_STRING),
+    SchemaField("manufacturer", FIELD_STRING, nullable=True),
+    SchemaField("software_version", FIELD_STRING, nullable=True),
+    SchemaField("latitude", FIELD_NUMBER, nullable=True),
+    SchemaField("longitude", FIELD_NUMBER, nullable=True)
+))
@@ -1,8 +1,12 @@
 import json
 
+from communication.codec.schema_decoder import FIELD_NUMBER, FIELD_STRING, SchemaDecoder, SchemaField
+
 
 class DeviceUpdateRequest:
 
+    __slots__ = ("uuid", "name", "type", "manufacturer", "software_version", "latitude", "longitude")
+
     def __init__(self, uuid, name, device_type, manufacturer, software_version, latitude, longitude):
         self.uuid = uuid
         self.name = name
@@ -12,5 +16,23 @@ class DeviceUpdateRequest:
         self.latitude = latitude
         self.longitude = longitude
 
+    @staticmethod
+    def from_json(payload):
+        """Decode and validate a JSON request body (bytes or str) raising a DecodeError with the invalid fields"""
+        return DEVICE_UPDATE_REQUEST_DECODER.decode(payload)
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return json.dumps({"uuid": self.uuid, "name": self.name, "device_type": self.type,
+                           "manufacturer": self.manufacturer, "software_version": self.software_version,
+                           "latitude": self.latitude, "longitude": self.longitude})
+
+
+DEVICE_UPDATE_REQUEST_DECODER = SchemaDecoder(DeviceUpdateRequest, (
+    SchemaField("uuid", FIELD_STRING),
+    SchemaField("name", FIELD_STRING),
+    SchemaField("device_type", FIELD_STRING),
+    SchemaField("manufacturer", FIELD_STRING, nullable=True),
+    SchemaField("software_version", FIELD_STRING, nullable=True),
+    SchemaField("latitude", FIELD_NUMBER, nullable=True),
+    SchemaField("longitude", FIELD_NUMBER, nullable=True)
+))
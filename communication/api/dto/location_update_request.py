@@ -1,13 +1,30 @@
 import json
 
+from communication.codec.schema_decoder import FIELD_NUMBER, FIELD_STRING, SchemaDecoder, SchemaField
+
 
 class LocationUpdateRequest:
 
+    __slots__ = ("uuid", "name", "latitude", "longitude")
+
     def __init__(self, uuid, name, latitude, longitude):
         self.uuid = uuid
         self.name = name
         self.latitude = latitude
         self.longitude = longitude
 
+    @staticmethod
+    def from_json(payload):
+        """Decode and validate a JSON request body (bytes or str) raising a DecodeError with the invalid fields"""
+        return LOCATION_UPDATE_REQUEST_DECODER.decode(payload)
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return json.dumps({"uuid": self.uuid, "name": self.name, "latitude": self.latitude, "longitude": self.longitude})
+
+
+LOCATION_UPDATE_REQUEST_DECODER = SchemaDecoder(LocationUpdateRequest, (
+    SchemaField("uuid", FIELD_STRING),
+    SchemaField("name", FIELD_STRING),
+    SchemaField("latitude", FIELD_NUMBER, nullable=True),
+    SchemaField("longitude", FIELD_NUMBER, nullable=True)
+))
@@ -0,0 +1,16 @@
+import json
+
+
+class TelemetryDataResponse:
+
+    def __init__(self, device_id, location_id, from_timestamp, to_timestamp, downsample, telemetry_data):
+        self.device_id = device_id
+        self.location_id = location_id
+        self.from_timestamp = from_timestamp
+        self.to_timestamp = to_timestamp
+        self.downsample = downsample
+        self.count = len(telemetry_data)
+        self.telemetry_data = telemetry_data
+
+    def to_json(self):
+        return json.dumps(self, default=lambda o: o.__dict__)
@@ -0,0 +1,15 @@
+import json
+
+
+class TelemetryRollupResponse:
+
+    def __init__(self, device_id, location_id, resolution, from_timestamp, to_timestamp, rollups):
+        self.device_id = device_id
+        self.location_id = location_id
+        self.resolution = resolution
+        self.from_timestamp = from_timestamp
+        self.to_timestamp = to_timestamp
+        self.rollups = rollups
+
+    def to_json(self):
+        return json.dumps(self, default=lambda o: o.__dict__)
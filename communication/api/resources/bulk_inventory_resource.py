@@ -0,0 +1,125 @@
+import io
+
+from flask import request
+from flask_restful import Resource, reqparse, inputs
+
+from application.core_manager import CoreManager
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from communication.api.dto.device_import_request import DeviceImportRequest
+from communication.api.dto.location_creation_request import LocationCreationRequest
+from communication.codec.schema_decoder import DecodeError
+from communication.http.conditional_response import is_not_modified, not_modified_response, with_etag
+from communication.http.json_response import ndjson_stream_response
+
+
+class BulkInventoryResource(Resource):
+    """
+    Bulk export and import of the locations or of the devices as newline-delimited JSON (one item per line).
+    The export streams the cached JSON representation of every item of the current inventory snapshot,
+    the import accepts the same representation (e.g. the output of an export) and adds every line in a single
+    DataManager batch: the lines are decoded and validated in one pass and nothing is imported if a line is invalid,
+    the invalid lines are reported with their line number.
+    """
+
+    ITEM_TYPE_LOCATION = "location"
+    ITEM_TYPE_DEVICE = "device"
+
+    # Maximum number of lines of an import and of invalid lines reported in the error response
+    MAX_IMPORT_LINES = 100000
+    MAX_REPORTED_ERRORS = 1000
+
+    def __init__(self, **kwargs):
+        self.core_manager: CoreManager = kwargs['core_manager']
+        self.item_type = kwargs['item_type']
+
+    def get(self):
+        """Export the locations (with their device id list) or the devices (optionally of a single location)"""
+
+        etag = self.core_manager.get_inventory_version()
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        parser = reqparse.RequestParser()
+        parser.add_argument('location_id', location='args')
+        args = parser.parse_args()
+
+        # Locations of the current snapshot (never mutated, so it can be iterated while the response is streamed)
+        if args['location_id'] is not None:
+            location = self.core_manager.get_location_by_id(args['location_id'])
+            if location is None:
+                return {'error': "Location Not Found !"}, 404
+            location_list = [location]
+        else:
+            location_list = self.core_manager.get_all_locations()
+
+        if self.item_type == self.ITEM_TYPE_LOCATION:
+            fragment_iterable = (location.to_json_bytes() for location in location_list)
+        else:
+            fragment_iterable = (device.to_json_bytes() for location in location_list
+                                 for device in location.device_dictionary.values())
+
+        return with_etag(ndjson_stream_response(fragment_iterable, 200), etag)
+
+    def post(self):
+        """Import new locations or devices (the ids must not be registered yet)"""
+
+        parser = reqparse.RequestParser()
+        parser.add_argument('dry_run', type=inputs.boolean, location='args', default=False)
+        args = parser.parse_args()
+
+        # Decode the lines as they are read from the request body (empty lines are ignored), through a buffered
+        # reader since the raw request stream reads a line byte by byte
+        line_number_list = []
+        item_list = []
+        error_list = []
+        line_number = 0
+        for line in io.BufferedReader(request.stream):
+            line_number += 1
+            if line.strip() == b"":
+                continue
+            if len(line_number_list) + len(error_list) >= self.MAX_IMPORT_LINES:
+                return {'error': "Too many lines ! At most {} items can be imported at once".format(
+                    self.MAX_IMPORT_LINES)}, 413
+            try:
+                item_list.append(self.decode_line(line))
+                line_number_list.append(line_number)
+            except DecodeError as e:
+                error_list.append((line_number, str(e)))
+
+        # Validate the decoded items against the inventory (added only if every line is valid)
+        validate_only = args['dry_run'] or len(error_list) > 0
+        try:
+            if self.item_type == self.ITEM_TYPE_LOCATION:
+                batch_error_list = self.core_manager.add_locations_batch(item_list, validate_only)
+            else:
+                batch_error_list = self.core_manager.add_devices_batch(item_list, validate_only)
+        except Exception as e:
+            return {'error': "Generic Internal Server Error ! Reason: " + str(e)}, 500
+
+        error_list.extend((line_number_list[position], reason) for position, reason in batch_error_list)
+        if len(error_list) > 0:
+            error_list.sort()
+            return {'error': "Invalid import ! {} invalid lines, nothing has been imported".format(len(error_list)),
+                    'invalid_lines': [{'line': line_number, 'error': reason}
+                                      for line_number, reason in error_list[:self.MAX_REPORTED_ERRORS]]}, 400
+
+        if args['dry_run']:
+            return {'validated': len(item_list)}, 200
+        return {'imported': len(item_list)}, 201
+
+    def decode_line(self, line):
+        """Decode a line into a LocationModel or into a (location id, DeviceModel) tuple"""
+        if self.item_type == self.ITEM_TYPE_LOCATION:
+            return LocationModel.from_creation_dto(LocationCreationRequest.from_json(line))
+
+        device_import_request = DeviceImportRequest.from_json(line)
+        return (device_import_request.location_id,
+                DeviceModel(device_import_request.uuid,
+                            device_import_request.name,
+                            device_import_request.location_id,
+                            device_import_request.type,
+                            device_import_request.manufacturer,
+                            device_import_request.software_version,
+                            device_import_request.latitude,
+                            device_import_request.longitude))
@@ -1,8 +1,10 @@
-from json import JSONDecodeError
 from flask import request, Response
 from flask_restful import Resource
 from application.core_manager import CoreManager
+from communication.codec.schema_decoder import DecodeError
 from communication.api.dto.device_update_request import DeviceUpdateRequest
+from communication.http.conditional_response import is_not_modified, not_modified_response, with_etag
+from communication.http.json_response import json_bytes_response
 from application.model.device_model import DeviceModel
 
 
@@ -14,14 +16,19 @@ class DeviceResource(Resource):
     def get(self, location_id, device_id):
         """ Retrieve a specific device by its UUID """
 
+        etag = self.core_manager.get_device_version(location_id, device_id)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
         # Check if the provided Location Id in the path is correct
         if self.core_manager.is_location_registered(location_id):
 
             # Retrieve Location through its location_id
             target_location = self.core_manager.get_location_by_id(location_id)
 
-            if device_id in target_location.device_dictionary:
-                return target_location.device_dictionary[device_id].__dict__, 200  # return data and 200 OK code
+            device = target_location.device_dictionary.get(device_id)
+            if device is not None:
+                return with_etag(json_bytes_response(device.to_json_bytes(), 200), etag)  # return data and 200 OK code
             else:
                 return {'error': "Device Not Found !"}, 404
 
@@ -61,9 +68,8 @@ class DeviceResource(Resource):
                 target_location = self.core_manager.get_location_by_id(location_id)
 
                 if device_id in target_location.device_dictionary:
-                    # The boolean flag force the parsing of POST data as JSON irrespective of the mimetype
-                    json_data = request.get_json(force=True)
-                    device_update_request = DeviceUpdateRequest(**json_data)
+                    # Decode and validate the raw request body irrespective of the mimetype
+                    device_update_request = DeviceUpdateRequest.from_json(request.get_data())
                     if device_update_request.uuid != device_id:
                         return {'error': "UUID mismatch between body and resource"}, 400
                     else:
@@ -83,7 +89,7 @@ class DeviceResource(Resource):
                     return {'error': "Device UUID not found"}, 404
             else:
                 return {'error': "Location Not Found !"}, 404
-        except JSONDecodeError:
-            return {'error': "Invalid JSON ! Check the request"}, 400
+        except DecodeError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': "Generic Internal Server Error ! Reason: " + str(e)}, 500
@@ -0,0 +1,58 @@
+from flask_restful import Resource, reqparse
+
+from application.core_manager import CoreManager
+from communication.http.conditional_response import is_not_modified, not_modified_response, with_etag
+from communication.http.json_response import join_json_fragments, json_bytes_response
+
+
+class DeviceSearchResource(Resource):
+    """
+    Search of the devices across all the locations (or in a single location) combining filters on the
+    indexed attributes (type, manufacturer, software_version). Results are returned in device id order,
+    the next page is requested with the id of the last returned device as the after parameter and the total
+    number of matching devices is returned in the X-Total-Count header.
+    """
+
+    # Default and maximum number of devices returned by a single request
+    DEFAULT_LIMIT = 1000
+    MAX_LIMIT = 10000
+
+    # Query arguments filtering the indexed device attributes
+    FILTER_ARGUMENTS = ("type", "manufacturer", "software_version")
+
+    def __init__(self, **kwargs):
+        self.core_manager: CoreManager = kwargs['core_manager']
+
+    def get(self):
+        """Retrieve the devices matching every provided filter"""
+
+        etag = self.core_manager.get_inventory_version()
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        # Check for query arguments
+        parser = reqparse.RequestParser()
+        for filter_argument in self.FILTER_ARGUMENTS:
+            parser.add_argument(filter_argument, location='args')
+        parser.add_argument('location_id', location='args')
+        parser.add_argument('limit', type=int, location='args', default=self.DEFAULT_LIMIT)
+        parser.add_argument('after', location='args')
+        args = parser.parse_args()
+
+        limit = args['limit']
+        if limit <= 0 or limit > self.MAX_LIMIT:
+            return {'error': "Invalid limit ! The limit must be between 1 and {}".format(self.MAX_LIMIT)}, 400
+
+        filters = {filter_argument: args[filter_argument] for filter_argument in self.FILTER_ARGUMENTS
+                   if args[filter_argument] is not None}
+
+        try:
+            device_list, total_count = self.core_manager.search_devices(filters, args['location_id'], limit,
+                                                                        args['after'])
+        except IndexError:
+            return {'error': "Location Not Found !"}, 404
+
+        # Concatenate the cached JSON representations of the devices
+        response = json_bytes_response(join_json_fragments([device.to_json_bytes() for device in device_list]), 200)
+        response.headers['X-Total-Count'] = str(total_count)
+        return with_etag(response, etag)
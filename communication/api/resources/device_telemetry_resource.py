@@ -0,0 +1,68 @@
+from flask_restful import Resource, reqparse
+from application.core_manager import CoreManager
+from communication.api.dto.telemetry_data_response import TelemetryDataResponse
+
+
+class DeviceTelemetryResource(Resource):
+
+    # Default and maximum number of readings returned by a single request
+    DEFAULT_LIMIT = 1000
+    MAX_LIMIT = 100000
+
+    def __init__(self, **kwargs):
+        self.core_manager: CoreManager = kwargs['core_manager']
+
+    def get(self, location_id, device_id):
+        """ Retrieve the telemetry data of a device in a time range with an optional downsampling """
+
+        # Check if the provided Location Id in the path is correct
+        if self.core_manager.is_location_registered(location_id):
+
+            # Retrieve Location through its location_id
+            target_location = self.core_manager.get_location_by_id(location_id)
+
+            if device_id not in target_location.device_dictionary:
+                return {'error': "Device Not Found !"}, 404
+
+            # Check for query arguments
+            parser = reqparse.RequestParser()
+            parser.add_argument('from', type=float, location='args')
+            parser.add_argument('to', type=float, location='args')
+            parser.add_argument('limit', type=int, location='args', default=self.DEFAULT_LIMIT)
+            parser.add_argument('downsample', location='args')
+            parser.add_argument('data_type', location='args')
+            args = parser.parse_args()
+
+            limit = args['limit']
+            if limit <= 0 or limit > self.MAX_LIMIT:
+                return {'error': "Invalid limit ! The limit must be between 1 and {}".format(self.MAX_LIMIT)}, 400
+
+            if args['from'] is not None and args['to'] is not None and args['from'] > args['to']:
+                return {'error': "Invalid time range ! 'from' must be lower than or equal to 'to'"}, 400
+
+            try:
+                telemetry_list = self.core_manager.get_telemetry_data_in_range(device_id,
+                                                                               args['from'],
+                                                                               args['to'],
+                                                                               limit,
+                                                                               args['downsample'],
+                                                                               args['data_type'])
+            except ValueError as e:
+                return {'error': str(e)}, 400
+
+            # Build a serializable telemetry list
+            telemetry_data = []
+            for timestamp, data_type, value in telemetry_list or []:
+                telemetry_data.append({'timestamp': timestamp, 'data_type': data_type, 'value': value})
+
+            telemetry_data_response = TelemetryDataResponse(device_id,
+                                                            location_id,
+                                                            args['from'],
+                                                            args['to'],
+                                                            args['downsample'],
+                                                            telemetry_data)
+
+            return telemetry_data_response.__dict__, 200  # return data and 200 OK code
+
+        else:
+            return {'error': "Location Not Found !"}, 404
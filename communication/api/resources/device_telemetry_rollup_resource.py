@@ -0,0 +1,61 @@
+from flask_restful import Resource, reqparse
+from application.core_manager import CoreManager
+from communication.api.dto.telemetry_rollup_response import TelemetryRollupResponse
+
+
+class DeviceTelemetryRollupResource(Resource):
+
+    DEFAULT_RESOLUTION = "1h"
+
+    def __init__(self, **kwargs):
+        self.core_manager: CoreManager = kwargs['core_manager']
+
+    def get(self, location_id, device_id):
+        """ Retrieve the aggregated telemetry data (count, min, max, mean per bucket) of a device """
+
+        # Check if the provided Location Id in the path is correct
+        if self.core_manager.is_location_registered(location_id):
+
+            # Retrieve Location through its location_id
+            target_location = self.core_manager.get_location_by_id(location_id)
+
+            if device_id not in target_location.device_dictionary:
+                return {'error': "Device Not Found !"}, 404
+
+            # Check for query arguments
+            parser = reqparse.RequestParser()
+            parser.add_argument('resolution', location='args', default=self.DEFAULT_RESOLUTION)
+            parser.add_argument('from', type=float, location='args')
+            parser.add_argument('to', type=float, location='args')
+            parser.add_argument('data_type', location='args')
+            args = parser.parse_args()
+
+            try:
+                rollup_dictionary = self.core_manager.get_telemetry_rollup(device_id,
+                                                                           args['resolution'],
+                                                                           args['from'],
+                                                                           args['to'],
+                                                                           args['data_type'])
+            except ValueError as e:
+                return {'error': str(e)}, 400
+
+            # Build a serializable rollup dictionary
+            rollups = {}
+            for data_type, bucket_list in (rollup_dictionary or {}).items():
+                rollups[data_type] = [{'timestamp': bucket_start,
+                                       'count': count,
+                                       'min': minimum,
+                                       'max': maximum,
+                                       'mean': mean} for bucket_start, count, minimum, maximum, mean in bucket_list]
+
+            telemetry_rollup_response = TelemetryRollupResponse(device_id,
+                                                                location_id,
+                                                                args['resolution'],
+                                                                args['from'],
+                                                                args['to'],
+                                                                rollups)
+
+            return telemetry_rollup_response.__dict__, 200  # return data and 200 OK code
+
+        else:
+            return {'error': "Location Not Found !"}, 404
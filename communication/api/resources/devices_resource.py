@@ -1,9 +1,11 @@
-from json import JSONDecodeError
 from flask import request, Response
 from flask_restful import Resource, reqparse
 
 from application.core_manager import CoreManager
+from communication.codec.schema_decoder import DecodeError
 from communication.api.dto.device_creation_request import DeviceCreationRequest
+from communication.http.conditional_response import is_not_modified, not_modified_response, with_etag
+from communication.http.json_response import join_json_fragments, json_bytes_response
 from application.model.device_model import DeviceModel
 
 
@@ -21,9 +23,8 @@ class DevicesResource(Resource):
                 # Retrieve Location through its location_id
                 target_location = self.core_manager.get_location_by_id(location_id)
 
-                # The boolean flag force the parsing of POST data as JSON irrespective of the mimetype
-                json_data = request.get_json(force=True)
-                device_creation_request = DeviceCreationRequest(**json_data)
+                # Decode and validate the raw request body irrespective of the mimetype
+                device_creation_request = DeviceCreationRequest.from_json(request.get_data())
 
                 # Check if the device is new or if it already exists
                 if device_creation_request.uuid in target_location.device_dictionary:
@@ -44,14 +45,18 @@ class DevicesResource(Resource):
                     return Response(status=201, headers={"Location": request.url+"/"+new_device_model.uuid})  # Force the No-Content Response
             else:
                 return {'error': "Location Not Found !"}, 404
-        except JSONDecodeError:
-            return {'error': "Invalid JSON ! Check the request"}, 400
+        except DecodeError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': "Generic Internal Server Error ! Reason: " + str(e)}, 500
 
     def get(self, location_id):
         """Retrieve the list of Devices associated to a specific Location"""
 
+        etag = self.core_manager.get_location_version(location_id)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
         # Check if the provided Location Id in the path is correct
         if self.core_manager.is_location_registered(location_id):
 
@@ -64,19 +69,19 @@ class DevicesResource(Resource):
             args = parser.parse_args()
 
             # Retrieve filter values
-            type_filter = None
-            if "type" in args:
-                type_filter = args["type"]
+            type_filter = args["type"]
 
-            # Retrieve Location through its location_id
-            target_location = self.core_manager.get_location_by_id(location_id)
+            if type_filter is not None:
+                # Devices of the type in the location through the secondary index
+                device_list, _ = self.core_manager.search_devices({"type": type_filter}, location_id)
+            else:
+                # Retrieve Location through its location_id
+                device_list = self.core_manager.get_location_by_id(location_id).device_dictionary.values()
 
-            # Iterate over the dictionary to build a serializable device list
-            device_list = []
-            for device in target_location.device_dictionary.values():
-                device_list.append(device.__dict__)
+            # Concatenate the cached JSON representations of the devices
+            device_json_list = [device.to_json_bytes() for device in device_list]
 
-            return device_list, 200  # return data and 200 OK code
+            return with_etag(json_bytes_response(join_json_fragments(device_json_list), 200), etag)  # return data and 200 OK code
 
         else:
             return {'error': "Location Not Found !"}, 404
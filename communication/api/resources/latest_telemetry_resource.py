@@ -0,0 +1,65 @@
+import json
+
+from flask_restful import Resource, reqparse
+
+from application.core_manager import CoreManager
+from communication.http.json_response import json_bytes_response
+
+
+class LatestTelemetryResource(Resource):
+    """
+    Current state of many devices in a single response: the latest reading of each data type of every device
+    of a location (location_id in the path) or of a list of devices (device_id query arguments, repeated or
+    comma separated), read from the latest value cache of the DataManager instead of the telemetry series.
+    """
+
+    # Maximum number of devices of a multi-device request
+    MAX_DEVICES = 10000
+
+    def __init__(self, **kwargs):
+        self.core_manager: CoreManager = kwargs['core_manager']
+
+    def get(self, location_id=None):
+        """Retrieve the latest readings of the devices of a location or of the requested devices"""
+
+        # Check for query arguments
+        parser = reqparse.RequestParser()
+        parser.add_argument('device_id', location='args', action='append')
+        parser.add_argument('data_type', location='args')
+        args = parser.parse_args()
+
+        not_found_list = []
+        if location_id is not None:
+            device_values_list = self.core_manager.get_location_latest_telemetry(location_id)
+            if device_values_list is None:
+                return {'error': "Location Not Found !"}, 404
+        else:
+            device_id_list = [device_id for argument in args['device_id'] or [] for device_id in argument.split(",")
+                              if device_id != ""]
+            if len(device_id_list) == 0:
+                return {'error': "Missing device_id ! At least one device id is required"}, 400
+            if len(device_id_list) > self.MAX_DEVICES:
+                return {'error': "Too many devices ! At most {} devices can be requested at once".format(
+                    self.MAX_DEVICES)}, 400
+
+            device_values_list = []
+            for device_id in dict.fromkeys(device_id_list):
+                if self.core_manager.get_device_by_id(device_id) is None:
+                    not_found_list.append(device_id)
+                else:
+                    device_values_list.append((device_id, self.core_manager.get_latest_telemetry(device_id)))
+
+        # Build a serializable list of the latest readings (optionally of a single data type)
+        data_type_filter = args['data_type']
+        device_list = []
+        for device_id, latest_values in device_values_list:
+            device_list.append({'device_id': device_id,
+                                'values': {data_type: {'timestamp': timestamp, 'value': value}
+                                           for data_type, (timestamp, value) in latest_values.items()
+                                           if data_type_filter is None or data_type == data_type_filter}})
+
+        response_dict = {'location_id': location_id, 'count': len(device_list), 'devices': device_list}
+        if len(not_found_list) > 0:
+            response_dict['not_found'] = not_found_list
+
+        return json_bytes_response(json.dumps(response_dict).encode("utf-8"), 200)
@@ -1,9 +1,10 @@
-from json import JSONDecodeError
 from flask import request, Response
 from flask_restful import Resource
 from application.core_manager import CoreManager
-from communication.api.dto.location_entity_response import LocationEntityResponse
+from communication.codec.schema_decoder import DecodeError
 from communication.api.dto.location_update_request import LocationUpdateRequest
+from communication.http.conditional_response import is_not_modified, not_modified_response, with_etag
+from communication.http.json_response import json_bytes_response
 from application.model.location_model import LocationModel
 
 
@@ -15,20 +16,14 @@ class LocationResource(Resource):
     def get(self, location_id):
         """ Get a location by its UUID """
 
-        if self.core_manager.is_location_registered(location_id):
-            location = self.core_manager.get_location_by_id(location_id)
+        etag = self.core_manager.get_location_version(location_id)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
 
-            # Iterate over the dictionary to build a serializable device id list
-            device_id_list = []
-            for device in location.device_dictionary.values():
-                device_id_list.append(device.uuid)
-
-            location_entity_response = LocationEntityResponse(location.uuid,
-                                                              location.name,
-                                                              location.latitude,
-                                                              location.longitude,
-                                                              device_id_list)
-            return location_entity_response.__dict__, 200  # return data and 200 OK code
+        location = self.core_manager.get_location_by_id(location_id)
+        if location is not None:
+            # Cached JSON representation of the location (with its device id list)
+            return with_etag(json_bytes_response(location.to_json_bytes(), 200), etag)  # return data and 200 OK code
         else:
             return {'error': "Location Not Found !"}, 404
 
@@ -49,9 +44,8 @@ class LocationResource(Resource):
         try:
             if self.core_manager.is_location_registered(location_id):
 
-                # The boolean flag force the parsing of POST data as JSON irrespective of the mimetype
-                json_data = request.get_json(force=True)
-                location_update_request = LocationUpdateRequest(**json_data)
+                # Decode and validate the raw request body irrespective of the mimetype
+                location_update_request = LocationUpdateRequest.from_json(request.get_data())
 
                 if self.core_manager.is_location_registered(location_update_request.uuid):
                     return {'error': "Location UUID not found exists"}, 404
@@ -64,7 +58,7 @@ class LocationResource(Resource):
                     return Response(status=204)
             else:
                 return {'error': "Location UUID not found"}, 404
-        except JSONDecodeError:
-            return {'error': "Invalid JSON ! Check the request"}, 400
+        except DecodeError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': "Generic Internal Server Error ! Reason: " + str(e)}, 500
@@ -1,10 +1,11 @@
-from json import JSONDecodeError
 from flask import request, Response
 from flask_restful import Resource
 
 from application.core_manager import CoreManager
-from communication.api.dto.location_entity_response import LocationEntityResponse
+from communication.codec.schema_decoder import DecodeError
 from communication.api.dto.location_creation_request import LocationCreationRequest
+from communication.http.conditional_response import is_not_modified, not_modified_response, with_etag
+from communication.http.json_response import join_json_fragments, json_bytes_response
 from application.model.location_model import LocationModel
 
 
@@ -16,9 +17,8 @@ class LocationsResource(Resource):
     def post(self):
         """Create a new location"""
         try:
-            # The boolean flag force the parsing of POST data as JSON irrespective of the mimetype
-            json_data = request.get_json(force=True)
-            location_creation_request = LocationCreationRequest(**json_data)
+            # Decode and validate the raw request body irrespective of the mimetype
+            location_creation_request = LocationCreationRequest.from_json(request.get_data())
             if self.core_manager.is_location_registered(location_creation_request.uuid):
                 return {'error': "Location UUID already exists"}, 409  # return data and 200 OK code
             else:
@@ -28,29 +28,19 @@ class LocationsResource(Resource):
                                                    location_creation_request.longitude)
                 self.core_manager.add_location(new_location_model)
                 return Response(status=201, headers={"Location": request.url+"/"+new_location_model.uuid})  # Force the No-Content Response
-        except JSONDecodeError:
-            return {'error': "Invalid JSON ! Check the request"}, 400
+        except DecodeError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': "Generic Internal Server Error ! Reason: " + str(e)}, 500
 
     def get(self):
 
-        # Iterate over the dictionary to build a serializable device list
-        result_location_list = []
+        # The inventory version is read before the data: a concurrent update only produces an older ETag
+        etag = self.core_manager.get_inventory_version()
+        if is_not_modified(etag):
+            return not_modified_response(etag)
 
-        for location in self.core_manager.get_all_locations():
+        # Concatenate the cached JSON representations of the locations (with their device id list)
+        location_json_list = [location.to_json_bytes() for location in self.core_manager.get_all_locations()]
 
-            # Iterate over the dictionary to build a serializable device id list
-            device_id_list = []
-            for device in location.device_dictionary.values():
-                device_id_list.append(device.uuid)
-
-            location_entity_response = LocationEntityResponse(location.uuid,
-                                                              location.name,
-                                                              location.latitude,
-                                                              location.longitude,
-                                                              device_id_list)
-
-            result_location_list.append(location_entity_response.__dict__)
-
-        return result_location_list, 200  # return data and 200 OK code
\ No newline at end of file
+        return with_etag(json_bytes_response(join_json_fragments(location_json_list), 200), etag)  # return data and 200 OK code
\ No newline at end of file
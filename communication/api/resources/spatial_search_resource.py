@@ -0,0 +1,95 @@
+from flask_restful import Resource, reqparse
+
+from application.core_manager import CoreManager
+from communication.http.conditional_response import is_not_modified, not_modified_response, with_etag
+from communication.http.json_response import join_json_fragments, json_bytes_response
+
+
+class SpatialSearchResource(Resource):
+    """
+    Spatial queries on the locations or the devices (item_type) through the spatial index of the inventory:
+    - bbox=min_lat,min_lon,max_lat,max_lon: items inside a map viewport in id order (at most limit,
+      total number in the X-Total-Count header), a min_lon greater than max_lon crosses the antimeridian
+    - lat=&lon=: the count items nearest to the point (optionally within max_distance meters)
+      as a list of {"distance": meters, "<item_type>": item} sorted by distance
+    """
+
+    ITEM_TYPE_LOCATION = "location"
+    ITEM_TYPE_DEVICE = "device"
+
+    # Default and maximum number of items of a bounding box query
+    DEFAULT_LIMIT = 1000
+    MAX_LIMIT = 10000
+
+    # Default and maximum number of items of a nearest neighbour query
+    DEFAULT_COUNT = 20
+    MAX_COUNT = 1000
+
+    def __init__(self, **kwargs):
+        self.core_manager: CoreManager = kwargs['core_manager']
+        self.item_type = kwargs['item_type']
+
+    def get(self):
+        """Retrieve the items inside a bounding box or nearest to a point"""
+
+        etag = self.core_manager.get_inventory_version()
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        # Check for query arguments
+        parser = reqparse.RequestParser()
+        parser.add_argument('bbox', location='args')
+        parser.add_argument('limit', type=int, location='args', default=self.DEFAULT_LIMIT)
+        parser.add_argument('lat', type=float, location='args')
+        parser.add_argument('lon', type=float, location='args')
+        parser.add_argument('count', type=int, location='args', default=self.DEFAULT_COUNT)
+        parser.add_argument('max_distance', type=float, location='args')
+        args = parser.parse_args()
+
+        try:
+            if args['bbox'] is not None:
+                return with_etag(self.get_in_area(args['bbox'], args['limit']), etag)
+            elif args['lat'] is not None and args['lon'] is not None:
+                return with_etag(self.get_nearest(args['lat'], args['lon'], args['count'], args['max_distance']), etag)
+            else:
+                return {'error': "Missing query ! Provide either bbox or lat and lon"}, 400
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+    def get_in_area(self, bbox, limit):
+        if limit <= 0 or limit > self.MAX_LIMIT:
+            raise ValueError("Invalid limit ! The limit must be between 1 and {}".format(self.MAX_LIMIT))
+
+        bounds = bbox.split(',')
+        if len(bounds) != 4:
+            raise ValueError("Invalid bbox ! Expected min_lat,min_lon,max_lat,max_lon")
+        min_latitude, min_longitude, max_latitude, max_longitude = (float(bound) for bound in bounds)
+
+        if self.item_type == self.ITEM_TYPE_DEVICE:
+            item_list, total_count = self.core_manager.get_devices_in_area(min_latitude, min_longitude, max_latitude,
+                                                                           max_longitude, limit)
+        else:
+            item_list, total_count = self.core_manager.get_locations_in_area(min_latitude, min_longitude,
+                                                                             max_latitude, max_longitude, limit)
+
+        # Concatenate the cached JSON representations of the items
+        response = json_bytes_response(join_json_fragments([item.to_json_bytes() for item in item_list]), 200)
+        response.headers['X-Total-Count'] = str(total_count)
+        return response
+
+    def get_nearest(self, latitude, longitude, count, max_distance):
+        if count <= 0 or count > self.MAX_COUNT:
+            raise ValueError("Invalid count ! The count must be between 1 and {}".format(self.MAX_COUNT))
+        if max_distance is not None and max_distance < 0:
+            raise ValueError("Invalid max_distance ! The distance must be positive")
+
+        if self.item_type == self.ITEM_TYPE_DEVICE:
+            nearest_list = self.core_manager.get_nearest_devices(latitude, longitude, count, max_distance)
+        else:
+            nearest_list = self.core_manager.get_nearest_locations(latitude, longitude, count, max_distance)
+
+        # Wrap the cached JSON representations of the items with their distance
+        item_key = ', "{}": '.format(self.item_type).encode("utf-8")
+        fragment_list = [b'{"distance": ' + repr(round(distance, 3)).encode("utf-8") + item_key +
+                         item.to_json_bytes() + b'}' for distance, item in nearest_list]
+        return json_bytes_response(join_json_fragments(fragment_list), 200)
@@ -1,15 +1,27 @@
-from flask import Flask, request
+from flask import Flask
 from flask_restful import Api
 
 from application.core_manager import CoreManager
+from application.monitoring.structured_logging import get_logger
+from communication.api.resources.bulk_inventory_resource import BulkInventoryResource
 from communication.api.resources.device_resource import DeviceResource
+from communication.api.resources.device_search_resource import DeviceSearchResource
 from communication.api.resources.devices_resource import DevicesResource
+from communication.api.resources.device_telemetry_resource import DeviceTelemetryResource
+from communication.api.resources.device_telemetry_rollup_resource import DeviceTelemetryRollupResource
+from communication.api.resources.latest_telemetry_resource import LatestTelemetryResource
 from communication.api.resources.locations_resource import LocationsResource
 from communication.api.resources.location_resource import LocationResource
+from communication.api.resources.spatial_search_resource import SpatialSearchResource
+from communication.http.production_http_server import DEFAULT_SERVER_CONFIGURATION, PathPrefixDispatcher, \
+    create_http_server
+from communication.http.request_metrics import DEFAULT_METRICS_CONFIGURATION, instrument_flask_app, metrics_response
 import threading
 import yaml
 import os
 
+LOGGER = get_logger("api")
+
 
 class RestApiServer:
     """
@@ -26,8 +38,13 @@ class RestApiServer:
         self.api = None
         self.app = None
 
-        # Server Thread
+        # Server Thread, HTTP Server and served WSGI application (the Flask application unless shared)
         self.server_thread = None
+        self.http_server = None
+        self.wsgi_app = None
+
+        # Web Server served on the same listener (see share_listener_with)
+        self.shared_web_server = None
 
         # Configuration File Path
         self.config_file = config_file
@@ -41,7 +58,9 @@ class RestApiServer:
                 "api_prefix": self.DEFAULT_ENDPOINT_PREFIX,
                 "host": "0.0.0.0",
                 "port": 7070
-            }
+            },
+            "server": DEFAULT_SERVER_CONFIGURATION,
+            "metrics": DEFAULT_METRICS_CONFIGURATION
         }
 
         # Read Configuration from target Configuration File Path
@@ -64,7 +83,8 @@ class RestApiServer:
         with open(file_path, 'r') as file:
             self.configuration_dict = yaml.safe_load(file)
 
-        print("Read Configuration from file ({}): {}".format(self.config_file, self.configuration_dict))
+        LOGGER.info("configuration_loaded", "Read Configuration from file", config_file=self.config_file,
+                    configuration=self.configuration_dict)
 
     def init_rest_api(self):
         """ Initialize REST API with resources and endpoints
@@ -75,6 +95,15 @@ class RestApiServer:
         self.app = Flask(__name__)
         self.api = Api(self.app)
 
+        self.wsgi_app = self.app
+
+        # Request metrics and Prometheus metrics endpoint (missing values fall back to the defaults)
+        self.metrics_configuration = dict(DEFAULT_METRICS_CONFIGURATION)
+        self.metrics_configuration.update(self.configuration_dict.get('metrics') or {})
+        instrument_flask_app(self.app, "api")
+        if self.metrics_configuration['enabled']:
+            self.app.add_url_rule(self.metrics_configuration['path'], 'metrics', metrics_response, methods=['GET'])
+
         # Add Resources and Endpoints
         self.api.add_resource(LocationsResource, self.configuration_dict['rest']['api_prefix'] + '/location',
                               resource_class_kwargs={'core_manager': self.core_manager},
@@ -92,35 +121,105 @@ class RestApiServer:
                               endpoint="devices",
                               methods=['GET', 'POST'])
 
+        self.api.add_resource(BulkInventoryResource, self.configuration_dict['rest']['api_prefix'] + '/bulk/location',
+                              resource_class_kwargs={'core_manager': self.core_manager,
+                                                     'item_type': BulkInventoryResource.ITEM_TYPE_LOCATION},
+                              endpoint='location_bulk',
+                              methods=['GET', 'POST'])
+
+        self.api.add_resource(BulkInventoryResource, self.configuration_dict['rest']['api_prefix'] + '/bulk/device',
+                              resource_class_kwargs={'core_manager': self.core_manager,
+                                                     'item_type': BulkInventoryResource.ITEM_TYPE_DEVICE},
+                              endpoint='device_bulk',
+                              methods=['GET', 'POST'])
+
+        self.api.add_resource(SpatialSearchResource, self.configuration_dict['rest']['api_prefix'] + '/geo/location',
+                              resource_class_kwargs={'core_manager': self.core_manager,
+                                                     'item_type': SpatialSearchResource.ITEM_TYPE_LOCATION},
+                              endpoint='location_spatial_search',
+                              methods=['GET'])
+
+        self.api.add_resource(SpatialSearchResource, self.configuration_dict['rest']['api_prefix'] + '/geo/device',
+                              resource_class_kwargs={'core_manager': self.core_manager,
+                                                     'item_type': SpatialSearchResource.ITEM_TYPE_DEVICE},
+                              endpoint='device_spatial_search',
+                              methods=['GET'])
+
+        self.api.add_resource(DeviceSearchResource, self.configuration_dict['rest']['api_prefix'] + '/device',
+                              resource_class_kwargs={'core_manager': self.core_manager},
+                              endpoint='device_search',
+                              methods=['GET'])
+
         self.api.add_resource(DeviceResource, self.configuration_dict['rest'][
             'api_prefix'] + '/location/<string:location_id>/device/<string:device_id>',
                               resource_class_kwargs={'core_manager': self.core_manager},
                               endpoint='device',
                               methods=['GET', 'PUT', 'DELETE'])
 
+        self.api.add_resource(DeviceTelemetryResource, self.configuration_dict['rest'][
+            'api_prefix'] + '/location/<string:location_id>/device/<string:device_id>/telemetry',
+                              resource_class_kwargs={'core_manager': self.core_manager},
+                              endpoint='device_telemetry',
+                              methods=['GET'])
+
+        self.api.add_resource(DeviceTelemetryRollupResource, self.configuration_dict['rest'][
+            'api_prefix'] + '/location/<string:location_id>/device/<string:device_id>/telemetry/rollup',
+                              resource_class_kwargs={'core_manager': self.core_manager},
+                              endpoint='device_telemetry_rollup',
+                              methods=['GET'])
+
+        self.api.add_resource(LatestTelemetryResource,
+                              self.configuration_dict['rest']['api_prefix'] + '/location/<string:location_id>/telemetry/latest',
+                              self.configuration_dict['rest']['api_prefix'] + '/telemetry/latest',
+                              resource_class_kwargs={'core_manager': self.core_manager},
+                              endpoint='latest_telemetry',
+                              methods=['GET'])
+
+    def share_listener_with(self, web_server):
+        """ Serve the Web Server application on the REST API listener: the requests under the API prefix
+        are handled by the REST API and every other request by the Web Server (which must not be started)
+        :param web_server: WebServer instance
+        """
+        mounted_apps = {self.configuration_dict['rest']['api_prefix']: self.app}
+        if self.metrics_configuration['enabled']:
+            mounted_apps[self.metrics_configuration['path']] = self.app
+        self.wsgi_app = PathPrefixDispatcher(web_server.app, mounted_apps)
+        self.shared_web_server = web_server
+
+    def create_http_server(self):
+        """ Create the HTTP Server according to the server configuration (production mode by default) """
+        self.http_server = create_http_server(self.wsgi_app,
+                                              self.configuration_dict['rest']['host'],
+                                              self.configuration_dict['rest']['port'],
+                                              self.configuration_dict.get('server'))
+
     def run_server(self):
         """ Start the REST API Server """
-        self.app.run(host=self.configuration_dict['rest']['host'], port=self.configuration_dict['rest']['port'])
+        if self.http_server is None:
+            self.create_http_server()
+        self.http_server.serve_forever()
 
     def start(self):
+        # Bind the listener before returning so that stop() can be called at any time
+        self.create_http_server()
         self.server_thread = threading.Thread(target=self.run_server)
         self.server_thread.start()
 
     def stop(self):
-        """ Stop the REST API Server (Flask Method)
-        In this code, request.environ.get('werkzeug.server.shutdown')
-        retrieves the shutdown function from the environment.
-        If the function is not found, it raises a RuntimeError,
-        indicating that the server is not running with Werkzeug.
-        If the function is found, it is called to shut down the server."""
+        """ Stop the REST API Server
+        The server stops accepting connections, closes the idle keep-alive connections
+        and waits for the in-flight requests to complete before the server thread is joined"""
+
+        if self.http_server is None:
+            return
 
-        # Shutdown the server
-        func = request.environ.get('werkzeug.server.shutdown')
-        if func is None:
-            raise RuntimeError('Not running with the Werkzeug Server')
+        # End the open telemetry streams of the Web Server sharing the listener
+        if self.shared_web_server is not None:
+            self.shared_web_server.close_telemetry_streams()
 
-        # Call the shutdown function
-        func()
+        # Shutdown the server draining the in-flight requests
+        self.http_server.shutdown()
 
         # Wait for the server thread to join
-        self.server_thread.join()
\ No newline at end of file
+        self.server_thread.join()
+        self.http_server = None
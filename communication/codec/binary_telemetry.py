@@ -0,0 +1,98 @@
+"""
+Compact binary telemetry payload carrying one or more readings of a device (little endian):
+- header: version, flags, data type count, record count
+- data type table: for every data type its length (1 byte) followed by its UTF-8 name
+- records: timestamp (float64), data type index (uint8), value (float32, or float64 with FLAG_FLOAT64_VALUES)
+A reading costs 13 bytes (17 with float64 values) instead of about 70 bytes of JSON and the records
+of a message are unpacked with a single struct.iter_unpack call.
+"""
+import struct
+
+from communication.codec.schema_decoder import DecodeError
+from communication.mqtt.dto.telemetry_message import TelemetryMessage
+
+BINARY_TELEMETRY_VERSION = 1
+
+# Flags
+FLAG_FLOAT64_VALUES = 0x01
+
+HEADER_STRUCT = struct.Struct("<BBBH")
+RECORD_STRUCT = struct.Struct("<dBf")
+RECORD_FLOAT64_STRUCT = struct.Struct("<dBd")
+
+MAX_DATA_TYPES = 255
+MAX_RECORDS = 65535
+
+_SCHEMA_NAME = "binary telemetry payload"
+
+
+def encode_binary_telemetry(readings, float64_values: bool = False):
+    """
+    Encode a list of (timestamp, data_type, value) readings
+    :return: bytes payload
+    """
+    if len(readings) > MAX_RECORDS:
+        raise ValueError("Error encoding the binary telemetry ! At most {} readings per message !".format(MAX_RECORDS))
+
+    data_type_indexes = {}
+    for _, data_type, _ in readings:
+        if data_type not in data_type_indexes:
+            data_type_indexes[data_type] = len(data_type_indexes)
+    if len(data_type_indexes) > MAX_DATA_TYPES:
+        raise ValueError("Error encoding the binary telemetry ! At most {} data types per message !".format(MAX_DATA_TYPES))
+
+    record_struct = RECORD_FLOAT64_STRUCT if float64_values else RECORD_STRUCT
+    payload = bytearray(HEADER_STRUCT.pack(BINARY_TELEMETRY_VERSION, FLAG_FLOAT64_VALUES if float64_values else 0,
+                                           len(data_type_indexes), len(readings)))
+    for data_type in data_type_indexes:
+        encoded_data_type = data_type.encode("utf-8")
+        if len(encoded_data_type) > 255:
+            raise ValueError("Error encoding the binary telemetry ! Data types are limited to 255 bytes !")
+        payload.append(len(encoded_data_type))
+        payload += encoded_data_type
+    for timestamp, data_type, value in readings:
+        payload += record_struct.pack(timestamp, data_type_indexes[data_type], value)
+
+    return bytes(payload)
+
+
+def decode_binary_telemetry(payload):
+    """
+    Decode a binary telemetry payload
+    :return: List of TelemetryMessage
+    :raise DecodeError: if the payload is truncated or malformed
+    """
+    try:
+        version, flags, data_type_count, record_count = HEADER_STRUCT.unpack_from(payload, 0)
+    except struct.error:
+        raise DecodeError(_SCHEMA_NAME, [(None, "truncated header")]) from None
+    if version != BINARY_TELEMETRY_VERSION:
+        raise DecodeError(_SCHEMA_NAME, [(None, "unsupported version {}".format(version))])
+
+    # Data type table
+    offset = HEADER_STRUCT.size
+    data_type_list = []
+    try:
+        for _ in range(data_type_count):
+            length = payload[offset]
+            data_type_list.append(bytes(payload[offset + 1:offset + 1 + length]).decode("utf-8"))
+            offset += 1 + length
+    except (IndexError, UnicodeDecodeError):
+        raise DecodeError(_SCHEMA_NAME, [("data_type", "invalid data type table")]) from None
+
+    # Records
+    record_struct = RECORD_FLOAT64_STRUCT if flags & FLAG_FLOAT64_VALUES else RECORD_STRUCT
+    records_end = offset + record_count * record_struct.size
+    if records_end != len(payload):
+        raise DecodeError(_SCHEMA_NAME, [(None, "expected {} records of {} bytes".format(record_count,
+                                                                                           record_struct.size))])
+
+    telemetry_list = []
+    for timestamp, data_type_index, value in record_struct.iter_unpack(payload[offset:records_end]):
+        if data_type_index >= data_type_count:
+            raise DecodeError(_SCHEMA_NAME, [("data_type", "invalid data type index {}".format(data_type_index))])
+        # NaN and infinite values (x - x is NaN) would break the ordering and the aggregates of the series
+        if timestamp - timestamp != 0.0 or value - value != 0.0:
+            raise DecodeError(_SCHEMA_NAME, [(None, "expected finite timestamps and values")])
+        telemetry_list.append(TelemetryMessage(timestamp, data_type_list[data_type_index], value))
+    return telemetry_list
@@ -0,0 +1,155 @@
+"""
+Schema-compiled JSON decoder shared by the MQTT telemetry path and the REST request DTOs.
+A SchemaDecoder is built once for a record class and a tuple of SchemaField: the decoding and
+validation function of the schema is generated as Python source and compiled, so decoding a payload
+runs straight-line code without per-field interpretation of the schema.
+Payloads (bytes or str) are parsed with the C JSON scanner returning the members of an object as a tuple
+of (key, value) pairs (no intermediate dict) and the validated values are passed positionally to the
+record class. Unknown keys are ignored and every invalid field is reported in a single DecodeError.
+"""
+import json
+import sys
+from json.decoder import WHITESPACE
+from json.scanner import make_scanner
+
+# Field kinds
+FIELD_STRING = "string"
+FIELD_NUMBER = "number"
+FIELD_INTEGER = "integer"
+
+# JSON objects are returned as tuples of (key, value) pairs by the scanner of the decoders
+_SCANNER = make_scanner(json.JSONDecoder(object_pairs_hook=tuple))
+
+# Placeholder of the fields missing from the payload
+_MISSING = object()
+
+# Largest integer converted to a finite float (larger integers overflow)
+_MAX_FLOAT_INTEGER = int(sys.float_info.max)
+
+
+class DecodeError(ValueError):
+    """
+    Error raised when a payload is not valid JSON or does not match the schema
+    errors: list of (field name, reason) tuples (field name None for syntax errors)
+    """
+
+    def __init__(self, schema_name: str, errors: list):
+        self.schema_name = schema_name
+        self.errors = errors
+        super().__init__("Invalid {} ! {}".format(
+            schema_name, "; ".join(reason if field is None else "{}: {}".format(field, reason)
+                                   for field, reason in errors)))
+
+
+class SchemaField:
+    """Field of a schema: JSON key (also the parameter name of the record class), kind and constraints"""
+
+    def __init__(self, name: str, kind: str, required: bool = True, nullable: bool = False, default=None):
+        if kind not in (FIELD_STRING, FIELD_NUMBER, FIELD_INTEGER):
+            raise ValueError("Error creating the SchemaField {} ! Unsupported kind: {} !".format(name, kind))
+        if not name.isidentifier():
+            raise ValueError("Error creating the SchemaField ! Invalid name: {} !".format(name))
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.nullable = nullable
+        self.default = default
+
+
+def _add_error(errors, field_name, reason):
+    if errors is None:
+        errors = []
+    errors.append((field_name, reason))
+    return errors
+
+
+class SchemaDecoder:
+    """
+    Decoder of the JSON representation of a record class compiled from its schema.
+    The record class receives the field values positionally in the order of the schema.
+    """
+
+    def __init__(self, record_class, fields: tuple, schema_name: str = None):
+        self.record_class = record_class
+        self.fields = tuple(fields)
+        self.schema_name = schema_name if schema_name is not None else record_class.__name__
+        self.decode_pairs = self._compile()
+
+    def _compile(self):
+        """Generate and compile the function building a record from the (key, value) pairs of a JSON object"""
+        variables = ["_f{}".format(index) for index in range(len(self.fields))]
+        namespace = {"_MISSING": _MISSING, "_add_error": _add_error, "_record_class": self.record_class,
+                     "_DecodeError": DecodeError, "_schema_name": self.schema_name, "_float": float,
+                     "_MAX_FLOAT_INTEGER": _MAX_FLOAT_INTEGER}
+
+        lines = ["def decode_pairs(pairs):"]
+        lines.append("    {} = _MISSING".format(" = ".join(variables)))
+        lines.append("    errors = None")
+
+        # Assign the members of the object to the field variables
+        lines.append("    for key, value in pairs:")
+        for index, field in enumerate(self.fields):
+            lines.append("        {} key == {!r}: {} = value".format("if" if index == 0 else "elif",
+                                                                   field.name, variables[index]))
+
+        # Validate (and convert) every field
+        for index, field in enumerate(self.fields):
+            variable = variables[index]
+            name = repr(field.name)
+            if field.required:
+                lines.append("    if {} is _MISSING: errors = _add_error(errors, {}, 'missing field')".format(variable, name))
+            else:
+                namespace["_default{}".format(index)] = field.default
+                lines.append("    if {} is _MISSING: {} = _default{}".format(variable, variable, index))
+            if field.nullable or not field.required:
+                lines.append("    elif {} is None: pass".format(variable))
+            if field.kind == FIELD_STRING:
+                lines.append("    elif type({}) is not str: errors = _add_error(errors, {}, 'expected a string')".format(variable, name))
+            elif field.kind == FIELD_NUMBER:
+                # bool is a subclass of int but is not accepted as a number. NaN and infinite values
+                # (x - x is NaN) and integers overflowing a float are rejected
+                lines.append("    elif type({0}) is float and {0} - {0} == 0.0: pass".format(variable))
+                lines.append("    elif type({0}) is int and -_MAX_FLOAT_INTEGER <= {0} <= _MAX_FLOAT_INTEGER: "
+                             "{0} = _float({0})".format(variable))
+                lines.append("    elif type({0}) is float or type({0}) is int: "
+                             "errors = _add_error(errors, {1}, 'expected a finite number')".format(variable, name))
+                lines.append("    else: errors = _add_error(errors, {}, 'expected a number')".format(name))
+            else:
+                lines.append("    elif type({}) is not int: errors = _add_error(errors, {}, 'expected an integer')".format(variable, name))
+
+        lines.append("    if errors is not None: raise _DecodeError(_schema_name, errors)")
+        lines.append("    return _record_class({})".format(", ".join(variables)))
+
+        exec(compile("\n".join(lines), "<schema {}>".format(self.schema_name), "exec"), namespace)
+        return namespace["decode_pairs"]
+
+    def decode(self, payload):
+        """
+        Parse and validate a JSON payload
+        :param payload: UTF-8 bytes or str
+        :return: Instance of the record class
+        :raise DecodeError: if the payload is not a valid JSON object matching the schema
+        """
+        try:
+            if type(payload) is not str:
+                payload = str(payload, "utf-8")
+            # Skip the leading whitespace only when the payload does not start with the object
+            start = 0 if payload[:1] == "{" else WHITESPACE.match(payload, 0).end()
+            pairs, end = _SCANNER(payload, start)
+        except StopIteration as e:
+            raise DecodeError(self.schema_name, [(None, "invalid JSON at position {}".format(e.value))]) from None
+        except (ValueError, TypeError) as e:
+            raise DecodeError(self.schema_name, [(None, "invalid JSON ({})".format(e))]) from None
+        except RecursionError:
+            raise DecodeError(self.schema_name, [(None, "invalid JSON (nested too deeply)")]) from None
+
+        if end != len(payload) and WHITESPACE.match(payload, end).end() != len(payload):
+            raise DecodeError(self.schema_name, [(None, "extra data after the JSON object")])
+        if type(pairs) is not tuple:
+            raise DecodeError(self.schema_name, [(None, "expected a JSON object")])
+
+        try:
+            return self.decode_pairs(pairs)
+        except (OverflowError, RecursionError) as e:
+            # Safety net: a payload must never raise anything but a DecodeError
+            raise DecodeError(self.schema_name, [(None, "invalid value ({})".format(e))]) from None
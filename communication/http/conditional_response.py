@@ -0,0 +1,20 @@
+from flask import Response, request
+
+
+def is_not_modified(etag: str):
+    """Check if the If-None-Match header of the current request matches the (unquoted) entity tag"""
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+
+def not_modified_response(etag: str):
+    """Return an empty 304 Not Modified response carrying the entity tag"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def with_etag(response: Response, etag: str):
+    """Set the entity tag of a response when it is available"""
+    if etag is not None:
+        response.set_etag(etag)
+    return response
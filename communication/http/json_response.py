@@ -0,0 +1,34 @@
+from flask import Response
+
+JSON_MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Number of NDJSON lines written to the connection at once by a streamed response
+NDJSON_CHUNK_LINES = 1000
+
+
+def join_json_fragments(fragment_list):
+    """Assemble a JSON array from already serialized UTF-8 JSON fragments"""
+    return b"[" + b", ".join(fragment_list) + b"]"
+
+
+def json_bytes_response(json_bytes, status: int = 200):
+    """Return a response with an already serialized JSON body (bypassing the Flask-RESTful serialization)"""
+    return Response(json_bytes, status=status, mimetype=JSON_MIMETYPE)
+
+
+def ndjson_stream_response(fragment_iterable, status: int = 200, chunk_lines: int = NDJSON_CHUNK_LINES):
+    """Return a response streaming already serialized JSON fragments as newline-delimited JSON
+    (the fragments are consumed lazily and written in chunks of chunk_lines lines)"""
+
+    def generate_chunks():
+        chunk = []
+        for fragment in fragment_iterable:
+            chunk.append(fragment)
+            if len(chunk) >= chunk_lines:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if len(chunk) > 0:
+            yield b"\n".join(chunk) + b"\n"
+
+    return Response(generate_chunks(), status=status, mimetype=NDJSON_MIMETYPE)
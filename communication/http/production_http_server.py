@@ -0,0 +1,212 @@
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, make_server
+
+# Serving modes
+SERVER_MODE_DEVELOPMENT = "development"
+SERVER_MODE_PRODUCTION = "production"
+
+# Default "server" configuration section of api_conf.yaml and web_conf.yaml
+DEFAULT_SERVER_CONFIGURATION = {
+    "mode": SERVER_MODE_PRODUCTION,
+    "worker_threads": 16,
+    "stream_threads": 256,
+    "request_timeout": 30,
+    "keep_alive": True
+}
+
+# WSGI environ key of the function moving a long-lived response (e.g. Server-Sent Events) to a stream thread
+# (only set by the ProductionWSGIServer)
+STREAM_SLOT_ENVIRON_KEY = "iot.acquire_stream_slot"
+
+
+class ProductionRequestHandler(WSGIRequestHandler):
+    """
+    Request handler applying the timeout and keep-alive settings of its ProductionWSGIServer
+    and reporting to the server whether the connection is idle (waiting for the next request)
+    """
+
+    # Enable keep-alive connections (switched back to HTTP/1.0 in setup() if disabled)
+    protocol_version = "HTTP/1.1"
+
+    def make_environ(self):
+        environ = super().make_environ()
+        environ[STREAM_SLOT_ENVIRON_KEY] = self.acquire_stream_slot
+        return environ
+
+    def acquire_stream_slot(self):
+        """Move the current request from its worker slot to a stream slot so a long-lived response does not
+        hold one of the request workers (the connection is closed when the response ends)
+        :return: False if every stream slot is taken"""
+        if not self.server.move_to_stream_slot():
+            return False
+        self.close_connection = True
+        return True
+
+    def setup(self):
+        # Socket timeout applied to every read and write of the connection
+        self.timeout = self.server.request_timeout
+        if not self.server.keep_alive:
+            self.protocol_version = "HTTP/1.0"
+        super().setup()
+        self.server.track_connection(self.connection, idle=True)
+
+    def parse_request(self):
+        # The request line has been received: the connection is busy until the response is sent
+        self.server.track_connection(self.connection, idle=False)
+        return super().parse_request()
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # Do not wait for another request on a connection of a server that is shutting down
+        if self.server.draining:
+            self.close_connection = True
+        self.server.track_connection(self.connection, idle=True)
+
+    def finish(self):
+        self.server.untrack_connection(self.connection)
+        super().finish()
+
+
+class ProductionWSGIServer(BaseWSGIServer):
+    """
+    Multi-threaded WSGI server handling the connections with a bounded pool of worker threads.
+    When every worker is busy the accept loop waits for a free worker instead of spawning new threads,
+    so new connections queue up in the listen backlog.
+    A long-lived response (e.g. a Server-Sent Events stream) can move its thread to one of the stream_threads
+    slots through the STREAM_SLOT_ENVIRON_KEY function of the WSGI environ: the open streams then do not take
+    the request workers and at most stream_threads of them are served at once.
+    shutdown() stops accepting connections, closes the idle keep-alive connections and waits for the
+    in-flight requests to complete.
+    """
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, worker_threads: int, request_timeout: float, keep_alive: bool,
+                 stream_threads: int = 0):
+        if worker_threads <= 0:
+            raise ValueError("Error creating the HTTP server ! worker_threads must be positive !")
+        if stream_threads < 0:
+            raise ValueError("Error creating the HTTP server ! stream_threads must not be negative !")
+
+        self.worker_threads = worker_threads
+        self.stream_threads = stream_threads
+        self.request_timeout = request_timeout
+        self.keep_alive = keep_alive
+        self.draining = False
+
+        # Threads are started on demand: the stream threads only exist while streams are open
+        self._executor = ThreadPoolExecutor(max_workers=worker_threads + stream_threads,
+                                            thread_name_prefix="http-worker")
+        self._worker_slots = threading.BoundedSemaphore(worker_threads)
+        self._stream_slots = threading.BoundedSemaphore(stream_threads) if stream_threads > 0 else None
+
+        # Slot (worker or stream semaphore) held by the connection of the current worker thread
+        self._thread_slot = threading.local()
+
+        # Open connections -> True if idle
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+
+        super().__init__(host, port, app, handler=ProductionRequestHandler)
+
+    def process_request(self, request, client_address):
+        """Hand the connection to a worker thread waiting for a free worker if the pool is busy"""
+        while not self._worker_slots.acquire(timeout=0.5):
+            if self.draining:
+                self.shutdown_request(request)
+                return
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        self._thread_slot.semaphore = self._worker_slots
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._thread_slot.semaphore.release()
+
+    def move_to_stream_slot(self):
+        """Release the worker slot of the current thread taking a stream slot instead
+        :return: False if every stream slot is taken (the worker slot is kept)"""
+        if self._thread_slot.semaphore is self._stream_slots:
+            return True
+        if self._stream_slots is None or not self._stream_slots.acquire(blocking=False):
+            return False
+        self._thread_slot.semaphore = self._stream_slots
+        self._worker_slots.release()
+        return True
+
+    def track_connection(self, connection, idle: bool):
+        with self._connections_lock:
+            self._connections[connection] = idle
+
+    def untrack_connection(self, connection):
+        with self._connections_lock:
+            self._connections.pop(connection, None)
+
+    def shutdown(self):
+        """Stop accepting connections and wait for the in-flight requests to complete"""
+        self.draining = True
+
+        # Stop the accept loop (serve_forever closes the listening socket when it returns)
+        super().shutdown()
+
+        # Wake up the workers waiting for a new request on an idle keep-alive connection
+        with self._connections_lock:
+            idle_connections = [connection for connection, idle in self._connections.items() if idle]
+        for connection in idle_connections:
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+        # Drain the in-flight requests
+        self._executor.shutdown(wait=True)
+
+
+def create_http_server(app, host: str, port: int, server_configuration: dict = None):
+    """
+    Create the HTTP server of a WSGI application according to the "server" configuration section
+    :return: ProductionWSGIServer in production mode or the werkzeug development server
+    """
+    configuration = dict(DEFAULT_SERVER_CONFIGURATION)
+    if server_configuration is not None:
+        configuration.update(server_configuration)
+
+    if configuration["mode"] == SERVER_MODE_PRODUCTION:
+        return ProductionWSGIServer(host, port, app,
+                                    worker_threads=int(configuration["worker_threads"]),
+                                    request_timeout=float(configuration["request_timeout"]),
+                                    keep_alive=bool(configuration["keep_alive"]),
+                                    stream_threads=int(configuration["stream_threads"]))
+
+    if configuration["mode"] == SERVER_MODE_DEVELOPMENT:
+        return make_server(host, port, app, threaded=True)
+
+    raise ValueError("Error creating the HTTP server ! Unsupported server mode: {} !".format(configuration["mode"]))
+
+
+class PathPrefixDispatcher:
+    """
+    WSGI application forwarding each request to the application mounted on the first matching
+    path prefix or to the default application, so several Flask applications share one listener.
+    Unlike werkzeug's DispatcherMiddleware the prefix is not moved to SCRIPT_NAME because the
+    mounted applications register their routes with the full path.
+    """
+
+    def __init__(self, default_app, mounted_apps: dict):
+        self.default_app = default_app
+        # Longest prefixes first
+        self.mounted_apps = sorted(mounted_apps.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        for prefix, app in self.mounted_apps:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return app(environ, start_response)
+        return self.default_app(environ, start_response)
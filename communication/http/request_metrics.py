@@ -0,0 +1,45 @@
+import time
+
+from flask import Flask, Response, request
+
+from application.monitoring.metrics import METRICS, PROMETHEUS_CONTENT_TYPE
+
+# Default "metrics" configuration section of api_conf.yaml
+DEFAULT_METRICS_CONFIGURATION = {
+    "enabled": True,
+    "path": "/metrics"
+}
+
+HTTP_REQUESTS = METRICS.counter("iot_http_requests_total",
+                                "HTTP requests by server, endpoint, method and status code",
+                                ("server", "endpoint", "method", "status"))
+HTTP_REQUEST_DURATION = METRICS.histogram("iot_http_request_duration_seconds",
+                                          "Time spent handling an HTTP request until the response is returned "
+                                          "(excluding the transmission of a streamed body)",
+                                          ("server", "endpoint", "method"))
+
+# Key of the request start time in the WSGI environment
+_START_TIME_KEY = "iot.request_start_time"
+
+
+def instrument_flask_app(app: Flask, server_name: str):
+    """Count and time every request handled by a Flask application (labeled by its endpoint, not by its URL,
+    to bound the number of label sets)"""
+
+    @app.before_request
+    def start_request_timer():
+        request.environ[_START_TIME_KEY] = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        start_time = request.environ.get(_START_TIME_KEY)
+        endpoint = request.endpoint or "unmatched"
+        HTTP_REQUESTS.labels(server_name, endpoint, request.method, response.status_code).inc()
+        if start_time is not None:
+            HTTP_REQUEST_DURATION.labels(server_name, endpoint, request.method).observe(time.perf_counter() - start_time)
+        return response
+
+
+def metrics_response():
+    """Return the metrics of the default registry in the Prometheus text format"""
+    return Response(METRICS.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,5 +1,8 @@
 import json
 
+from communication.codec.schema_decoder import FIELD_NUMBER, FIELD_STRING, SchemaDecoder, SchemaField
+
+
 class TelemetryMessage:
     """
     Telemetry Message DTO class
@@ -8,10 +11,25 @@ class TelemetryMessage:
     - data_type: type of the telemetry message
     - value: value of the telemetry message
     """
+
+    __slots__ = ("timestamp", "data_type", "value")
+
     def __init__(self, timestamp, data_type, value):
         self.timestamp = timestamp
         self.data_type = data_type
         self.value = value
 
+    @staticmethod
+    def from_json(payload):
+        """Decode and validate a JSON payload (bytes or str) raising a DecodeError with the invalid fields"""
+        return TELEMETRY_MESSAGE_DECODER.decode(payload)
+
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
\ No newline at end of file
+        return json.dumps({"timestamp": self.timestamp, "data_type": self.data_type, "value": self.value})
+
+
+TELEMETRY_MESSAGE_DECODER = SchemaDecoder(TelemetryMessage, (
+    SchemaField("timestamp", FIELD_NUMBER),
+    SchemaField("data_type", FIELD_STRING),
+    SchemaField("value", FIELD_NUMBER)
+))
@@ -1,16 +1,57 @@
 from application.core_manager import CoreManager
+from application.monitoring.metrics import METRICS
+from application.monitoring.structured_logging import get_logger
+from communication.codec.binary_telemetry import decode_binary_telemetry
+from communication.codec.schema_decoder import DecodeError
 from communication.mqtt.dto.telemetry_message import TelemetryMessage
-import json
 import paho.mqtt.client as mqtt
 import yaml
 import os
+import queue
 import threading
+import time
+import zlib
+
+MQTT_MESSAGES_RECEIVED = METRICS.counter("iot_mqtt_messages_received_total",
+                                         "Telemetry messages received from the MQTT Broker by payload format",
+                                         ("format",))
+_JSON_MESSAGES_RECEIVED = MQTT_MESSAGES_RECEIVED.labels("json")
+_BINARY_MESSAGES_RECEIVED = MQTT_MESSAGES_RECEIVED.labels("binary")
+MQTT_MESSAGES_DROPPED = METRICS.counter("iot_mqtt_messages_dropped_total",
+                                        "Telemetry messages dropped because the ingest queue was full")
+MQTT_DECODE_ERRORS = METRICS.counter("iot_mqtt_decode_errors_total",
+                                     "Telemetry messages rejected because their payload could not be decoded")
+MQTT_BATCH_DURATION = METRICS.histogram("iot_mqtt_ingest_batch_duration_seconds",
+                                        "Time spent by an ingest worker decoding and storing a batch of messages")
+
+LOGGER = get_logger("mqtt")
 
 class MqttDataFetcher:
     """ MQTT Data Fetcher Class in charge of fetching data from the MQTT Broker
-        The fetcher is executed in a separate thread in order to avoid blocking the main thread."""
-
-    def __init__(self, config_file: str, core_manager: CoreManager):
+        The fetcher is executed in a separate thread in order to avoid blocking the main thread.
+        Received messages are only enqueued by the MQTT network thread: a pool of ingest workers
+        decodes them and stores them in micro-batches through the Core Manager.
+        Messages of the same device are always handled by the same worker to preserve their order.
+        Telemetry is received as JSON on the telemetry topic and, optionally, as compact binary payloads
+        with one or more readings on the binary telemetry topic (see communication/codec/binary_telemetry.py).
+        Several fetchers (e.g. in different processes, partition_index of partition_count) share the telemetry
+        through an MQTT shared subscription ($share/<shared_subscription_group>/<topic>): the broker delivers
+        each message to a single fetcher of the group, so every fetcher only receives its own share.
+        Without a group (brokers without shared subscriptions) every fetcher receives every message and keeps
+        the devices of its partition (stable hash of the device id), so the messages are sent and matched
+        partition_count times."""
+
+    # Default Ingest Configuration
+    DEFAULT_INGEST_CONFIGURATION = {
+        "workers": 2,
+        "queue_size": 10000,
+        "batch_size": 200,
+        "flush_interval": 0.5,
+        "stats_interval": 0,
+        "shared_subscription_group": "iot-ingest"
+    }
+
+    def __init__(self, config_file: str, core_manager: CoreManager, partition_index: int = 0, partition_count: int = 1):
 
         # Fetcher Thread
         self.fetcher_thread = None
@@ -18,19 +59,38 @@ class MqttDataFetcher:
         # MQTT Client Initialization to None
         self.client = None
 
+        # Ingest Workers, their bounded hand-off queues and statistics
+        self.ingest_worker_threads = []
+        self.ingest_queues = []
+        self.ingest_worker_statistics = []
+        self.stats_thread = None
+        self.stop_event = threading.Event()
+        self.received_messages = 0
+        self.dropped_messages = 0
+        self.ignored_messages = 0
+
         # Configuration File Path
         self.config_file = config_file
 
         # Data Manager
         self.core_manager = core_manager
 
+        # Partition of the device topic space handled by the fetcher
+        if not 0 <= partition_index < partition_count:
+            raise ValueError("Error creating the MqttDataFetcher ! Invalid partition {} of {} !".format(partition_index,
+                                                                                                     partition_count))
+        self.partition_index = partition_index
+        self.partition_count = partition_count
+
         # Default Configuration Dictionary
         self.configuration_dict = {
             "broker_ip": "127.0.0.1",
             "broker_port": 1883,
             "target_telemetry_topic": "device/+/temperature",
+            "target_binary_telemetry_topic": None,
             "username": None,
-            "password": None
+            "password": None,
+            "ingest": dict(self.DEFAULT_INGEST_CONFIGURATION)
         }
 
         # Read Configuration from target Configuration File Path
@@ -43,9 +103,38 @@ class MqttDataFetcher:
         self.mqtt_username = self.configuration_dict["username"]
         self.mqtt_password = self.configuration_dict["password"]
 
+        self.mqtt_binary_topic = self.configuration_dict.get("target_binary_telemetry_topic")
+
+        # Compiled matchers of the telemetry topic filters returning the device id of a matching topic
+        self.match_telemetry_topic = self.compile_topic_filter(self.mqtt_topic)
+        self.match_binary_telemetry_topic = self.compile_topic_filter(self.mqtt_binary_topic) \
+            if self.mqtt_binary_topic else None
+
+        # Ingest Configuration (missing values fall back to the defaults)
+        ingest_configuration = dict(self.DEFAULT_INGEST_CONFIGURATION)
+        ingest_configuration.update(self.configuration_dict.get("ingest") or {})
+        self.ingest_worker_count = max(1, int(ingest_configuration["workers"]))
+        self.ingest_queue_size = int(ingest_configuration["queue_size"])
+        self.ingest_batch_size = max(1, int(ingest_configuration["batch_size"]))
+        self.ingest_flush_interval = float(ingest_configuration["flush_interval"])
+        self.ingest_stats_interval = float(ingest_configuration["stats_interval"])
+
+        # Partitioned fetchers share the subscriptions of their group (each message is delivered to one of them)
+        self.shared_subscription_group = ingest_configuration["shared_subscription_group"] \
+            if self.partition_count > 1 else None
+
         # Initialize MQTT Client
         self.init_mqtt_client()
 
+        # Initialize the Ingest Queues
+        self.init_ingest_queues()
+
+        # Ingest queue gauges (computed when the metrics are scraped)
+        METRICS.callback_gauge("iot_mqtt_ingest_queue_depth", "Telemetry messages waiting in the ingest queues",
+                               self.get_queue_depth)
+        METRICS.callback_gauge("iot_mqtt_ingest_queue_capacity", "Capacity of the ingest queues",
+                               lambda: self.ingest_queue_size * self.ingest_worker_count)
+
     def read_configuration_file(self):
         """ Read Configuration File for the REST API Server
          :return:
@@ -60,40 +149,206 @@ class MqttDataFetcher:
         with open(file_path, 'r') as file:
             self.configuration_dict = yaml.safe_load(file)
 
-        print("Read Configuration from file ({}): {}".format(self.config_file, self.configuration_dict))
+        LOGGER.info("configuration_loaded", "Read Configuration from file", config_file=self.config_file,
+                    configuration={key: ("***" if key == "password" and value else value)
+                                   for key, value in self.configuration_dict.items()})
 
     def on_connect(self, client, userdata, flags, rc):
         """ The callback for when the client receives a CONNACK response from the server."""
-        print("Connected to MQTT Broker with result code " + str(rc))
-        self.client.subscribe(self.mqtt_topic)
-        print(f"Subscribed to topic: {self.mqtt_topic}")
+        LOGGER.info("broker_connected", "Connected to MQTT Broker", result_code=rc)
+        self.client.subscribe(self.subscription_topic(self.mqtt_topic))
+        LOGGER.info("topic_subscribed", "Subscribed to topic", topic=self.subscription_topic(self.mqtt_topic))
+        if self.mqtt_binary_topic:
+            self.client.subscribe(self.subscription_topic(self.mqtt_binary_topic))
+            LOGGER.info("topic_subscribed", "Subscribed to binary telemetry topic",
+                        topic=self.subscription_topic(self.mqtt_binary_topic))
+
+    def subscription_topic(self, topic_filter: str):
+        """ Return the filter subscribed for a telemetry topic (shared subscription of a partitioned fetcher) """
+        if self.shared_subscription_group:
+            return "$share/{}/{}".format(self.shared_subscription_group, topic_filter)
+        return topic_filter
 
     def on_message(self, client, userdata, msg):
-        """ The callback for when a PUBLISH message is received from the server."""
+        """ The callback for when a PUBLISH message is received from the server.
+        The message is only handed off to the ingest worker of its device: decoding and storage
+        are performed by the worker to never block the MQTT network loop."""
+
+        # Match the topic and extract the device ID with a single split
+        binary = False
+        device_id = self.match_telemetry_topic(msg.topic)
+        if device_id is None and self.match_binary_telemetry_topic is not None:
+            device_id = self.match_binary_telemetry_topic(msg.topic)
+            binary = True
+
+        if device_id is not None and not self.is_device_in_partition(device_id):
+            # Message of another partition (only without shared subscription)
+            self.ignored_messages += 1
+        elif device_id is not None:
+
+            self.received_messages += 1
+            if binary:
+                _BINARY_MESSAGES_RECEIVED.inc()
+            else:
+                _JSON_MESSAGES_RECEIVED.inc()
+
+            # Select the worker queue of the device
+            ingest_queue = self.ingest_queues[hash(device_id) % self.ingest_worker_count]
 
-        if mqtt.topic_matches_sub(self.mqtt_topic, msg.topic):
             try:
+                ingest_queue.put_nowait((device_id, msg.payload, binary))
+            except queue.Full:
+                # Drop the message instead of stalling the network loop
+                self.dropped_messages += 1
+                MQTT_MESSAGES_DROPPED.inc()
+
+    def is_device_in_partition(self, device_id: str):
+        """ Check if a device belongs to the partition of the fetcher (the same in every process, unlike hash())
+        With a shared subscription the broker already delivers only the share of the fetcher """
+        if self.partition_count == 1 or self.shared_subscription_group is not None:
+            return True
+        return zlib.crc32(device_id.encode("utf-8")) % self.partition_count == self.partition_index
+
+    @staticmethod
+    def compile_topic_filter(topic_filter: str):
+        """ Compile an MQTT topic filter (with '+' and a trailing '#' wildcards) into a function
+        returning the device id of a matching topic (the level of the first '+', the second level otherwise)
+        or None if the topic does not match the filter"""
+
+        filter_levels = topic_filter.split('/')
+        multi_level = filter_levels[-1] == '#'
+        if multi_level:
+            filter_levels = filter_levels[:-1]
+
+        level_count = len(filter_levels)
+        device_level = filter_levels.index('+') if '+' in filter_levels else 1
+        fixed_levels = [(index, level) for index, level in enumerate(filter_levels) if level != '+']
+
+        def match_topic(topic: str):
+            levels = topic.split('/')
+            if len(levels) != level_count and not (multi_level and len(levels) > level_count):
+                return None
+            for index, level in fixed_levels:
+                if levels[index] != level:
+                    return None
+            return levels[device_level] if device_level < len(levels) else None
+
+        return match_topic
+
+    def init_ingest_queues(self):
+        """ Initialize a bounded hand-off queue and the statistics for each ingest worker
+        :return:
+        """
+        self.ingest_queues = [queue.Queue(maxsize=self.ingest_queue_size) for _ in range(self.ingest_worker_count)]
+        self.ingest_worker_statistics = [{"processed": 0, "stored": 0, "rejected": 0, "decode_errors": 0, "batches": 0}
+                                         for _ in range(self.ingest_worker_count)]
+
+    def ingest_worker(self, worker_index: int):
+        """ Drain the worker queue in micro-batches of at most batch_size messages waiting at most
+        flush_interval seconds to complete a batch. A None item stops the worker."""
+
+        ingest_queue = self.ingest_queues[worker_index]
+        running = True
+
+        while running:
+
+            # Block until at least one message is available
+            item = ingest_queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            flush_deadline = time.monotonic() + self.ingest_flush_interval
+
+            # Complete the batch with the messages received before the flush deadline
+            while len(batch) < self.ingest_batch_size:
+                try:
+                    item = ingest_queue.get_nowait()
+                except queue.Empty:
+                    timeout = flush_deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = ingest_queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+
+                if item is None:
+                    running = False
+                    break
+
+                batch.append(item)
 
-                # Decode the payload
-                payload = msg.payload.decode()
-
-                # Get JSON data from the message payload
-                json_data = json.loads(payload)
-
-                # Extract the device ID from the topic
-                device_id = msg.topic.split('/')[1]
-
-                # Deserialize the payload into a TelemetryMessge object
-                telemetry_message = TelemetryMessage(**json_data)
+            try:
+                self.process_batch(worker_index, batch)
+            except Exception as e:
+                # Keep the worker alive: the next batches of its devices must still be stored
+                LOGGER.error("batch_error", "Unexpected error processing MQTT batch", messages=len(batch),
+                             reason=repr(e))
 
-                # Update the data manager with the new data
-                print(f"Received message from device {device_id}: {payload}")
+    def process_batch(self, worker_index: int, batch: list):
+        """ Decode a batch of raw (device_id, payload, binary) messages and store it through the Core Manager
+        (the stored and rejected statistics count readings, a binary message can carry several readings) """
 
-                # Handle the telemetry message
-                self.core_manager.handle_mqtt_device_telemetry_data(device_id, telemetry_message)
+        start_time = time.perf_counter()
+        worker_statistics = self.ingest_worker_statistics[worker_index]
+        telemetry_batch = []
 
+        for device_id, payload, binary in batch:
+            try:
+                if binary:
+                    # Decode all the readings of the binary payload
+                    for telemetry_message in decode_binary_telemetry(payload):
+                        telemetry_batch.append((device_id, telemetry_message))
+                else:
+                    # Decode and validate the raw JSON payload into a TelemetryMessage object
+                    telemetry_batch.append((device_id, TelemetryMessage.from_json(payload)))
+            except DecodeError as e:
+                worker_statistics["decode_errors"] += 1
+                MQTT_DECODE_ERRORS.inc()
+                LOGGER.warning("decode_error", "Error decoding MQTT message", device_id=device_id, reason=str(e))
             except Exception as e:
-                print(f"Error processing MQTT message: {str(e)}")
+                # A single message must never stop the ingest worker
+                worker_statistics["decode_errors"] += 1
+                MQTT_DECODE_ERRORS.inc()
+                LOGGER.error("decode_error", "Unexpected error decoding MQTT message", device_id=device_id,
+                             reason=repr(e))
+
+        try:
+            rejected_list = self.core_manager.handle_mqtt_device_telemetry_batch(telemetry_batch)
+        except Exception as e:
+            rejected_list = [(device_id, str(e)) for device_id, _ in telemetry_batch]
+            LOGGER.error("store_error", "Error storing MQTT telemetry batch", readings=len(telemetry_batch),
+                         reason=str(e))
+
+        worker_statistics["processed"] += len(batch)
+        worker_statistics["stored"] += len(telemetry_batch) - len(rejected_list)
+        worker_statistics["rejected"] += len(rejected_list)
+        worker_statistics["batches"] += 1
+        MQTT_BATCH_DURATION.observe(time.perf_counter() - start_time)
+
+    def get_queue_depth(self):
+        """ Return the number of messages waiting in the ingest queues """
+        return sum(ingest_queue.qsize() for ingest_queue in self.ingest_queues)
+
+    def get_ingest_statistics(self):
+        """ Return a dictionary with the current state of the ingest pipeline """
+        statistics = {
+            "queue_depth": self.get_queue_depth(),
+            "queue_capacity": self.ingest_queue_size * self.ingest_worker_count,
+            "workers": self.ingest_worker_count,
+            "received": self.received_messages,
+            "ignored": self.ignored_messages,
+            "dropped": self.dropped_messages
+        }
+        for key in ("processed", "stored", "rejected", "decode_errors", "batches"):
+            statistics[key] = sum(worker_statistics[key] for worker_statistics in self.ingest_worker_statistics)
+        return statistics
+
+    def report_statistics(self):
+        """ Periodically log the ingest statistics until the fetcher is stopped """
+        while not self.stop_event.wait(self.ingest_stats_interval):
+            LOGGER.info("ingest_statistics", "MQTT Ingest Statistics", **self.get_ingest_statistics())
 
     def init_mqtt_client(self):
         """ Initialize the MQTT Client
@@ -110,17 +365,58 @@ class MqttDataFetcher:
 
         # Check if username and password are provided
         if self.mqtt_username and self.mqtt_password:
-            print("Setting username and password ...")
+            LOGGER.info("credentials_set", "Setting username and password ...")
             self.client.username_pw_set(self.mqtt_username, self.mqtt_password)
 
         # Connect to MQTT Broker
-        print("Connecting to MQTT Broker ...")
+        LOGGER.info("broker_connecting", "Connecting to MQTT Broker ...", host=self.mqtt_broker_host,
+                    port=self.mqtt_broker_port)
         self.client.connect(self.mqtt_broker_host, self.mqtt_broker_port, 60)
 
         # Start the MQTT loop
-        print("Starting MQTT Loop ...")
+        LOGGER.info("loop_starting", "Starting MQTT Loop ...")
         self.client.loop_forever()
 
     def start(self):
+
+        # Start the Ingest Workers before receiving messages
+        self.start_ingest_workers()
+
         self.fetcher_thread = threading.Thread(target=self.connect)
         self.fetcher_thread.start()
+
+    def start_ingest_workers(self):
+        """ Start the ingest workers and the optional statistics report (messages can then be handed to
+        on_message by the MQTT loop or directly, e.g. by an in-process load generator) """
+
+        self.ingest_worker_threads = [threading.Thread(target=self.ingest_worker, args=(worker_index,))
+                                      for worker_index in range(self.ingest_worker_count)]
+        for worker_thread in self.ingest_worker_threads:
+            worker_thread.start()
+
+        # Start the optional periodic report of the ingest statistics
+        if self.ingest_stats_interval > 0:
+            self.stats_thread = threading.Thread(target=self.report_statistics, daemon=True)
+            self.stats_thread.start()
+
+    def stop(self):
+        """ Disconnect from the MQTT Broker and stop the ingest workers after draining the queued messages """
+
+        self.stop_event.set()
+
+        # Stop the MQTT loop
+        self.client.disconnect()
+        if self.fetcher_thread is not None:
+            self.fetcher_thread.join()
+
+        self.stop_ingest_workers()
+
+    def stop_ingest_workers(self):
+        """ Stop the ingest workers once the messages already queued have been handled """
+
+        self.stop_event.set()
+
+        for ingest_queue in self.ingest_queues:
+            ingest_queue.put(None)
+        for worker_thread in self.ingest_worker_threads:
+            worker_thread.join()
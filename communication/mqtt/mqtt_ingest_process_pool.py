@@ -0,0 +1,206 @@
+from application.core_manager import CoreManager
+from application.monitoring.metrics import METRICS
+from application.monitoring.structured_logging import configure_logging, get_logger
+from communication.mqtt.dto.telemetry_message import TelemetryMessage
+from communication.mqtt.mqtt_data_fetcher import MqttDataFetcher
+from data.manager.shared_telemetry_store import SharedTelemetryStore
+import multiprocessing
+import threading
+
+LOGGER = get_logger("mqtt")
+
+
+class SharedTelemetryWriter:
+    """ Stand-in for the Core Manager of the MqttDataFetcher of an ingest worker process:
+        decoded readings are written to the partition of the process in the shared telemetry store.
+        Device registration is checked by the main process when the readings are consumed.
+        The ingest workers of the fetcher write under a lock: a partition has a single writer."""
+
+    def __init__(self, telemetry_store: SharedTelemetryStore, partition_index: int):
+        self.telemetry_store = telemetry_store
+        self.partition_index = partition_index
+        self.write_lock = threading.Lock()
+
+    def handle_mqtt_device_telemetry_batch(self, telemetry_batch: list):
+        """ Write a batch of (device_id, TelemetryMessage) tuples
+        :return: List of (device_id, error reason) tuples for the readings dropped by the store,
+                 like CoreManager.handle_mqtt_device_telemetry_batch
+        """
+        telemetry_rows = [(device_id, telemetry_data.timestamp, telemetry_data.data_type, telemetry_data.value)
+                          for device_id, telemetry_data in telemetry_batch]
+        with self.write_lock:
+            dropped_list = self.telemetry_store.write_batch(self.partition_index, telemetry_rows)
+        return [(telemetry_batch[position][0], reason) for position, reason in dropped_list]
+
+
+def run_ingest_worker_process(config_file: str, store_name: str, partition_index: int, partition_count: int,
+                              stop_event, logging_config_file: str = None):
+    """ Entry point of an ingest worker process: run an MqttDataFetcher on a partition of the devices
+    writing into the shared telemetry store until the stop event is set """
+
+    # Spawned processes do not inherit the logging configuration of the main process
+    log_listener = configure_logging(logging_config_file) if logging_config_file is not None else None
+
+    telemetry_store = SharedTelemetryStore(store_name, create=False)
+    mqtt_data_fetcher = MqttDataFetcher(config_file,
+                                        SharedTelemetryWriter(telemetry_store, partition_index),
+                                        partition_index=partition_index,
+                                        partition_count=partition_count)
+    mqtt_data_fetcher.start()
+
+    try:
+        stop_event.wait()
+    except KeyboardInterrupt:
+        pass
+
+    mqtt_data_fetcher.stop()
+    telemetry_store.close()
+    if log_listener is not None:
+        log_listener.stop()
+
+
+class MqttIngestProcessPool:
+    """ Pool of ingest worker processes, each one running its own MqttDataFetcher on a share of the telemetry,
+        so the MQTT receive and decode work runs outside of the process serving the REST API and the Web pages.
+        The workers write the decoded readings into a SharedTelemetryStore partition and a single consumer thread
+        of the main process moves them to the Core Manager in batches (registration checks, series and rollups),
+        so the API/Web read path is unchanged.
+        The consumer runs under the GIL of the main process and bounds the total ingest rate: adding processes
+        offloads the decoding but does not scale the ingest beyond the consumer
+        (see test/benchmark/multiprocess_ingest_benchmark.py)."""
+
+    # Default Consumer Configuration
+    DEFAULT_BATCH_SIZE = 5000
+    DEFAULT_POLL_INTERVAL = 0.05
+
+    # Seconds given to a worker process to drain its queues before it is terminated
+    STOP_TIMEOUT = 10
+
+    def __init__(self, config_file: str, core_manager: CoreManager, process_count: int,
+                 record_capacity: int = SharedTelemetryStore.DEFAULT_RECORD_CAPACITY,
+                 batch_size: int = DEFAULT_BATCH_SIZE, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 logging_config_file: str = None):
+
+        if process_count <= 0:
+            raise ValueError("Error creating the MqttIngestProcessPool ! process_count must be positive !")
+
+        self.config_file = config_file
+        self.core_manager = core_manager
+        self.process_count = process_count
+        self.record_capacity = record_capacity
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.logging_config_file = logging_config_file
+
+        # Shared telemetry store, worker processes and consumer thread (created by start())
+        self.telemetry_store = None
+        self.worker_processes = []
+        self.consumer_thread = None
+
+        # Spawned (not forked) processes: the main process already runs the server threads
+        self.process_context = multiprocessing.get_context("spawn")
+        self.process_stop_event = self.process_context.Event()
+        self.consumer_stop_event = threading.Event()
+
+        # Consumer statistics
+        self.consumed_readings = 0
+        self.rejected_readings = 0
+
+    def start(self):
+        """ Create the shared telemetry store and start the worker processes and the consumer thread """
+
+        self.telemetry_store = SharedTelemetryStore(partition_count=self.process_count,
+                                                    record_capacity=self.record_capacity)
+
+        self.worker_processes = [self.process_context.Process(target=run_ingest_worker_process,
+                                                              args=(self.config_file, self.telemetry_store.name,
+                                                                    partition_index, self.process_count,
+                                                                    self.process_stop_event,
+                                                                    self.logging_config_file),
+                                                              name="mqtt-ingest-{}".format(partition_index),
+                                                              daemon=True)
+                                 for partition_index in range(self.process_count)]
+        for worker_process in self.worker_processes:
+            worker_process.start()
+
+        self.consumer_thread = threading.Thread(target=self.consume, daemon=True)
+        self.consumer_thread.start()
+
+        # Shared telemetry store gauges of each partition (the metrics of the worker processes are not exported)
+        METRICS.callback_gauge("iot_shared_telemetry_pending", "Readings written by an ingest worker process "
+                               "and not consumed yet", lambda: self._partition_statistic("pending"), ("partition",))
+        METRICS.callback_gauge("iot_shared_telemetry_dropped", "Readings dropped by an ingest worker process "
+                               "because its shared memory ring was full", lambda: self._partition_statistic("dropped"),
+                               ("partition",))
+
+    def consume(self):
+        """ Move the readings of the shared telemetry store to the Core Manager until the pool is stopped """
+        while not self.consumer_stop_event.is_set():
+            if self.consume_partitions() == 0:
+                self.consumer_stop_event.wait(self.poll_interval)
+
+    def consume_partitions(self):
+        """ Consume at most batch_size readings of each partition
+        :return: Number of consumed readings
+        """
+        consumed_count = 0
+
+        for partition_index in range(self.process_count):
+            telemetry_rows = self.telemetry_store.read_batch(partition_index, self.batch_size)
+            if len(telemetry_rows) == 0:
+                continue
+
+            telemetry_batch = [(device_id, TelemetryMessage(timestamp, data_type, value))
+                               for device_id, timestamp, data_type, value in telemetry_rows]
+            try:
+                rejected_list = self.core_manager.handle_mqtt_device_telemetry_batch(telemetry_batch)
+            except Exception as e:
+                rejected_list = telemetry_batch
+                LOGGER.error("store_error", "Error storing shared telemetry batch", readings=len(telemetry_batch),
+                             reason=str(e))
+
+            consumed_count += len(telemetry_rows)
+            self.consumed_readings += len(telemetry_rows)
+            self.rejected_readings += len(rejected_list)
+
+        return consumed_count
+
+    def _partition_statistic(self, key: str):
+        """ Return a dictionary (partition index,) -> statistic of each partition (empty once stopped) """
+        telemetry_store = self.telemetry_store
+        if telemetry_store is None:
+            return {}
+        return {(partition_index,): telemetry_store.get_partition_statistics(partition_index)[key]
+                for partition_index in range(self.process_count)}
+
+    def get_ingest_statistics(self):
+        """ Return a dictionary with the state of the worker processes, their partitions and the consumer """
+        return {
+            "processes": self.process_count,
+            "alive": sum(1 for worker_process in self.worker_processes if worker_process.is_alive()),
+            "consumed": self.consumed_readings,
+            "rejected": self.rejected_readings,
+            "partitions": [self.telemetry_store.get_partition_statistics(partition_index)
+                           for partition_index in range(self.process_count)]
+        }
+
+    def stop(self):
+        """ Stop the worker processes, consume the readings they have written and release the shared memory """
+
+        if self.telemetry_store is None:
+            return
+
+        self.process_stop_event.set()
+        for worker_process in self.worker_processes:
+            worker_process.join(self.STOP_TIMEOUT)
+            if worker_process.is_alive():
+                worker_process.terminate()
+                worker_process.join()
+
+        self.consumer_stop_event.set()
+        self.consumer_thread.join()
+        while self.consume_partitions() > 0:
+            pass
+
+        self.telemetry_store.close()
+        self.telemetry_store = None
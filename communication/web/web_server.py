@@ -1,16 +1,39 @@
 from application.core_manager import CoreManager
-from flask import Flask, request, render_template
+from application.monitoring.structured_logging import get_logger
+from communication.http.conditional_response import is_not_modified, not_modified_response, with_etag
+from communication.http.production_http_server import DEFAULT_SERVER_CONFIGURATION, STREAM_SLOT_ENVIRON_KEY, \
+    create_http_server
+from communication.http.request_metrics import instrument_flask_app
+from flask import Flask, Response, request, render_template
+import json
 import os
 import yaml
 import threading
 
+LOGGER = get_logger("web")
+
 
 class WebServer:
 
+    # Telemetry pagination: default and maximum number of readings of a page
+    DEFAULT_TELEMETRY_PAGE_SIZE = 100
+    MAX_TELEMETRY_PAGE_SIZE = 10000
+
+    # Number of template chunks buffered before being sent while streaming the telemetry page
+    TELEMETRY_STREAM_BUFFER_SIZE = 64
+
+    # Default live telemetry streams configuration ("stream" section of web_conf.yaml)
+    DEFAULT_STREAM_CONFIGURATION = {
+        "max_streams": 250,
+        "heartbeat_interval": 15,
+        "retry_interval": 3
+    }
+
     def __init__(self, config_file:str, core_manager: CoreManager):
 
-        # Server Thread
+        # Server Thread and HTTP Server
         self.server_thread = None
+        self.http_server = None
 
         # Save the data manager
         self.core_manager = core_manager
@@ -29,19 +52,34 @@ class WebServer:
             "web": {
                 "host": "0.0.0.0",
                 "port": 7071
-            }
+            },
+            "server": DEFAULT_SERVER_CONFIGURATION
         }
 
         # Read Configuration from target Configuration File Path
         self.read_configuration_file()
 
+        # Live telemetry streams (each open stream is served by a stream thread of the HTTP server,
+        # not by one of its request workers)
+        self.stream_configuration = dict(self.DEFAULT_STREAM_CONFIGURATION)
+        self.stream_configuration.update(self.configuration_dict.get('stream') or {})
+        self.active_subscriptions = set()
+        self.stream_lock = threading.Lock()
+
         # Create the Flask app
         self.app = Flask(__name__, template_folder=template_dir)
 
+        # Count and time the page requests
+        instrument_flask_app(self.app, "web")
+
         # Add URL rules to the Flask app mapping the URL to the function
         self.app.add_url_rule('/locations', 'locations', self.locations)
         self.app.add_url_rule('/location/<string:location_id>/devices', 'devices', self.devices)
         self.app.add_url_rule('/location/<string:location_id>/device/<string:device_id>/telemetry', 'telemetry', self.telemetry)
+        self.app.add_url_rule('/location/<string:location_id>/device/<string:device_id>/telemetry/stream',
+                              'device_telemetry_stream', self.device_telemetry_stream)
+        self.app.add_url_rule('/location/<string:location_id>/telemetry/stream', 'location_telemetry_stream',
+                              self.location_telemetry_stream)
 
     def read_configuration_file(self):
         """ Read Configuration File for the Web Server
@@ -57,46 +95,177 @@ class WebServer:
         with open(file_path, 'r') as file:
             self.configuration_dict = yaml.safe_load(file)
 
-        print("Read Configuration from file ({}): {}".format(self.config_file, self.configuration_dict))
+        LOGGER.info("configuration_loaded", "Read Configuration from file", config_file=self.config_file,
+                    configuration=self.configuration_dict)
 
     def locations(self):
         """ Get all locations and render the locations.html template"""
+        etag = self.core_manager.get_inventory_version()
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
         location_list = self.core_manager.get_all_locations()
-        return render_template('locations.html', locations=location_list)
+        return with_etag(Response(render_template('locations.html', locations=location_list)), etag)
 
     def devices(self, location_id):
         """ Get all devices for a specific location and render the devices.html template"""
+        etag = self.core_manager.get_location_version(location_id)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
         device_list = self.core_manager.get_devices_by_location(location_id)
-        return render_template('devices.html', devices=device_list, location_id=location_id)
+        return with_etag(Response(render_template('devices.html', devices=device_list, location_id=location_id)), etag)
 
     def telemetry(self, location_id, device_id):
-        """ Get telemetry data for a specific device and render the telemetry.html template"""
-        telemetry_data = self.core_manager.get_telemetry_data_by_device_id(device_id)
-        return render_template('telemetry.html', telemetry_data=telemetry_data, location_id=location_id, device_id=device_id)
+        """ Get a page of telemetry data (newest first) for a specific device and render the telemetry.html template
+        The page is selected through the page_size and cursor query parameters and is streamed progressively
+        so the time to first byte does not depend on the size of the page"""
+
+        try:
+            page_size = int(request.args.get('page_size', self.DEFAULT_TELEMETRY_PAGE_SIZE))
+            cursor = request.args.get('cursor')
+            cursor_timestamp, cursor_skip = self.decode_telemetry_cursor(cursor) if cursor else (None, 0)
+        except ValueError:
+            return Response("Invalid page_size or cursor parameter", status=400)
+
+        if page_size <= 0 or page_size > self.MAX_TELEMETRY_PAGE_SIZE:
+            return Response("Invalid page_size parameter (1 - {})".format(self.MAX_TELEMETRY_PAGE_SIZE), status=400)
+
+        # The page depends on the query parameters only through the URL, which is the cache key of the ETag
+        etag = self.core_manager.get_telemetry_version(device_id)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        telemetry_rows, next_cursor, total_count = self.core_manager.get_telemetry_page(device_id,
+                                                                                        page_size,
+                                                                                        cursor_timestamp,
+                                                                                        cursor_skip)
+
+        template = self.app.jinja_env.get_template('telemetry.html')
+        template_stream = template.stream(telemetry_rows=telemetry_rows,
+                                          total_count=total_count,
+                                          page_size=page_size,
+                                          is_first_page=cursor is None,
+                                          next_cursor=self.encode_telemetry_cursor(next_cursor) if next_cursor else None,
+                                          location_id=location_id,
+                                          device_id=device_id)
+        template_stream.enable_buffering(self.TELEMETRY_STREAM_BUFFER_SIZE)
+
+        return with_etag(Response(template_stream, mimetype='text/html'), etag)
+
+    def device_telemetry_stream(self, location_id, device_id):
+        """ Stream the new telemetry readings of a device as Server-Sent Events """
+        if self.core_manager.get_device_version(location_id, device_id) is None:
+            return Response("Device not found", status=404)
+        return self.open_telemetry_stream(lambda: self.core_manager.subscribe_device_telemetry(device_id))
+
+    def location_telemetry_stream(self, location_id):
+        """ Stream the new telemetry readings of all the devices of a location as Server-Sent Events """
+        if self.core_manager.get_location_version(location_id) is None:
+            return Response("Location not found", status=404)
+        return self.open_telemetry_stream(lambda: self.core_manager.subscribe_location_telemetry(location_id))
+
+    def open_telemetry_stream(self, subscribe):
+        """ Subscribe to the live readings and return the event stream response
+        (503 when the maximum number of streams or of server stream threads is reached,
+        the browser retries after retry_interval) """
+        too_many_streams_response = Response("Too many live telemetry streams", status=503,
+                                             headers={"Retry-After": str(self.stream_configuration['retry_interval'])})
+        with self.stream_lock:
+            if len(self.active_subscriptions) >= self.stream_configuration['max_streams']:
+                return too_many_streams_response
+
+            # Hand the request worker back to the server for the lifetime of the stream
+            acquire_stream_slot = request.environ.get(STREAM_SLOT_ENVIRON_KEY)
+            if acquire_stream_slot is not None and not acquire_stream_slot():
+                return too_many_streams_response
+            subscription = subscribe()
+            self.active_subscriptions.add(subscription)
+
+        response = Response(self.generate_telemetry_events(subscription), mimetype='text/event-stream',
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        # Also called if the client disconnects before the first event
+        response.call_on_close(lambda: self.close_telemetry_stream(subscription))
+        return response
+
+    def generate_telemetry_events(self, subscription):
+        """ Yield the readings of a subscription as they arrive, with a comment line as heartbeat when idle.
+        The stream ends when the subscription is closed, with an overflow event if the client was too slow """
+        yield "retry: {}\n\n".format(int(self.stream_configuration['retry_interval'] * 1000))
+
+        while True:
+            readings = subscription.wait_readings(self.stream_configuration['heartbeat_interval'])
+            if len(readings) > 0:
+                # A single write for all the readings received since the last one
+                yield "".join("event: telemetry\ndata: {}\n\n".format(json.dumps({
+                    'device_id': device_id,
+                    'timestamp': telemetry_data.timestamp,
+                    'data_type': telemetry_data.data_type,
+                    'value': telemetry_data.value})) for device_id, telemetry_data in readings)
+            elif not subscription.closed:
+                yield ": heartbeat\n\n"
+
+            if subscription.closed:
+                if subscription.overflowed:
+                    yield "event: overflow\ndata: {}\n\n"
+                return
+
+    def close_telemetry_stream(self, subscription):
+        with self.stream_lock:
+            self.active_subscriptions.discard(subscription)
+        self.core_manager.unsubscribe_telemetry(subscription)
+
+    def close_telemetry_streams(self):
+        """ Close every open telemetry stream (the streams end after their buffered readings) """
+        with self.stream_lock:
+            subscription_list = list(self.active_subscriptions)
+        for subscription in subscription_list:
+            self.core_manager.unsubscribe_telemetry(subscription)
+
+    @staticmethod
+    def encode_telemetry_cursor(cursor):
+        """ Encode a (timestamp, skip) cursor as a query parameter value """
+        return "{!r}_{}".format(cursor[0], cursor[1])
+
+    @staticmethod
+    def decode_telemetry_cursor(cursor: str):
+        """ Decode a cursor query parameter value into a (timestamp, skip) tuple """
+        timestamp, skip = cursor.split('_')
+        return float(timestamp), int(skip)
+
+    def create_http_server(self):
+        """ Create the HTTP Server according to the server configuration (production mode by default) """
+        self.http_server = create_http_server(self.app,
+                                              self.configuration_dict['web']['host'],
+                                              self.configuration_dict['web']['port'],
+                                              self.configuration_dict.get('server'))
 
     def run_server(self):
-        """ Run the Flask Web Server"""
-        self.app.run(host=self.configuration_dict['web']['host'], port=self.configuration_dict['web']['port'])
+        """ Run the Web Server"""
+        if self.http_server is None:
+            self.create_http_server()
+        self.http_server.serve_forever()
 
     def start(self):
+        # Bind the listener before returning so that stop() can be called at any time
+        self.create_http_server()
         self.server_thread = threading.Thread(target=self.run_server)
         self.server_thread.start()
 
     def stop(self):
-        """ Stop the REST API Server (Flask Method)
-        In this code, request.environ.get('werkzeug.server.shutdown')
-        retrieves the shutdown function from the environment.
-        If the function is not found, it raises a RuntimeError,
-        indicating that the server is not running with Werkzeug.
-        If the function is found, it is called to shut down the server."""
+        """ Stop the Web Server
+        The server stops accepting connections, closes the idle keep-alive connections
+        and waits for the in-flight requests to complete before the server thread is joined"""
+
+        if self.http_server is None:
+            return
 
-        # Shutdown the server
-        func = request.environ.get('werkzeug.server.shutdown')
-        if func is None:
-            raise RuntimeError('Not running with the Werkzeug Server')
+        # End the open telemetry streams so they do not keep the server draining
+        self.close_telemetry_streams()
 
-        # Call the shutdown function
-        func()
+        # Shutdown the server draining the in-flight requests
+        self.http_server.shutdown()
 
         # Wait for the server thread to join
-        self.server_thread.join()
\ No newline at end of file
+        self.server_thread.join()
+        self.http_server = None
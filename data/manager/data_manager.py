@@ -1,5 +1,14 @@
 from application.model.device_model import DeviceModel
 from application.model.location_model import LocationModel
+from data.manager.telemetry_series import TelemetrySeries
+from data.manager.telemetry_rollup import DeviceTelemetryRollups
+from data.manager.telemetry_segment_log import TelemetrySegmentLog
+from data.manager.spatial_grid_index import SpatialGridIndex
+from data.manager import inventory_snapshot
+from operator import attrgetter
+import heapq
+import os
+import threading
 
 
 class DataManager:
@@ -7,11 +16,85 @@ class DataManager:
     DataManager class is responsible for managing the data of the application.
     Abstracts the data storage and retrieval operations.
     In this implementation everything is stored in memory.
+    Telemetry data are stored for each device in a bounded columnar TelemetrySeries
+    and aggregated on ingest into per minute, hour and day rollups.
+    Persistent storage backends (e.g. SqliteDataManager) extend this class writing through
+    to their storage and keep these in memory structures as the read path.
+    Telemetry data can also be appended to a memory-mapped TelemetrySegmentLog: after a restart the series
+    of a device is rebuilt from the log the first time the device is accessed.
+
+    Concurrency model of the inventory: writers are serialized by a writer lock and never mutate
+    the dictionaries that readers can iterate (the device_dictionary of each location and the location snapshot
+    returned by get_all_locations). They build an updated copy and publish it by rebinding the attribute,
+    so readers always iterate an immutable snapshot without taking any lock and never wait for writers
+    (or slow down telemetry ingest).
+    Like the device index, location_dictionary is only read by id and is updated in place: the location snapshot
+    is copied from it on the first get_all_locations after a write, so adding locations one at a time does not
+    copy every location at each write. A device write still copies the device dictionary of its location:
+    provisioning many devices of a site is cheaper in a single add_devices_batch.
+
+    Every inventory write increments a monotonic generation counter recorded globally and for the updated
+    location and devices, so readers can detect changes (e.g. HTTP ETags) without looking at the data.
+
+    Secondary indexes (attribute value -> set of device ids) on the INDEXED_DEVICE_ATTRIBUTES are maintained
+    together with the global device index, so device searches intersect the id sets instead of scanning
+    the inventory. Devices are replaced (update_device), never mutated in place, so the indexed values are
+    the attribute values of the indexed DeviceModel.
+    Locations and devices are also indexed by their coordinates (SpatialGridIndex) for the bounding box
+    and nearest neighbour queries.
     """
 
-    location_dictionary = {}
+    # Device attributes with a secondary index
+    INDEXED_DEVICE_ATTRIBUTES = ("type", "manufacturer", "software_version")
+
+    def __init__(self, telemetry_capacity: int = TelemetrySeries.DEFAULT_CAPACITY,
+                 telemetry_log: TelemetrySegmentLog = None,
+                 spatial_cell_size: float = SpatialGridIndex.DEFAULT_CELL_SIZE):
+        """Initialize the DataManager with the number of telemetry readings kept for each device,
+        an optional telemetry segment log and the cell size (degrees) of the spatial indexes"""
+        self.telemetry_capacity = telemetry_capacity
+        self.telemetry_log = telemetry_log
+        self._hydration_lock = threading.Lock()
+
+        # Writer lock of the inventory (re-entrant so storage backends can extend a write under the same lock)
+        self._inventory_lock = threading.RLock()
+
+        # Location index: location id -> LocationModel (updated in place, only read by id)
+        self.location_dictionary = {}
+
+        # Snapshot of the locations for iteration: (location_writes when copied, values of a location dictionary copy)
+        self.location_writes = 0
+        self._location_snapshot = (0, {}.values())
+
+        # Global device index: device id -> (location id, DeviceModel)
+        self.device_index = {}
+
+        # Secondary indexes: attribute -> attribute value -> set of device ids
+        self.device_attribute_indexes = {attribute: {} for attribute in self.INDEXED_DEVICE_ATTRIBUTES}
+
+        # Spatial indexes of the location and device coordinates
+        self.spatial_cell_size = spatial_cell_size
+        self.location_spatial_index = SpatialGridIndex(spatial_cell_size)
+        self.device_spatial_index = SpatialGridIndex(spatial_cell_size)
+
+        # Inventory generation counters (global, location id -> generation and device id -> generation)
+        # and a random epoch distinguishing the generations of different runs
+        self.generation_epoch = os.urandom(4).hex()
+        self.inventory_generation = 0
+        self.location_generations = {}
+        self.device_generations = {}
+
+        self.device_timeseries_data = {}
+
+        self.device_rollup_data = {}
+
+        # Latest reading of each data type of a device: device id -> {data type: (timestamp, value)}
+        self.device_latest_values = {}
 
-    device_timeseries_data = {}
+    def close(self):
+        """Release the resources of the storage backend (only the telemetry log for the in memory storage)"""
+        if self.telemetry_log is not None:
+            self.telemetry_log.close()
 
     def init_demo_data(self):
         """Initialize the DataManager with some demo data"""
@@ -38,12 +121,65 @@ class DataManager:
         # Add New Device
         self.add_device(demo_location.uuid, demo_device)
 
+    # INVENTORY SNAPSHOT
+
+    def save_inventory_snapshot(self, file_path):
+        """Write a binary snapshot of all the locations and their devices
+        :return: (location count, device count)"""
+        return inventory_snapshot.write_inventory_snapshot(file_path, self.get_all_locations())
+
+    def load_inventory_snapshot(self, file_path):
+        """Replace the inventory with the content of a binary snapshot read with a single bulk read
+        :return: (location count, device count)"""
+        with inventory_snapshot.paused_garbage_collection():
+            return self._replace_inventory(inventory_snapshot.read_inventory_snapshot(file_path))
+
+    def _replace_inventory(self, location_list):
+        """Publish a whole inventory at once building the location dictionary and the device index in bulk
+        (instead of copying the location dictionary for every single location)
+        :return: (location count, device count)"""
+        location_dictionary = {}
+        device_index = {}
+        for location in location_list:
+            location_dictionary[location.uuid] = location
+            for device in location.device_dictionary.values():
+                device_index[device.uuid] = (location.uuid, device)
+
+        device_attribute_indexes = {attribute: {} for attribute in self.INDEXED_DEVICE_ATTRIBUTES}
+        for attribute, attribute_index in device_attribute_indexes.items():
+            for device_uuid, (_, device) in device_index.items():
+                device_ids = attribute_index.get(getattr(device, attribute))
+                if device_ids is None:
+                    attribute_index[getattr(device, attribute)] = {device_uuid}
+                else:
+                    device_ids.add(device_uuid)
+
+        location_spatial_index = SpatialGridIndex.build(
+            ((location.uuid, location.latitude, location.longitude) for location in location_dictionary.values()),
+            self.spatial_cell_size)
+        device_spatial_index = SpatialGridIndex.build(
+            ((device_uuid, device.latitude, device.longitude) for device_uuid, (_, device) in device_index.items()),
+            self.spatial_cell_size)
+
+        with self._inventory_lock:
+            generation = self._next_generation()
+            self.location_generations = dict.fromkeys(location_dictionary, generation)
+            self.device_generations = dict.fromkeys(device_index, generation)
+            self.location_dictionary = location_dictionary
+            self.location_writes += 1
+            self.device_index = device_index
+            self.device_attribute_indexes = device_attribute_indexes
+            self.location_spatial_index = location_spatial_index
+            self.device_spatial_index = device_spatial_index
+
+        return len(location_dictionary), len(device_index)
+
     # LOCATION MANAGEMENT
     def add_location(self, new_location):
 
         # Check the correct instance for the variable new_location
         if isinstance(new_location, LocationModel):
-            self.location_dictionary[new_location.uuid] = new_location
+            self._put_location(new_location)
         else:
             raise TypeError("Error adding new Location ! Only LocationModel are allowed !")
 
@@ -51,24 +187,51 @@ class DataManager:
 
         # Check the correct instance for the variable updated_location
         if isinstance(updated_location, LocationModel):
-            self.location_dictionary[updated_location.uuid] = updated_location
+            self._put_location(updated_location)
         else:
             raise TypeError("Error updating the Location ! Only LocationModel are allowed !")
 
+    def _put_location(self, location):
+        """Add or replace a location in the location dictionary
+        (a location with an existing id replaces the previous one together with its devices)"""
+        with self._inventory_lock:
+            previous_location = self.location_dictionary.get(location.uuid)
+            if previous_location is not None and previous_location is not location:
+                self._remove_devices_from_index(previous_location)
+            if previous_location is not None:
+                self.location_spatial_index.remove(location.uuid, previous_location.latitude,
+                                                   previous_location.longitude)
+
+            self.location_dictionary[location.uuid] = location
+            self.location_writes += 1
+            self.location_spatial_index.put(location.uuid, location.latitude, location.longitude)
+            self.location_generations[location.uuid] = self._next_generation()
+            self._add_devices_to_index(location)
+
     def remove_location(self, location_uuid):
-        if location_uuid in self.location_dictionary.keys():
-            del self.location_dictionary[location_uuid]
+        with self._inventory_lock:
+            if location_uuid in self.location_dictionary:
+                removed_location = self.location_dictionary[location_uuid]
+                self._remove_devices_from_index(removed_location)
+                self.location_spatial_index.remove(location_uuid, removed_location.latitude, removed_location.longitude)
+                del self.location_dictionary[location_uuid]
+                self.location_writes += 1
+                self.location_generations.pop(location_uuid, None)
+                self._next_generation()
 
     def get_location_by_id(self, location_id):
         """Return a location by its id"""
-        if location_id in self.location_dictionary:
-            return self.location_dictionary[location_id]
-        else:
-            return None
+        return self.location_dictionary.get(location_id)
 
     def get_all_locations(self):
-        """Return a list of all locations"""
-        return self.location_dictionary.values()
+        """Return all the locations of the current snapshot (safe to iterate while writers update the inventory)"""
+        copied_writes, location_values = self._location_snapshot
+        if copied_writes != self.location_writes:
+            # Read the counter before copying: a write during the copy is copied again by the next reader
+            copied_writes = self.location_writes
+            location_values = dict(self.location_dictionary).values()
+            self._location_snapshot = (copied_writes, location_values)
+        return location_values
 
     # DEVICE MANAGEMENT
 
@@ -76,63 +239,534 @@ class DataManager:
 
         # Check the correct instance for the variable new_device
         if isinstance(new_device, DeviceModel):
-            # Check if the required Location Id is correct
-            if location_id in self.location_dictionary:
-                self.location_dictionary[location_id].device_dictionary[new_device.uuid] = new_device
-            else:
-                raise IndexError("Error Location Id is not correct !")
+            self._put_device(location_id, new_device)
         else:
             raise TypeError("Error adding new device ! Only DeviceModel are allowed !")
 
     def update_device(self, location_id, updated_device):
         # Check the correct instance for the variable new_device
         if isinstance(updated_device, DeviceModel):
-            # Check if the required Location Id is correct
-            if location_id in self.location_dictionary:
-                self.location_dictionary[location_id].device_dictionary[updated_device.uuid] = updated_device
-            else:
-                raise IndexError("Error Location Id is not correct !")
+            self._put_device(location_id, updated_device)
         else:
             raise TypeError("Error adding new device ! Only DeviceModel are allowed !")
 
-    def remove_device(self, location_id, device_uuid):
+    def _put_device(self, location_id, device):
+        """Publish a new device dictionary snapshot of the location containing the device"""
+        with self._inventory_lock:
+            # Check if the required Location Id is correct
+            target_location = self.location_dictionary.get(location_id)
+            if target_location is None:
+                raise IndexError("Error Location Id is not correct !")
 
-        # Check if the required Location Id is correct
-        if location_id in self.location_dictionary:
-            # Retrieve the target location object
-            target_location = self.location_dictionary[location_id]
+            device_dictionary = dict(target_location.device_dictionary)
+            device_dictionary[device.uuid] = device
+            target_location.device_dictionary = device_dictionary
+            self._index_device(location_id, device)
 
-            if device_uuid in target_location.device_dictionary.keys():
-                del target_location.device_dictionary[device_uuid]
-        else:
-            raise IndexError("Error Location Id is not correct !")
+            generation = self._next_generation()
+            self.location_generations[location_id] = generation
+            self.device_generations[device.uuid] = generation
+
+    def remove_device(self, location_id, device_uuid):
+        with self._inventory_lock:
+            # Check if the required Location Id is correct
+            if location_id in self.location_dictionary:
+                # Retrieve the target location object
+                target_location = self.location_dictionary[location_id]
+
+                if device_uuid in target_location.device_dictionary:
+                    device_dictionary = dict(target_location.device_dictionary)
+                    del device_dictionary[device_uuid]
+                    target_location.device_dictionary = device_dictionary
+                    self._remove_device_from_index(location_id, device_uuid)
+                    self.location_generations[location_id] = self._next_generation()
+            else:
+                raise IndexError("Error Location Id is not correct !")
 
     def get_device_by_id(self, device_id):
         """Return a device by its id"""
-        for location in self.location_dictionary.values():
-            if device_id in location.device_dictionary:
-                return location.device_dictionary[device_id]
+        index_entry = self.device_index.get(device_id)
+        if index_entry is not None:
+            return index_entry[1]
         return None
 
+    def get_device_location_id(self, device_id):
+        """Return the id of the location of a device or None if the device is not registered"""
+        index_entry = self.device_index.get(device_id)
+        if index_entry is not None:
+            return index_entry[0]
+        return None
+
+    def _add_devices_to_index(self, location):
+        """Add all the devices of a location to the global device index"""
+        generation = self.inventory_generation
+        for device in location.device_dictionary.values():
+            self._index_device(location.uuid, device)
+            self.device_generations[device.uuid] = generation
+
+    def _index_device(self, location_id, device):
+        """Add or replace a device in the global device index and in the secondary indexes"""
+        previous_entry = self.device_index.get(device.uuid)
+        if previous_entry is not None:
+            self._remove_device_attributes(previous_entry[1])
+            self.device_spatial_index.remove(device.uuid, previous_entry[1].latitude, previous_entry[1].longitude)
+        self.device_index[device.uuid] = (location_id, device)
+        self.device_spatial_index.put(device.uuid, device.latitude, device.longitude)
+        self._add_device_attributes(device)
+
+    def _add_device_attributes(self, device):
+        """Add a device to the secondary indexes"""
+        for attribute, attribute_index in self.device_attribute_indexes.items():
+            device_ids = attribute_index.get(getattr(device, attribute))
+            if device_ids is None:
+                attribute_index[getattr(device, attribute)] = {device.uuid}
+            else:
+                device_ids.add(device.uuid)
+
+    def _remove_device_attributes(self, device):
+        """Remove a device from the secondary indexes (dropping the values without devices)"""
+        for attribute, attribute_index in self.device_attribute_indexes.items():
+            value = getattr(device, attribute)
+            device_ids = attribute_index.get(value)
+            if device_ids is not None:
+                device_ids.discard(device.uuid)
+                if len(device_ids) == 0:
+                    del attribute_index[value]
+
+    def _remove_devices_from_index(self, location):
+        """Remove all the devices of a location from the global device index"""
+        for device_uuid in location.device_dictionary.keys():
+            self._remove_device_from_index(location.uuid, device_uuid)
+
+    def _remove_device_from_index(self, location_id, device_uuid):
+        """Remove a device from the global device index if it is still indexed for the given location"""
+        index_entry = self.device_index.get(device_uuid)
+        if index_entry is not None and index_entry[0] == location_id:
+            del self.device_index[device_uuid]
+            self._remove_device_attributes(index_entry[1])
+            self.device_spatial_index.remove(device_uuid, index_entry[1].latitude, index_entry[1].longitude)
+            self.device_generations.pop(device_uuid, None)
+
+    # BULK IMPORT
+
+    def add_locations_batch(self, location_list, validate_only: bool = False):
+        """
+        Add a batch of new locations publishing a single location dictionary snapshot.
+        The whole batch is validated first (new and distinct ids) and nothing is added if an entry is invalid.
+        :return: List of (position in the batch, reason) of the invalid entries (empty if the batch is added)
+        """
+        with self._inventory_lock:
+            error_list = []
+            batch_ids = set()
+            for position, location in enumerate(location_list):
+                if not isinstance(location, LocationModel):
+                    error_list.append((position, "Only LocationModel are allowed !"))
+                elif location.uuid in self.location_dictionary:
+                    error_list.append((position, "Location UUID already exists"))
+                elif location.uuid in batch_ids:
+                    error_list.append((position, "Duplicated Location UUID in the batch"))
+                else:
+                    batch_ids.add(location.uuid)
+            if len(error_list) > 0 or validate_only:
+                return error_list
+
+            generation = self._next_generation()
+            for location in location_list:
+                self.location_dictionary[location.uuid] = location
+                self.location_generations[location.uuid] = generation
+            self.location_writes += 1
+            self.location_spatial_index.put_many((location.uuid, location.latitude, location.longitude)
+                                                 for location in location_list)
+            for location in location_list:
+                self._add_devices_to_index(location)
+            return error_list
+
+    def add_devices_batch(self, device_list, validate_only: bool = False):
+        """
+        Add a batch of new devices (list of (location id, DeviceModel)) publishing a single device dictionary
+        snapshot for each updated location.
+        The whole batch is validated first (existing locations, new and distinct device ids) and nothing is added
+        if an entry is invalid.
+        :return: List of (position in the batch, reason) of the invalid entries (empty if the batch is added)
+        """
+        with self._inventory_lock:
+            error_list = []
+            batch_ids = set()
+            for position, (location_id, device) in enumerate(device_list):
+                if not isinstance(device, DeviceModel):
+                    error_list.append((position, "Only DeviceModel are allowed !"))
+                elif location_id not in self.location_dictionary:
+                    error_list.append((position, "Location Not Found !"))
+                elif device.uuid in self.device_index:
+                    error_list.append((position, "Device UUID already exists"))
+                elif device.uuid in batch_ids:
+                    error_list.append((position, "Duplicated Device UUID in the batch"))
+                else:
+                    batch_ids.add(device.uuid)
+            if len(error_list) > 0 or validate_only:
+                return error_list
+
+            # Group the devices by location to copy the device dictionary of each location once
+            location_devices = {}
+            for location_id, device in device_list:
+                location_devices.setdefault(location_id, []).append(device)
+
+            generation = self._next_generation()
+            for location_id, location_device_list in location_devices.items():
+                target_location = self.location_dictionary[location_id]
+                device_dictionary = dict(target_location.device_dictionary)
+                for device in location_device_list:
+                    device_dictionary[device.uuid] = device
+                target_location.device_dictionary = device_dictionary
+                for device in location_device_list:
+                    self.device_index[device.uuid] = (location_id, device)
+                    self._add_device_attributes(device)
+                    self.device_generations[device.uuid] = generation
+                self.location_generations[location_id] = generation
+
+            # The devices of a site usually share a few cells of the spatial index
+            self.device_spatial_index.put_many((device.uuid, device.latitude, device.longitude)
+                                               for _, device in device_list)
+            return error_list
+
+    # DEVICE SEARCH
+
+    def search_devices(self, filters: dict, location_id=None, limit=None, after_device_id=None):
+        """
+        Search the devices matching every filter (indexed attribute -> value), optionally in a single location.
+        The candidate ids are the intersection of the secondary index sets (smallest first), each set operation
+        is a single C-level call that writers cannot interleave, and the devices of the returned page
+        are checked against the filters so a concurrent update never returns a device that does not match.
+        :param filters: Dictionary indexed attribute (INDEXED_DEVICE_ATTRIBUTES) -> value
+        :param location_id: Optional location id
+        :param limit: Optional maximum number of devices returned
+        :param after_device_id: Optional cursor: only the devices with a greater id are returned
+        :return: (list of DeviceModel in device id order, total number of matching devices ignoring limit and cursor)
+        """
+        for attribute in filters:
+            if attribute not in self.device_attribute_indexes:
+                raise ValueError("Error searching the devices ! Unsupported filter: {} !".format(attribute))
+
+        location_devices = None
+        if location_id is not None:
+            target_location = self.location_dictionary.get(location_id)
+            if target_location is None:
+                raise IndexError("Error Location Id is not correct !")
+            location_devices = target_location.device_dictionary
+
+        # Candidate id collections: the index set of each filter and the device dictionary of the location
+        device_attribute_indexes = self.device_attribute_indexes
+        candidate_list = [device_attribute_indexes[attribute].get(value, ()) for attribute, value in filters.items()]
+        if location_devices is not None:
+            candidate_list.append(location_devices)
+
+        # Intersect from the smallest collection (the device dictionary of a location is an immutable snapshot)
+        candidate_list.sort(key=len)
+        if len(candidate_list) == 0:
+            device_ids = set(self.device_index)
+        else:
+            device_ids = set(candidate_list[0])
+            for candidate_ids in candidate_list[1:]:
+                if isinstance(candidate_ids, set):
+                    device_ids &= candidate_ids
+                else:
+                    device_ids = {device_id for device_id in device_ids if device_id in candidate_ids}
+        total_count = len(device_ids)
+
+        # Page in device id order (a partial sort when the page is limited)
+        if after_device_id is not None:
+            device_ids = [device_id for device_id in device_ids if device_id > after_device_id]
+        page_ids = heapq.nsmallest(limit, device_ids) if limit is not None else sorted(device_ids)
+
+        # Check the filters on the current devices (attrgetter returns a value for one attribute, a tuple otherwise)
+        filter_values = attrgetter(*filters) if len(filters) > 0 else None
+        expected_values = tuple(filters.values()) if len(filters) > 1 else next(iter(filters.values()), None)
+        device_index = self.device_index
+        device_list = []
+        for device_id in page_ids:
+            index_entry = device_index.get(device_id)
+            if index_entry is None or (location_id is not None and index_entry[0] != location_id):
+                continue
+            if filter_values is None or filter_values(index_entry[1]) == expected_values:
+                device_list.append(index_entry[1])
+        return device_list, total_count
+
+    # INVENTORY GENERATIONS
+
+    def _next_generation(self):
+        """Increment the global inventory generation (called with the writer lock held)"""
+        self.inventory_generation += 1
+        return self.inventory_generation
+
+    def get_inventory_generation(self):
+        """Return the generation of the last inventory write"""
+        return self.inventory_generation
+
+    def get_location_generation(self, location_id):
+        """Return the generation of the last write of a location or of its devices (None if not registered)"""
+        return self.location_generations.get(location_id)
+
+    def get_device_generation(self, device_id):
+        """Return the generation of the last write of a device (None if not registered)"""
+        return self.device_generations.get(device_id)
+
+    def get_telemetry_version(self, device_id):
+        """Return the number of telemetry readings stored for a device since its series was created (0 if none)"""
+        device_series = self._find_device_series(device_id)
+        if device_series is None:
+            return 0
+        return device_series.append_count
+
+    # SPATIAL QUERIES
+
+    def get_locations_in_area(self, min_latitude, min_longitude, max_latitude, max_longitude, limit=None):
+        """
+        Return the locations inside a bounding box (a min_longitude greater than max_longitude crosses the antimeridian)
+        :return: (list of LocationModel in location id order, total number of locations in the box ignoring limit)
+        """
+        location_ids = self.location_spatial_index.query_box(min_latitude, min_longitude, max_latitude, max_longitude)
+        page_ids = heapq.nsmallest(limit, location_ids) if limit is not None else sorted(location_ids)
+        location_list = [location for location in map(self.location_dictionary.get, page_ids) if location is not None]
+        return location_list, len(location_ids)
+
+    def get_devices_in_area(self, min_latitude, min_longitude, max_latitude, max_longitude, limit=None):
+        """
+        Return the devices inside a bounding box (a min_longitude greater than max_longitude crosses the antimeridian)
+        :return: (list of DeviceModel in device id order, total number of devices in the box ignoring limit)
+        """
+        device_ids = self.device_spatial_index.query_box(min_latitude, min_longitude, max_latitude, max_longitude)
+        page_ids = heapq.nsmallest(limit, device_ids) if limit is not None else sorted(device_ids)
+        device_index = self.device_index
+        device_list = [index_entry[1] for index_entry in map(device_index.get, page_ids) if index_entry is not None]
+        return device_list, len(device_ids)
+
+    def get_nearest_locations(self, latitude, longitude, count, max_distance=None):
+        """Return the count locations nearest to a point (optionally within max_distance meters)
+        :return: List of (distance in meters, LocationModel) tuples sorted by distance"""
+        location_dictionary = self.location_dictionary
+        nearest_list = []
+        for distance, location_id in self.location_spatial_index.nearest(latitude, longitude, count, max_distance):
+            location = location_dictionary.get(location_id)
+            if location is not None:
+                nearest_list.append((distance, location))
+        return nearest_list
+
+    def get_nearest_devices(self, latitude, longitude, count, max_distance=None):
+        """Return the count devices nearest to a point (optionally within max_distance meters)
+        :return: List of (distance in meters, DeviceModel) tuples sorted by distance"""
+        device_index = self.device_index
+        nearest_list = []
+        for distance, device_id in self.device_spatial_index.nearest(latitude, longitude, count, max_distance):
+            index_entry = device_index.get(device_id)
+            if index_entry is not None:
+                nearest_list.append((distance, index_entry[1]))
+        return nearest_list
+
     def get_devices_by_location(self, location_id):
         """Return a list of all devices for a given location"""
-        if location_id in self.location_dictionary:
-            return list(self.location_dictionary[location_id].device_dictionary.values())
+        target_location = self.location_dictionary.get(location_id)
+        if target_location is not None:
+            return list(target_location.device_dictionary.values())
         else:
             raise IndexError("Error Location Id is not correct !")
 
     def add_device_telemetry_data(self, device_id, telemetry_data):
         """Add a new telemetry data for a given device"""
-        if device_id not in self.device_timeseries_data:
-            self.device_timeseries_data[device_id] = []
-        self.device_timeseries_data[device_id].append(telemetry_data)
+        # Validate the reading before changing anything so an invalid reading leaves no partial update
+        timestamp = float(telemetry_data.timestamp)
+        value = float(telemetry_data.value)
+        if self.telemetry_log is not None:
+            self.telemetry_log.check_names(device_id, telemetry_data.data_type)
+
+        self._get_device_series(device_id).append(telemetry_data.timestamp,
+                                                  telemetry_data.data_type,
+                                                  telemetry_data.value)
+
+        # Update the rollups and the latest values of the device
+        self._get_device_rollups(device_id).add(timestamp, telemetry_data.data_type, value)
+        self._update_latest_value(device_id, timestamp, telemetry_data.data_type, value)
+
+        if self.telemetry_log is not None:
+            self.telemetry_log.append(device_id, telemetry_data.timestamp, telemetry_data.data_type, telemetry_data.value)
+
+    def _find_device_series(self, device_id):
+        """Return the TelemetrySeries of a device (rebuilt from the telemetry log if needed) or None"""
+        device_series = self.device_timeseries_data.get(device_id)
+        if device_series is None and self.telemetry_log is not None and self.telemetry_log.has_device(device_id):
+            device_series = self._hydrate_device_series(device_id)
+        return device_series
+
+    def _hydrate_device_series(self, device_id):
+        """Rebuild the series and the rollups of a device from its most recent readings in the telemetry log"""
+        with self._hydration_lock:
+            device_series = self.device_timeseries_data.get(device_id)
+            if device_series is None:
+                device_series = TelemetrySeries(self.telemetry_capacity)
+                device_rollups = self._get_device_rollups(device_id)
+                for timestamp, data_type, value in self.telemetry_log.read_device(device_id, self.telemetry_capacity):
+                    device_series.append(timestamp, data_type, value)
+                    device_rollups.add(timestamp, data_type, value)
+                    self._update_latest_value(device_id, timestamp, data_type, value)
+                self.device_timeseries_data[device_id] = device_series
+            return device_series
+
+    def _get_device_series(self, device_id):
+        """Return the TelemetrySeries of a device creating it if needed"""
+        device_series = self._find_device_series(device_id)
+        if device_series is None:
+            # setdefault is atomic: concurrent writers of a new device share the same series
+            device_series = self.device_timeseries_data.setdefault(device_id, TelemetrySeries(self.telemetry_capacity))
+        return device_series
+
+    def _get_device_rollups(self, device_id):
+        """Return the DeviceTelemetryRollups of a device creating them if needed"""
+        device_rollups = self.device_rollup_data.get(device_id)
+        if device_rollups is None:
+            device_rollups = self.device_rollup_data.setdefault(device_id, DeviceTelemetryRollups())
+        return device_rollups
+
+    def _update_latest_value(self, device_id, timestamp, data_type, value):
+        """Keep the most recent reading of each data type of a device (a late reading does not replace it).
+        The value of a known data type is replaced in place, a new data type publishes a new dictionary
+        so readers never iterate a growing dictionary."""
+        latest_values = self.device_latest_values.get(device_id)
+        if latest_values is None:
+            self.device_latest_values[device_id] = {data_type: (timestamp, value)}
+            return
+        latest_value = latest_values.get(data_type)
+        if latest_value is None:
+            latest_values = dict(latest_values)
+            latest_values[data_type] = (timestamp, value)
+            self.device_latest_values[device_id] = latest_values
+        elif timestamp >= latest_value[0]:
+            latest_values[data_type] = (timestamp, value)
+
+    def add_device_telemetry_data_batch(self, telemetry_batch):
+        """
+        Add a batch of (device_id, telemetry_data) tuples
+        An invalid reading is rejected without aborting the rest of the batch
+        :return: List of (position in the batch, error reason) tuples of the rejected readings
+        """
+        rejected_list = []
+        for position, (device_id, telemetry_data) in enumerate(telemetry_batch):
+            try:
+                self.add_device_telemetry_data(device_id, telemetry_data)
+            except Exception as e:
+                rejected_list.append((position, str(e)))
+        return rejected_list
 
     def get_telemetry_data_by_device_id(self, device_id):
-        """Return the telemetry data for a given device"""
-        if device_id in self.device_timeseries_data:
-            return self.device_timeseries_data[device_id]
+        """Return the TelemetrySeries for a given device"""
+        return self._find_device_series(device_id)
+
+    def get_latest_values(self, device_id):
+        """Return the latest reading of each data type of a device as a dictionary data type -> (timestamp, value)
+        (empty if the device has no telemetry data)"""
+        latest_values = self.device_latest_values.get(device_id)
+        if latest_values is None and self.telemetry_log is not None and self.telemetry_log.has_device(device_id):
+            # Rebuilt with the series of the device
+            self._find_device_series(device_id)
+            latest_values = self.device_latest_values.get(device_id)
+        return latest_values if latest_values is not None else {}
+
+    def get_location_latest_values(self, location_id):
+        """Return the (device id, latest values) of every device of a location
+        (None if the location is not registered)"""
+        target_location = self.location_dictionary.get(location_id)
+        if target_location is None:
+            return None
+        return [(device_id, self.get_latest_values(device_id)) for device_id in target_location.device_dictionary]
+
+    def get_telemetry_data_in_range(self, device_id, from_timestamp=None, to_timestamp=None, data_type=None, limit=None):
+        """
+        Return the telemetry data of a device with from_timestamp <= timestamp <= to_timestamp
+        The range is located with a binary search on the time-sorted series
+        :param data_type: Optional data type filter
+        :param limit: Optional maximum number of readings (the most recent ones are kept)
+        :return: (timestamps, data_types, values) columns in chronological order or None if the device has no data
+        """
+        device_series = self._find_device_series(device_id)
+        if device_series is None:
+            return None
+
+        start, end = device_series.index_range(from_timestamp, to_timestamp)
+
+        if data_type is None:
+            if limit is not None:
+                start = max(start, end - limit)
+            return device_series.slice_columns(start, end)
+
+        timestamps, data_types, values = device_series.slice_columns(start, end)
+        selected_indexes = [index for index, reading_data_type in enumerate(data_types) if reading_data_type == data_type]
+        if limit is not None:
+            selected_indexes = selected_indexes[max(0, len(selected_indexes) - limit):]
+
+        return ([timestamps[index] for index in selected_indexes],
+                [data_type] * len(selected_indexes),
+                [values[index] for index in selected_indexes])
+
+    def get_telemetry_page(self, device_id, page_size, cursor_timestamp=None, cursor_skip=0):
+        """
+        Return a page of the telemetry data of a device from the newest to the oldest reading
+        The page ends with the readings with timestamp <= cursor_timestamp, skipping the cursor_skip readings
+        with timestamp == cursor_timestamp already returned by the previous page
+        :return: ((timestamps, data_types, values) columns in chronological order,
+                  (cursor_timestamp, cursor_skip) of the next page or None, total number of readings)
+                  or None if the device has no data
+        """
+        device_series = self._find_device_series(device_id)
+        if device_series is None:
+            return None
+
+        if cursor_timestamp is None:
+            end = len(device_series)
         else:
+            end = max(0, device_series.bisect_right(cursor_timestamp) - cursor_skip)
+
+        start = max(0, end - page_size)
+        timestamps, data_types, values = device_series.slice_columns(start, end)
+
+        next_cursor = None
+        if start > 0 and len(timestamps) > 0:
+            # The next page skips the readings with the same timestamp as the oldest one of this page
+            oldest_timestamp = timestamps[0]
+            next_cursor = (oldest_timestamp, device_series.bisect_right(oldest_timestamp) - start)
+
+        return (timestamps, data_types, values), next_cursor, len(device_series)
+
+    def get_telemetry_rollup(self, device_id, resolution, from_timestamp=None, to_timestamp=None, data_type=None):
+        """
+        Return the aggregated telemetry data of a device for a rollup resolution ("1m", "1h" or "1d")
+        :return: Dictionary data type -> list of (bucket_start, count, min, max, mean) tuples or None if the device has no data
+        """
+        if resolution not in DeviceTelemetryRollups.RESOLUTIONS:
+            raise ValueError("Unsupported rollup resolution ! Supported resolutions: " +
+                             ", ".join(DeviceTelemetryRollups.RESOLUTIONS))
+
+        # Rebuild the series and the rollups of the device from the telemetry log if needed
+        self._find_device_series(device_id)
+
+        device_rollups = self.device_rollup_data.get(device_id)
+        if device_rollups is None:
             return None
+        return device_rollups.query(resolution, from_timestamp, to_timestamp, data_type)
+
+    def get_telemetry_store_statistics(self):
+        """Return a dictionary with the number of telemetry series, the readings they keep
+        and an estimate of the bytes of their columns"""
+        series_list = list(self.device_timeseries_data.values())
+        return {
+            "series": len(series_list),
+            "points": sum(len(device_series) for device_series in series_list),
+            "bytes": sum(device_series.memory_size() for device_series in series_list)
+        }
+
+    def delete_telemetry_segments_before(self, timestamp):
+        """Delete the telemetry log segments with readings older than timestamp (retention)
+        :return: Number of deleted segments"""
+        if self.telemetry_log is None:
+            return 0
+        return self.telemetry_log.delete_segments_before(timestamp)
 
     def is_location_registered(self, location_id):
         """Check if a location is registered"""
@@ -0,0 +1,202 @@
+"""
+Compact binary snapshot of the inventory (locations and their devices).
+Layout (little endian):
+- header: magic, version, string count, location count, device count
+- string table: the character length of every distinct string followed by all the strings
+  concatenated in a single UTF-8 blob (decoded with a single call on load)
+- location records: uuid, name (string indexes), latitude, longitude, device count
+- device records (grouped by location in the location order): uuid, name, type, manufacturer,
+  software version (string indexes), latitude, longitude
+The string index NO_STRING (the first entry of the string table) is used for None strings
+and None coordinates are stored as NaN.
+"""
+import gc
+import math
+import os
+import struct
+import threading
+from array import array
+from contextlib import contextmanager
+
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from application.monitoring.structured_logging import get_logger
+
+SNAPSHOT_MAGIC = b"INVS"
+SNAPSHOT_VERSION = 1
+
+HEADER_STRUCT = struct.Struct("<4sHIII")
+LOCATION_STRUCT = struct.Struct("<IIddI")
+DEVICE_STRUCT = struct.Struct("<IIIIIdd")
+
+NO_STRING = 0
+
+LOGGER = get_logger("data")
+
+
+def _encode_coordinate(coordinate):
+    return math.nan if coordinate is None else float(coordinate)
+
+
+def write_inventory_snapshot(file_path, location_list):
+    """
+    Write the snapshot of a list of LocationModel (with their devices) replacing the file atomically
+    :return: (location count, device count)
+    """
+    # The first entry is reserved for None
+    string_list = [""]
+    string_indexes = {}
+
+    def string_index(value):
+        if value is None:
+            return NO_STRING
+        value = str(value)
+        index = string_indexes.get(value)
+        if index is None:
+            index = len(string_list)
+            string_list.append(value)
+            string_indexes[value] = index
+        return index
+
+    location_records = bytearray()
+    device_records = bytearray()
+    device_count = 0
+
+    for location in location_list:
+        device_list = list(location.device_dictionary.values())
+        location_records += LOCATION_STRUCT.pack(string_index(location.uuid),
+                                                 string_index(location.name),
+                                                 _encode_coordinate(location.latitude),
+                                                 _encode_coordinate(location.longitude),
+                                                 len(device_list))
+        for device in device_list:
+            device_records += DEVICE_STRUCT.pack(string_index(device.uuid),
+                                                 string_index(device.name),
+                                                 string_index(device.type),
+                                                 string_index(device.manufacturer),
+                                                 string_index(device.software_version),
+                                                 _encode_coordinate(device.latitude),
+                                                 _encode_coordinate(device.longitude))
+        device_count += len(device_list)
+
+    location_count = len(location_records) // LOCATION_STRUCT.size
+    string_lengths = array('I', [len(value) for value in string_list])
+    string_blob = "".join(string_list).encode("utf-8")
+
+    temporary_file_path = file_path + ".tmp"
+    with open(temporary_file_path, "wb") as snapshot_file:
+        snapshot_file.write(HEADER_STRUCT.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(string_list),
+                                               location_count, device_count))
+        snapshot_file.write(string_lengths.tobytes())
+        snapshot_file.write(struct.pack("<I", len(string_blob)))
+        snapshot_file.write(string_blob)
+        snapshot_file.write(location_records)
+        snapshot_file.write(device_records)
+    os.replace(temporary_file_path, file_path)
+
+    return location_count, device_count
+
+
+def read_inventory_snapshot(file_path):
+    """
+    Read a snapshot with a single bulk read
+    :return: List of LocationModel with their device dictionaries filled
+    """
+    with open(file_path, "rb") as snapshot_file:
+        buffer = memoryview(snapshot_file.read())
+
+    magic, version, string_count, location_count, device_count = HEADER_STRUCT.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("Error reading the inventory snapshot {} ! Invalid header !".format(file_path))
+    offset = HEADER_STRUCT.size
+
+    # String table
+    string_lengths = array('I')
+    string_lengths.frombytes(buffer[offset:offset + string_count * string_lengths.itemsize])
+    offset += string_count * string_lengths.itemsize
+    blob_size, = struct.unpack_from("<I", buffer, offset)
+    offset += 4
+    string_blob = bytes(buffer[offset:offset + blob_size]).decode("utf-8")
+    offset += blob_size
+
+    string_list = []
+    position = 0
+    for length in string_lengths:
+        string_list.append(string_blob[position:position + length])
+        position += length
+    string_list[NO_STRING] = None
+
+    # Location and device records
+    location_end = offset + location_count * LOCATION_STRUCT.size
+    device_records = DEVICE_STRUCT.iter_unpack(buffer[location_end:location_end + device_count * DEVICE_STRUCT.size])
+
+    location_list = []
+    for uuid_index, name_index, latitude, longitude, location_device_count in \
+            LOCATION_STRUCT.iter_unpack(buffer[offset:location_end]):
+        # NaN coordinates (the only values different from themselves) are restored as None
+        location = LocationModel(string_list[uuid_index],
+                                 string_list[name_index],
+                                 latitude if latitude == latitude else None,
+                                 longitude if longitude == longitude else None)
+        device_dictionary = location.device_dictionary
+        for _ in range(location_device_count):
+            device_uuid_index, device_name_index, type_index, manufacturer_index, software_version_index, \
+                device_latitude, device_longitude = next(device_records)
+            device = DeviceModel(string_list[device_uuid_index],
+                                 string_list[device_name_index],
+                                 location.uuid,
+                                 string_list[type_index],
+                                 string_list[manufacturer_index],
+                                 string_list[software_version_index],
+                                 device_latitude if device_latitude == device_latitude else None,
+                                 device_longitude if device_longitude == device_longitude else None)
+            device_dictionary[device.uuid] = device
+        location_list.append(location)
+
+    return location_list
+
+
+@contextmanager
+def paused_garbage_collection():
+    """Pause the garbage collector while loading a snapshot: the collections triggered
+    by the allocation of many long-lived models would otherwise dominate the load time"""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+class InventorySnapshotWriter:
+    """
+    Periodically write the inventory snapshot of a DataManager in a background thread
+    and write a last snapshot when stopped
+    """
+
+    def __init__(self, data_manager, file_path: str, interval: float):
+        self.data_manager = data_manager
+        self.file_path = file_path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.writer_thread = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.data_manager.save_inventory_snapshot(self.file_path)
+            except OSError as e:
+                LOGGER.error("snapshot_error", "Error writing the inventory snapshot", file_path=self.file_path,
+                             reason=str(e))
+
+    def start(self):
+        self.writer_thread = threading.Thread(target=self.run, daemon=True)
+        self.writer_thread.start()
+
+    def stop(self):
+        """Stop the periodic writer and write the final snapshot"""
+        self.stop_event.set()
+        if self.writer_thread is not None:
+            self.writer_thread.join()
+        self.data_manager.save_inventory_snapshot(self.file_path)
@@ -0,0 +1,219 @@
+"""
+Shared-memory telemetry area written by the ingest worker processes and read by the main process.
+The area (multiprocessing.shared_memory) is split into one partition per worker process so every partition
+has a single writer and no lock is shared between processes. Each partition contains:
+- a header: write count (published records), read count (records consumed by the reader) and dropped count,
+  each count being written by a single side
+- a ring of fixed-size records: device id and data type (length-prefixed UTF-8 names stored inline),
+  timestamp and value
+Names are stored in every record instead of a table of the names seen by the partition, so the partition
+has no state growing with the number of distinct device ids (e.g. random ids of unregistered devices).
+The writer stores the records before publishing them by updating the write count, and never overwrites
+records that have not been consumed yet (the reading is dropped and counted instead, as are readings
+with a name longer than MAX_NAME_SIZE bytes).
+The reader unpacks the records straight from the shared buffer with struct.iter_unpack: readings cross the
+process boundary without pickling or pipes.
+"""
+import struct
+from multiprocessing import shared_memory
+
+
+class SharedTelemetryStore:
+    """
+    Partitioned ring buffers of telemetry readings in a named shared memory block.
+    The main process creates the store (create=True) and the worker processes attach to it by name.
+    A partition must be written by a single thread at a time (the writer threads of a process share a lock)
+    and read by a single thread.
+    """
+
+    MAGIC = b"TSHM"
+    VERSION = 2
+
+    # magic, version, partition count, record capacity
+    HEADER_STRUCT = struct.Struct("<4sHHI")
+    HEADER_SIZE = 64
+
+    # Partition header fields: each one is written by a single side (the read count by the reader, the others
+    # by the writer) and the write count is updated last to publish the records
+    COUNT_STRUCT = struct.Struct("<Q")
+    WRITE_COUNT_OFFSET = 0
+    READ_COUNT_OFFSET = 8
+    DROPPED_COUNT_OFFSET = 16
+    PARTITION_HEADER_SIZE = 64
+
+    # Names are stored as a length byte followed by the UTF-8 name (padded with zeros)
+    MAX_NAME_SIZE = 64
+
+    # device id, data type, timestamp, value
+    RECORD_STRUCT = struct.Struct("<{0}s{0}sdd".format(MAX_NAME_SIZE + 1))
+
+    # Default number of records of the ring of each partition
+    DEFAULT_RECORD_CAPACITY = 65536
+
+    # Maximum number of encoded (writer side) and decoded (reader side) names kept in the local caches
+    NAME_CACHE_SIZE = 65536
+
+    def __init__(self, name: str = None, partition_count: int = 1, record_capacity: int = DEFAULT_RECORD_CAPACITY,
+                 create: bool = True):
+        """Create a new shared memory block (name None for a generated name) or attach to an existing one"""
+
+        if create:
+            if partition_count <= 0 or record_capacity <= 0:
+                raise ValueError("Error creating the SharedTelemetryStore ! Capacities must be positive !")
+            partition_size = self._partition_size(record_capacity)
+            self._shared_memory = shared_memory.SharedMemory(name=name, create=True,
+                                                             size=self.HEADER_SIZE + partition_count * partition_size)
+            self.HEADER_STRUCT.pack_into(self._shared_memory.buf, 0, self.MAGIC, self.VERSION, partition_count,
+                                         record_capacity)
+        else:
+            self._shared_memory = shared_memory.SharedMemory(name=name)
+            magic, version, partition_count, record_capacity = self.HEADER_STRUCT.unpack_from(self._shared_memory.buf, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                self._shared_memory.close()
+                raise ValueError("Error attaching the SharedTelemetryStore {} ! Invalid header !".format(name))
+
+        self.name = self._shared_memory.name
+        self.owner = create
+        self.partition_count = partition_count
+        self.record_capacity = record_capacity
+        self.partition_size = self._partition_size(record_capacity)
+
+        # Local caches of the names: name -> length-prefixed UTF-8 field (writer side) and vice versa (reader side)
+        self._encoded_names = {}
+        self._decoded_names = {}
+
+    @classmethod
+    def _partition_size(cls, record_capacity):
+        return cls.PARTITION_HEADER_SIZE + record_capacity * cls.RECORD_STRUCT.size
+
+    def _partition_offset(self, partition_index):
+        if not 0 <= partition_index < self.partition_count:
+            raise IndexError("Error SharedTelemetryStore partition index is not correct !")
+        return self.HEADER_SIZE + partition_index * self.partition_size
+
+    def _read_count(self, partition_offset, field_offset):
+        return self.COUNT_STRUCT.unpack_from(self._shared_memory.buf, partition_offset + field_offset)[0]
+
+    def _write_count(self, partition_offset, field_offset, count):
+        self.COUNT_STRUCT.pack_into(self._shared_memory.buf, partition_offset + field_offset, count)
+
+    def _encode_name(self, name):
+        """Return the length-prefixed UTF-8 field of a name (None if the name is longer than MAX_NAME_SIZE bytes)"""
+        field = self._encoded_names.get(name)
+        if field is None:
+            encoded_name = str(name).encode("utf-8")
+            if len(encoded_name) > self.MAX_NAME_SIZE:
+                return None
+            field = bytes((len(encoded_name),)) + encoded_name
+            if len(self._encoded_names) >= self.NAME_CACHE_SIZE:
+                self._encoded_names.clear()
+            self._encoded_names[name] = field
+        return field
+
+    def _decode_name(self, field):
+        """Return the name of a length-prefixed UTF-8 field (as read from the record, padded with zeros)"""
+        name = self._decoded_names.get(field)
+        if name is None:
+            name = field[1:1 + field[0]].decode("utf-8", "replace")
+            if len(self._decoded_names) >= self.NAME_CACHE_SIZE:
+                self._decoded_names.clear()
+            self._decoded_names[field] = name
+        return name
+
+    def write_batch(self, partition_index: int, telemetry_rows):
+        """
+        Append a list of (device_id, timestamp, data_type, value) readings to a partition
+        Readings that do not fit (ring full of unconsumed records) or with a name longer than MAX_NAME_SIZE bytes
+        are dropped
+        :return: List of (position in the batch, reason) tuples of the dropped readings
+        """
+        partition_offset = self._partition_offset(partition_index)
+        write_count = self._read_count(partition_offset, self.WRITE_COUNT_OFFSET)
+        read_count = self._read_count(partition_offset, self.READ_COUNT_OFFSET)
+        dropped_count = self._read_count(partition_offset, self.DROPPED_COUNT_OFFSET)
+
+        buffer = self._shared_memory.buf
+        records_offset = partition_offset + self.PARTITION_HEADER_SIZE
+        record_size = self.RECORD_STRUCT.size
+        record_capacity = self.record_capacity
+        pack_into = self.RECORD_STRUCT.pack_into
+        encoded_names = self._encoded_names
+
+        written_count = 0
+        dropped_list = []
+        for position, (device_id, timestamp, data_type, value) in enumerate(telemetry_rows):
+            if write_count + written_count - read_count >= record_capacity:
+                dropped_list.append((position, "Shared telemetry store full"))
+                continue
+
+            device_field = encoded_names.get(device_id) or self._encode_name(device_id)
+            data_type_field = encoded_names.get(data_type) or self._encode_name(data_type)
+            if device_field is None or data_type_field is None:
+                dropped_list.append((position, "Names are limited to {} bytes".format(self.MAX_NAME_SIZE)))
+                continue
+
+            record_position = (write_count + written_count) % record_capacity
+            pack_into(buffer, records_offset + record_position * record_size,
+                      device_field, data_type_field, float(timestamp), float(value))
+            written_count += 1
+
+        # Publish the records
+        self._write_count(partition_offset, self.DROPPED_COUNT_OFFSET, dropped_count + len(dropped_list))
+        self._write_count(partition_offset, self.WRITE_COUNT_OFFSET, write_count + written_count)
+        return dropped_list
+
+    def read_batch(self, partition_index: int, max_records: int = None):
+        """
+        Consume the readings published in a partition since the previous call
+        :param max_records: Optional maximum number of readings to consume
+        :return: List of (device_id, timestamp, data_type, value) tuples in write order
+        """
+        partition_offset = self._partition_offset(partition_index)
+        write_count = self._read_count(partition_offset, self.WRITE_COUNT_OFFSET)
+        read_count = self._read_count(partition_offset, self.READ_COUNT_OFFSET)
+
+        end_count = write_count if max_records is None else min(write_count, read_count + max_records)
+        if end_count == read_count:
+            return []
+
+        # Unpack the records of the ring (in at most two contiguous slices)
+        buffer = self._shared_memory.buf
+        records_offset = partition_offset + self.PARTITION_HEADER_SIZE
+        record_size = self.RECORD_STRUCT.size
+        start_position = read_count % self.record_capacity
+        end_position = start_position + (end_count - read_count)
+
+        slices = [(start_position, min(end_position, self.record_capacity))]
+        if end_position > self.record_capacity:
+            slices.append((0, end_position - self.record_capacity))
+
+        decoded_names = self._decoded_names
+        decode_name = self._decode_name
+        telemetry_rows = []
+        for start, end in slices:
+            records = buffer[records_offset + start * record_size:records_offset + end * record_size]
+            try:
+                telemetry_rows.extend((decoded_names.get(device_field) or decode_name(device_field), timestamp,
+                                       decoded_names.get(data_type_field) or decode_name(data_type_field), value)
+                                      for device_field, data_type_field, timestamp, value
+                                      in self.RECORD_STRUCT.iter_unpack(records))
+            finally:
+                records.release()
+
+        # Release the consumed records to the writer
+        self._write_count(partition_offset, self.READ_COUNT_OFFSET, end_count)
+        return telemetry_rows
+
+    def get_partition_statistics(self, partition_index: int):
+        """Return a dictionary with the counts of a partition"""
+        partition_offset = self._partition_offset(partition_index)
+        write_count = self._read_count(partition_offset, self.WRITE_COUNT_OFFSET)
+        read_count = self._read_count(partition_offset, self.READ_COUNT_OFFSET)
+        return {"written": write_count, "read": read_count, "pending": write_count - read_count,
+                "dropped": self._read_count(partition_offset, self.DROPPED_COUNT_OFFSET)}
+
+    def close(self):
+        """Detach from the shared memory block (and destroy it if this store created it)"""
+        self._shared_memory.close()
+        if self.owner:
+            self._shared_memory.unlink()
@@ -0,0 +1,338 @@
+"""
+Spatial index of the inventory coordinates: a uniform latitude/longitude grid of cell_size degrees
+mapping each occupied cell to the items (id -> (latitude, longitude)) located in it.
+- bounding box queries read the cells covering the box and only check the coordinates of the border cells
+- nearest neighbour queries read the rings of cells around the point until enough candidates are found,
+  then the cells of the bounding box of the circle through the farthest candidate (great-circle distances).
+  The ring search visits a bounded number of cells: far from every item (or with a large max_distance) the
+  occupied coarse cells (COARSE_FACTOR x COARSE_FACTOR cells) are read by increasing lower bound of their
+  distance to the point until no coarse cell can contain a nearer item
+When the cells of a query outnumber the occupied cells, the occupied cells are iterated instead,
+so sparse inventories (or huge boxes) never scan empty cells.
+Cells are replaced (copy-on-write) by the writers, so readers never lock.
+"""
+import heapq
+import math
+
+# Mean Earth radius (meters)
+EARTH_RADIUS = 6371008.8
+
+
+def great_circle_distance(latitude_a, longitude_a, latitude_b, longitude_b):
+    """Return the haversine distance in meters between two points"""
+    latitude_a = math.radians(latitude_a)
+    latitude_b = math.radians(latitude_b)
+    half_delta_latitude = (latitude_b - latitude_a) / 2
+    half_delta_longitude = math.radians(longitude_b - longitude_a) / 2
+    h = math.sin(half_delta_latitude) ** 2 + \
+        math.cos(latitude_a) * math.cos(latitude_b) * math.sin(half_delta_longitude) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+
+def check_coordinates(latitude, longitude):
+    """Raise a ValueError if the coordinates are not valid"""
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError("Invalid coordinates ! Latitude must be between -90 and 90 "
+                         "and longitude between -180 and 180 !")
+
+
+class SpatialGridIndex:
+
+    # Default cell size in degrees (about 1.1 km of latitude)
+    DEFAULT_CELL_SIZE = 0.01
+
+    # Cells per side of a coarse cell and maximum number of cells visited by the ring search of a nearest query
+    COARSE_FACTOR = 32
+    RING_CELL_BUDGET = 4096
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE):
+        if cell_size <= 0 or cell_size > 90:
+            raise ValueError("Error creating the SpatialGridIndex ! Invalid cell size: {} !".format(cell_size))
+        self.cell_size = cell_size
+        self.column_count = int(math.ceil(360 / cell_size))
+        self.row_count = int(math.ceil(180 / cell_size))
+
+        # (column, row) -> {item id: (latitude, longitude)} (replaced, never mutated)
+        self._cells = {}
+        self._item_count = 0
+
+        # (coarse column, coarse row) -> frozenset of the keys of its occupied cells (replaced, never mutated)
+        self._coarse_cells = {}
+
+        # Upper bound of the distance in meters between the center of a coarse cell and any point of the cell
+        # (haversine with at most half a coarse cell of latitude and longitude difference)
+        half_coarse_size = math.radians(cell_size * self.COARSE_FACTOR) / 4
+        self._coarse_radius = 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(2) * math.sin(half_coarse_size)))
+
+    def __len__(self):
+        return self._item_count
+
+    def _cell_key(self, latitude, longitude):
+        column = min(self.column_count - 1, int((longitude + 180) / self.cell_size))
+        row = min(self.row_count - 1, int((latitude + 90) / self.cell_size))
+        return column, row
+
+    @staticmethod
+    def is_indexable(latitude, longitude):
+        """Items without valid coordinates (None, NaN or out of range) are not indexed"""
+        return latitude is not None and longitude is not None and -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+    def put(self, item_id, latitude, longitude):
+        """Add an item (call remove() with its previous coordinates before moving an item)"""
+        if not self.is_indexable(latitude, longitude):
+            return
+        cell_key = self._cell_key(latitude, longitude)
+        previous_cell = self._cells.get(cell_key)
+        cell = dict(previous_cell or ())
+        if item_id not in cell:
+            self._item_count += 1
+        cell[item_id] = (latitude, longitude)
+        self._cells[cell_key] = cell
+        if previous_cell is None:
+            self._add_coarse_cell(cell_key)
+
+    def put_many(self, items):
+        """Add an iterable of new (item id, latitude, longitude) copying each updated cell once"""
+        cell_items = {}
+        for item_id, latitude, longitude in items:
+            if self.is_indexable(latitude, longitude):
+                cell_items.setdefault(self._cell_key(latitude, longitude), {})[item_id] = (latitude, longitude)
+        for cell_key, items_of_cell in cell_items.items():
+            previous_cell = self._cells.get(cell_key)
+            cell = dict(previous_cell or ())
+            item_count = len(cell)
+            cell.update(items_of_cell)
+            self._item_count += len(cell) - item_count
+            self._cells[cell_key] = cell
+            if previous_cell is None:
+                self._add_coarse_cell(cell_key)
+
+    def remove(self, item_id, latitude, longitude):
+        """Remove an item indexed with the given coordinates (nothing happens if it is not indexed)"""
+        if not self.is_indexable(latitude, longitude):
+            return
+        cell_key = self._cell_key(latitude, longitude)
+        cell = self._cells.get(cell_key)
+        if cell is None or item_id not in cell:
+            return
+        if len(cell) == 1:
+            del self._cells[cell_key]
+            self._remove_coarse_cell(cell_key)
+        else:
+            cell = dict(cell)
+            del cell[item_id]
+            self._cells[cell_key] = cell
+        self._item_count -= 1
+
+    @classmethod
+    def build(cls, items, cell_size: float = DEFAULT_CELL_SIZE):
+        """Build an index from an iterable of (item id, latitude, longitude) in bulk"""
+        spatial_index = cls(cell_size)
+        cells = spatial_index._cells
+        for item_id, latitude, longitude in items:
+            if spatial_index.is_indexable(latitude, longitude):
+                cells.setdefault(spatial_index._cell_key(latitude, longitude), {})[item_id] = (latitude, longitude)
+        spatial_index._item_count = sum(len(cell) for cell in cells.values())
+
+        coarse_cells = {}
+        for cell_key in cells:
+            coarse_cells.setdefault(spatial_index._coarse_key(cell_key), set()).add(cell_key)
+        spatial_index._coarse_cells = {coarse_key: frozenset(cell_keys) for coarse_key, cell_keys in coarse_cells.items()}
+        return spatial_index
+
+    def _coarse_key(self, cell_key):
+        return cell_key[0] // self.COARSE_FACTOR, cell_key[1] // self.COARSE_FACTOR
+
+    def _add_coarse_cell(self, cell_key):
+        """Register a new occupied cell in its coarse cell"""
+        coarse_key = self._coarse_key(cell_key)
+        self._coarse_cells[coarse_key] = self._coarse_cells.get(coarse_key, frozenset()) | {cell_key}
+
+    def _remove_coarse_cell(self, cell_key):
+        """Unregister a cell without items from its coarse cell"""
+        coarse_key = self._coarse_key(cell_key)
+        cell_keys = self._coarse_cells.get(coarse_key, frozenset()) - {cell_key}
+        if len(cell_keys) > 0:
+            self._coarse_cells[coarse_key] = cell_keys
+        else:
+            self._coarse_cells.pop(coarse_key, None)
+
+    def _coarse_lower_bound(self, latitude, longitude, coarse_key):
+        """Return a lower bound of the distance in meters between a point and any point of a coarse cell"""
+        coarse_size = self.cell_size * self.COARSE_FACTOR
+        center_latitude = (coarse_key[1] + 0.5) * coarse_size - 90
+        if not -90 <= center_latitude <= 90:
+            # Partial coarse cell of the last row: no bound
+            return 0.0
+        center_longitude = (coarse_key[0] + 0.5) * coarse_size - 180
+        return max(0.0, great_circle_distance(latitude, longitude, center_latitude, center_longitude) -
+                   self._coarse_radius)
+
+    def _column_ranges(self, min_longitude, max_longitude):
+        """Return the (first, last) column ranges of a longitude interval (two ranges across the antimeridian)"""
+        first_column = self._cell_key(0, min_longitude)[0]
+        last_column = self._cell_key(0, max_longitude)[0]
+        if min_longitude <= max_longitude:
+            return [(first_column, last_column)]
+        if first_column <= last_column:
+            # Both ends of the interval are in the same column: every column is read once
+            return [(0, self.column_count - 1)]
+        return [(first_column, self.column_count - 1), (0, last_column)]
+
+    def _cells_in_box(self, min_latitude, min_longitude, max_latitude, max_longitude):
+        """Yield the (column, row, cell) of the occupied cells intersecting a box"""
+        first_row = self._cell_key(min_latitude, 0)[1]
+        last_row = self._cell_key(max_latitude, 0)[1]
+        column_ranges = self._column_ranges(min_longitude, max_longitude)
+        box_cell_count = (last_row - first_row + 1) * sum(last - first + 1 for first, last in column_ranges)
+
+        if box_cell_count > len(self._cells):
+            # Fewer occupied cells than cells in the box
+            for (column, row), cell in list(self._cells.items()):
+                if first_row <= row <= last_row and any(first <= column <= last for first, last in column_ranges):
+                    yield column, row, cell
+        else:
+            cells = self._cells
+            for first_column, last_column in column_ranges:
+                for column in range(first_column, last_column + 1):
+                    for row in range(first_row, last_row + 1):
+                        cell = cells.get((column, row))
+                        if cell is not None:
+                            yield column, row, cell
+
+    def query_box(self, min_latitude, min_longitude, max_latitude, max_longitude):
+        """
+        Return the ids of the items inside a box (bounds included)
+        A min_longitude greater than max_longitude selects a box across the antimeridian
+        """
+        check_coordinates(min_latitude, min_longitude)
+        check_coordinates(max_latitude, max_longitude)
+        if min_latitude > max_latitude:
+            raise ValueError("Invalid box ! The minimum latitude must be lower than or equal to the maximum latitude !")
+
+        across_antimeridian = min_longitude > max_longitude
+        cell_size = self.cell_size
+        item_ids = []
+        for column, row, cell in self._cells_in_box(min_latitude, min_longitude, max_latitude, max_longitude):
+            # Cells entirely inside the box do not need the coordinate check
+            cell_min_latitude = row * cell_size - 90
+            cell_min_longitude = column * cell_size - 180
+            inside_latitude = min_latitude < cell_min_latitude and cell_min_latitude + cell_size < max_latitude
+            if across_antimeridian:
+                inside_longitude = cell_min_longitude > min_longitude or \
+                                   cell_min_longitude + cell_size < max_longitude
+            else:
+                inside_longitude = min_longitude < cell_min_longitude and \
+                                   cell_min_longitude + cell_size < max_longitude
+            if inside_latitude and inside_longitude:
+                item_ids.extend(cell)
+            elif across_antimeridian:
+                item_ids.extend(item_id for item_id, (latitude, longitude) in cell.items()
+                                if min_latitude <= latitude <= max_latitude and
+                                (longitude >= min_longitude or longitude <= max_longitude))
+            else:
+                item_ids.extend(item_id for item_id, (latitude, longitude) in cell.items()
+                                if min_latitude <= latitude <= max_latitude and
+                                min_longitude <= longitude <= max_longitude)
+        return item_ids
+
+    def _circle_box(self, latitude, longitude, distance):
+        """Return the (min latitude, min longitude, max latitude, max longitude) box containing a circle
+        (the whole longitude range if the circle contains a pole)"""
+        angular_distance = distance / EARTH_RADIUS
+        min_latitude = latitude - math.degrees(angular_distance)
+        max_latitude = latitude + math.degrees(angular_distance)
+        if min_latitude <= -90 or max_latitude >= 90 or angular_distance >= math.pi / 2:
+            return max(-90.0, min_latitude), -180.0, min(90.0, max_latitude), 180.0
+
+        delta_longitude = math.degrees(math.asin(min(1.0, math.sin(angular_distance) /
+                                                     math.cos(math.radians(latitude)))))
+        min_longitude = longitude - delta_longitude
+        max_longitude = longitude + delta_longitude
+        if min_longitude < -180:
+            min_longitude += 360
+        if max_longitude > 180:
+            max_longitude -= 360
+        if delta_longitude >= 180:
+            min_longitude, max_longitude = -180.0, 180.0
+        return min_latitude, min_longitude, max_latitude, max_longitude
+
+    def _ring_keys(self, center_column, center_row, ring):
+        """Yield the keys of the cells at a ring distance from a cell (columns wrap around the antimeridian)"""
+        if ring == 0:
+            yield center_column, center_row
+            return
+        for row in (center_row - ring, center_row + ring):
+            if 0 <= row < self.row_count:
+                for column_offset in range(-ring, ring + 1):
+                    yield (center_column + column_offset) % self.column_count, row
+        for row in range(max(0, center_row - ring + 1), min(self.row_count, center_row + ring)):
+            yield (center_column - ring) % self.column_count, row
+            yield (center_column + ring) % self.column_count, row
+
+    def nearest(self, latitude, longitude, count: int, max_distance: float = None):
+        """
+        Return the count items nearest to a point
+        :param max_distance: Optional maximum distance in meters
+        :return: List of (distance in meters, item id) tuples sorted by distance
+        """
+        check_coordinates(latitude, longitude)
+        if count <= 0:
+            raise ValueError("Invalid count ! The count must be positive !")
+
+        center_column, center_row = self._cell_key(latitude, longitude)
+        cells = self._cells
+        scanned_cells = set()
+        candidates = []
+
+        def scan_cell(cell_key, cell):
+            scanned_cells.add(cell_key)
+            for item_id, (item_latitude, item_longitude) in cell.items():
+                candidates.append((great_circle_distance(latitude, longitude, item_latitude, item_longitude), item_id))
+
+        # Rings of cells around the point until count candidates are found, visiting at most as many cells
+        # as there are occupied cells (and at most RING_CELL_BUDGET cells)
+        cell_budget = min(len(cells), self.RING_CELL_BUDGET)
+        visited_count = 0
+        ring = 0
+        max_ring = max(self.column_count // 2, self.row_count)
+        while len(candidates) < count and visited_count < cell_budget and ring <= max_ring:
+            for cell_key in self._ring_keys(center_column, center_row, ring):
+                visited_count += 1
+                cell = cells.get(cell_key)
+                if cell is not None and cell_key not in scanned_cells:
+                    scan_cell(cell_key, cell)
+            ring += 1
+
+        if len(candidates) >= count:
+            # Every item nearer than the farthest of the count nearest candidates is in the box of that circle
+            search_distance = heapq.nsmallest(count, candidates)[-1][0]
+            if max_distance is not None:
+                search_distance = min(search_distance, max_distance)
+            for column, row, cell in self._cells_in_box(*self._circle_box(latitude, longitude, search_distance)):
+                if (column, row) not in scanned_cells:
+                    scan_cell((column, row), cell)
+        else:
+            # Far from the items: occupied coarse cells by increasing lower bound of their distance
+            coarse_queue = []
+            for coarse_key, cell_keys in list(self._coarse_cells.items()):
+                lower_bound = self._coarse_lower_bound(latitude, longitude, coarse_key)
+                if max_distance is None or lower_bound <= max_distance:
+                    coarse_queue.append((lower_bound, coarse_key, cell_keys))
+            heapq.heapify(coarse_queue)
+
+            while len(coarse_queue) > 0:
+                lower_bound, _, cell_keys = heapq.heappop(coarse_queue)
+                if len(candidates) >= count and lower_bound > candidates[-1][0]:
+                    break
+                for cell_key in cell_keys:
+                    cell = cells.get(cell_key)
+                    if cell is not None and cell_key not in scanned_cells:
+                        scan_cell(cell_key, cell)
+                # Keep only the count nearest candidates (sorted, the farthest last)
+                candidates[:] = heapq.nsmallest(count, candidates)
+
+        nearest_list = heapq.nsmallest(count, candidates)
+        if max_distance is not None:
+            nearest_list = [candidate for candidate in nearest_list if candidate[0] <= max_distance]
+        return nearest_list
@@ -0,0 +1,288 @@
+from contextlib import contextmanager
+import os
+import sqlite3
+import threading
+
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from application.monitoring.structured_logging import get_logger
+from data.manager.data_manager import DataManager
+from data.manager.telemetry_series import TelemetrySeries
+from data.manager.telemetry_segment_log import TelemetrySegmentLog
+
+LOGGER = get_logger("data")
+
+
+class SqliteDataManager(DataManager):
+    """
+    SQLite storage backend for the DataManager.
+    Every write is applied to the in memory structures of the DataManager (used to serve the reads)
+    and written through to a SQLite database in WAL mode, so the inventory and the telemetry data
+    survive a restart. Connections are borrowed from a small pool (at most max_connections, opened on demand
+    and reused by every thread, so short-lived server threads do not leave connections behind) and the constant
+    SQL statements are compiled once per connection by the sqlite3 statement cache.
+    Telemetry readings are buffered and inserted with executemany in a single transaction when
+    the buffer reaches telemetry_batch_size readings or every telemetry_flush_interval seconds.
+    """
+
+    DEFAULT_TELEMETRY_BATCH_SIZE = 1000
+    DEFAULT_TELEMETRY_FLUSH_INTERVAL = 1.0
+    DEFAULT_MAX_CONNECTIONS = 4
+
+    SCHEMA_STATEMENTS = (
+        "CREATE TABLE IF NOT EXISTS location ("
+        "uuid TEXT PRIMARY KEY, name TEXT, latitude REAL, longitude REAL)",
+        "CREATE TABLE IF NOT EXISTS device ("
+        "location_id TEXT NOT NULL, uuid TEXT NOT NULL, name TEXT, type TEXT, manufacturer TEXT, "
+        "software_version TEXT, latitude REAL, longitude REAL, PRIMARY KEY (location_id, uuid))",
+        "CREATE TABLE IF NOT EXISTS telemetry ("
+        "device_id TEXT NOT NULL, timestamp REAL NOT NULL, data_type TEXT NOT NULL, value REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS telemetry_device_timestamp_index ON telemetry (device_id, timestamp)"
+    )
+
+    UPSERT_LOCATION = "INSERT OR REPLACE INTO location (uuid, name, latitude, longitude) VALUES (?, ?, ?, ?)"
+    DELETE_LOCATION = "DELETE FROM location WHERE uuid = ?"
+    UPSERT_DEVICE = ("INSERT OR REPLACE INTO device (location_id, uuid, name, type, manufacturer, software_version, "
+                     "latitude, longitude) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+    DELETE_DEVICE = "DELETE FROM device WHERE location_id = ? AND uuid = ?"
+    DELETE_LOCATION_DEVICES = "DELETE FROM device WHERE location_id = ?"
+    INSERT_TELEMETRY = "INSERT INTO telemetry (device_id, timestamp, data_type, value) VALUES (?, ?, ?, ?)"
+    SELECT_LOCATIONS = "SELECT uuid, name, latitude, longitude FROM location"
+    SELECT_DEVICES = ("SELECT location_id, uuid, name, type, manufacturer, software_version, latitude, longitude "
+                      "FROM device")
+    SELECT_LATEST_TELEMETRY = ("SELECT device_id, timestamp, data_type, value FROM ("
+                               "SELECT device_id, timestamp, data_type, value, ROW_NUMBER() OVER ("
+                               "PARTITION BY device_id ORDER BY timestamp DESC) AS position FROM telemetry) "
+                               "WHERE position <= ? ORDER BY device_id, timestamp")
+
+    def __init__(self,
+                 database_file: str,
+                 telemetry_capacity: int = TelemetrySeries.DEFAULT_CAPACITY,
+                 telemetry_batch_size: int = DEFAULT_TELEMETRY_BATCH_SIZE,
+                 telemetry_flush_interval: float = DEFAULT_TELEMETRY_FLUSH_INTERVAL,
+                 telemetry_log: TelemetrySegmentLog = None,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        """Open (or create) the SQLite database and load its content in memory"""
+        super().__init__(telemetry_capacity, telemetry_log)
+
+        self.database_file = database_file
+        self.telemetry_batch_size = telemetry_batch_size
+        self.telemetry_flush_interval = telemetry_flush_interval
+
+        # Connection pool: every opened connection and the idle ones (reused last in first out)
+        self._connection_slots = threading.BoundedSemaphore(max_connections)
+        self._connections = []
+        self._idle_connections = []
+        self._connections_lock = threading.Lock()
+
+        # Pending telemetry rows waiting for the next batched transaction
+        self._pending_telemetry_rows = []
+        self._telemetry_lock = threading.Lock()
+
+        database_directory = os.path.dirname(os.path.abspath(database_file))
+        os.makedirs(database_directory, exist_ok=True)
+
+        with self._pooled_connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                for statement in self.SCHEMA_STATEMENTS:
+                    connection.execute(statement)
+
+        self._load_database()
+
+        # Periodic flush of the pending telemetry rows
+        self._stop_event = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flush_thread.start()
+
+    @contextmanager
+    def _pooled_connection(self):
+        """Borrow a connection of the pool, waiting for one if max_connections are in use"""
+        with self._connection_slots:
+            with self._connections_lock:
+                connection = self._idle_connections.pop() if len(self._idle_connections) > 0 else None
+            if connection is None:
+                connection = sqlite3.connect(self.database_file, check_same_thread=False)
+                connection.execute("PRAGMA synchronous=NORMAL")
+                with self._connections_lock:
+                    self._connections.append(connection)
+            try:
+                yield connection
+            finally:
+                with self._connections_lock:
+                    self._idle_connections.append(connection)
+
+    def _load_database(self):
+        """Load the inventory and the most recent telemetry readings of each device in memory"""
+        with self._pooled_connection() as connection:
+            location_dictionary = {}
+            for uuid, name, latitude, longitude in connection.execute(self.SELECT_LOCATIONS):
+                location_dictionary[uuid] = LocationModel(uuid, name, latitude, longitude)
+
+            for location_id, uuid, name, device_type, manufacturer, software_version, latitude, longitude \
+                    in connection.execute(self.SELECT_DEVICES):
+                if location_id in location_dictionary:
+                    location_dictionary[location_id].device_dictionary[uuid] = DeviceModel(
+                        uuid, name, location_id, device_type, manufacturer, software_version, latitude, longitude)
+
+            # Publish the whole inventory at once
+            self._replace_inventory(location_dictionary.values())
+
+            # Rebuild the telemetry series (with their rollups and latest values) from the retained readings
+            # of each device
+            for device_id, timestamp, data_type, value in connection.execute(self.SELECT_LATEST_TELEMETRY,
+                                                                             (self.telemetry_capacity,)):
+                device_series = self.device_timeseries_data.get(device_id)
+                if device_series is None:
+                    device_series = TelemetrySeries(self.telemetry_capacity)
+                    self.device_timeseries_data[device_id] = device_series
+                device_series.append(timestamp, data_type, value)
+                self._get_device_rollups(device_id).add(timestamp, data_type, value)
+                self._update_latest_value(device_id, timestamp, data_type, value)
+
+    def _execute(self, statement_list):
+        """Execute a list of (sql, parameters) statements in a single transaction"""
+        with self._pooled_connection() as connection, connection:
+            for sql, parameters in statement_list:
+                connection.execute(sql, parameters)
+
+    @staticmethod
+    def _device_row(location_id, device):
+        return (location_id, device.uuid, device.name, device.type, device.manufacturer, device.software_version,
+                device.latitude, device.longitude)
+
+    # LOCATION MANAGEMENT
+
+    def add_location(self, new_location):
+        # The writer lock keeps the database writes in the same order as the in memory updates
+        with self._inventory_lock:
+            previous_location = self.location_dictionary.get(getattr(new_location, "uuid", None))
+            super().add_location(new_location)
+            self._persist_location(new_location, previous_location)
+
+    def update_location(self, updated_location):
+        with self._inventory_lock:
+            previous_location = self.location_dictionary.get(getattr(updated_location, "uuid", None))
+            super().update_location(updated_location)
+            self._persist_location(updated_location, previous_location)
+
+    def _persist_location(self, location, previous_location):
+        """Write a location and its devices replacing the devices of the previous location with the same id"""
+        statement_list = []
+        if previous_location is not None and previous_location is not location:
+            statement_list.append((self.DELETE_LOCATION_DEVICES, (location.uuid,)))
+        statement_list.append((self.UPSERT_LOCATION, (location.uuid, location.name, location.latitude, location.longitude)))
+        for device in location.device_dictionary.values():
+            statement_list.append((self.UPSERT_DEVICE, self._device_row(location.uuid, device)))
+        self._execute(statement_list)
+
+    def remove_location(self, location_uuid):
+        with self._inventory_lock:
+            super().remove_location(location_uuid)
+            self._execute([(self.DELETE_LOCATION_DEVICES, (location_uuid,)),
+                           (self.DELETE_LOCATION, (location_uuid,))])
+
+    # DEVICE MANAGEMENT
+
+    def add_device(self, location_id, new_device):
+        with self._inventory_lock:
+            super().add_device(location_id, new_device)
+            self._execute([(self.UPSERT_DEVICE, self._device_row(location_id, new_device))])
+
+    def update_device(self, location_id, updated_device):
+        with self._inventory_lock:
+            super().update_device(location_id, updated_device)
+            self._execute([(self.UPSERT_DEVICE, self._device_row(location_id, updated_device))])
+
+    def remove_device(self, location_id, device_uuid):
+        with self._inventory_lock:
+            super().remove_device(location_id, device_uuid)
+            self._execute([(self.DELETE_DEVICE, (location_id, device_uuid))])
+
+    # BULK IMPORT
+
+    def add_locations_batch(self, location_list, validate_only: bool = False):
+        # The whole batch is written in a single transaction
+        with self._inventory_lock:
+            error_list = super().add_locations_batch(location_list, validate_only)
+            if len(error_list) == 0 and not validate_only:
+                statement_list = []
+                for location in location_list:
+                    statement_list.append((self.UPSERT_LOCATION, (location.uuid, location.name, location.latitude,
+                                                                  location.longitude)))
+                    for device in location.device_dictionary.values():
+                        statement_list.append((self.UPSERT_DEVICE, self._device_row(location.uuid, device)))
+                self._execute(statement_list)
+            return error_list
+
+    def add_devices_batch(self, device_list, validate_only: bool = False):
+        with self._inventory_lock:
+            error_list = super().add_devices_batch(device_list, validate_only)
+            if len(error_list) == 0 and not validate_only:
+                self._execute([(self.UPSERT_DEVICE, self._device_row(location_id, device))
+                               for location_id, device in device_list])
+            return error_list
+
+    # TELEMETRY MANAGEMENT
+
+    def add_device_telemetry_data(self, device_id, telemetry_data):
+        super().add_device_telemetry_data(device_id, telemetry_data)
+        self._enqueue_telemetry_rows([self._telemetry_row(device_id, telemetry_data)])
+
+    def add_device_telemetry_data_batch(self, telemetry_batch):
+        telemetry_rows = []
+        rejected_list = []
+        for position, (device_id, telemetry_data) in enumerate(telemetry_batch):
+            try:
+                super().add_device_telemetry_data(device_id, telemetry_data)
+                telemetry_rows.append(self._telemetry_row(device_id, telemetry_data))
+            except Exception as e:
+                rejected_list.append((position, str(e)))
+        self._enqueue_telemetry_rows(telemetry_rows)
+        return rejected_list
+
+    @staticmethod
+    def _telemetry_row(device_id, telemetry_data):
+        return device_id, float(telemetry_data.timestamp), str(telemetry_data.data_type), float(telemetry_data.value)
+
+    def _enqueue_telemetry_rows(self, telemetry_rows):
+        """Buffer telemetry rows and flush them when the batch size is reached"""
+        with self._telemetry_lock:
+            self._pending_telemetry_rows.extend(telemetry_rows)
+            if len(self._pending_telemetry_rows) < self.telemetry_batch_size:
+                return
+            pending_rows = self._pending_telemetry_rows
+            self._pending_telemetry_rows = []
+        self._insert_telemetry_rows(pending_rows)
+
+    def _insert_telemetry_rows(self, telemetry_rows):
+        """Insert telemetry rows with a single transaction"""
+        if len(telemetry_rows) > 0:
+            with self._pooled_connection() as connection, connection:
+                connection.executemany(self.INSERT_TELEMETRY, telemetry_rows)
+
+    def flush(self):
+        """Write the pending telemetry rows to the database"""
+        with self._telemetry_lock:
+            pending_rows = self._pending_telemetry_rows
+            self._pending_telemetry_rows = []
+        self._insert_telemetry_rows(pending_rows)
+
+    def _flush_periodically(self):
+        while not self._stop_event.wait(self.telemetry_flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                LOGGER.error("flush_error", "Error flushing telemetry data to SQLite", reason=str(e))
+
+    def close(self):
+        """Flush the pending telemetry rows and close every connection"""
+        self._stop_event.set()
+        self._flush_thread.join()
+        self.flush()
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+            self._idle_connections = []
+        super().close()
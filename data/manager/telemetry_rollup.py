@@ -0,0 +1,115 @@
+import bisect
+
+
+class TelemetryRollup:
+    """
+    Incrementally maintained aggregates (count, min, max, sum) of a single device data type
+    for fixed-width time buckets. Each reading updates one bucket in O(1) (O(log n) for a late reading
+    opening a new bucket) and range queries cost O(buckets) instead of O(raw readings).
+    Only the most recent max_buckets buckets are retained.
+    """
+
+    __slots__ = ("resolution_seconds", "max_buckets", "_bucket_starts", "_buckets")
+
+    def __init__(self, resolution_seconds: int, max_buckets: int):
+        self.resolution_seconds = resolution_seconds
+        self.max_buckets = max_buckets
+
+        # Sorted bucket start timestamps and bucket start -> [count, min, max, sum]
+        self._bucket_starts = []
+        self._buckets = {}
+
+    def add(self, timestamp, value):
+        """Aggregate a reading into its bucket"""
+        bucket_start = timestamp - timestamp % self.resolution_seconds
+        bucket = self._buckets.get(bucket_start)
+
+        if bucket is not None:
+            bucket[0] += 1
+            if value < bucket[1]:
+                bucket[1] = value
+            if value > bucket[2]:
+                bucket[2] = value
+            bucket[3] += value
+            return
+
+        bucket_starts = self._bucket_starts
+        if len(bucket_starts) == 0 or bucket_start > bucket_starts[-1]:
+            bucket_starts.append(bucket_start)
+        elif len(bucket_starts) >= self.max_buckets and bucket_start < bucket_starts[0]:
+            # Older than the retained buckets
+            return
+        else:
+            bisect.insort(bucket_starts, bucket_start)
+
+        self._buckets[bucket_start] = [1, value, value, value]
+
+        # Evict the oldest bucket
+        if len(bucket_starts) > self.max_buckets:
+            del self._buckets[bucket_starts.pop(0)]
+
+    def query(self, from_timestamp=None, to_timestamp=None):
+        """
+        Return the buckets starting in the range from_timestamp <= bucket start <= to_timestamp
+        :return: List of (bucket_start, count, min, max, mean) tuples in chronological order
+        """
+        bucket_starts = self._bucket_starts
+        start = 0 if from_timestamp is None else bisect.bisect_left(bucket_starts, from_timestamp - from_timestamp % self.resolution_seconds)
+        end = len(bucket_starts) if to_timestamp is None else bisect.bisect_right(bucket_starts, to_timestamp)
+
+        result_list = []
+        for bucket_start in bucket_starts[start:end]:
+            count, minimum, maximum, total = self._buckets[bucket_start]
+            result_list.append((bucket_start, count, minimum, maximum, total / count))
+        return result_list
+
+    def __len__(self):
+        return len(self._bucket_starts)
+
+
+class DeviceTelemetryRollups:
+    """
+    Rollup tables of a device: one TelemetryRollup for each data type and resolution
+    """
+
+    # Supported resolutions: name -> (bucket width in seconds, retained buckets)
+    RESOLUTIONS = {
+        "1m": (60, 7 * 24 * 60),
+        "1h": (3600, 90 * 24),
+        "1d": (86400, 2 * 365)
+    }
+
+    __slots__ = ("_data_type_rollups",)
+
+    def __init__(self):
+        # data type -> {resolution name -> TelemetryRollup}
+        self._data_type_rollups = {}
+
+    def add(self, timestamp, data_type, value):
+        """Aggregate a reading into the rollups of every resolution of its data type"""
+        rollups = self._data_type_rollups.get(data_type)
+        if rollups is None:
+            rollups = {resolution: TelemetryRollup(resolution_seconds, max_buckets)
+                       for resolution, (resolution_seconds, max_buckets) in self.RESOLUTIONS.items()}
+            self._data_type_rollups[data_type] = rollups
+
+        for rollup in rollups.values():
+            rollup.add(timestamp, value)
+
+    def data_types(self):
+        """Return the data types with at least one aggregated reading"""
+        return list(self._data_type_rollups.keys())
+
+    def query(self, resolution, from_timestamp=None, to_timestamp=None, data_type=None):
+        """
+        Return the buckets of a resolution for all the data types or for a single one
+        :return: Dictionary data type -> list of (bucket_start, count, min, max, mean) tuples
+        """
+        if resolution not in self.RESOLUTIONS:
+            raise ValueError("Unsupported rollup resolution ! Supported resolutions: " + ", ".join(self.RESOLUTIONS))
+
+        result_dictionary = {}
+        for rollup_data_type, rollups in list(self._data_type_rollups.items()):
+            if data_type is None or rollup_data_type == data_type:
+                result_dictionary[rollup_data_type] = rollups[resolution].query(from_timestamp, to_timestamp)
+        return result_dictionary
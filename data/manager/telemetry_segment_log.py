@@ -0,0 +1,351 @@
+from array import array
+import mmap
+import os
+import struct
+import threading
+
+
+class TelemetrySegment:
+    """
+    Fixed-size, append-only binary file storing telemetry readings, accessed through mmap.
+    The file starts with a header (HEADER_SIZE bytes) followed by fixed-size records:
+    - the header keeps the record count, the time range of the segment and a table of entries
+      (devices and data types) with, for each device, its number of readings and time range.
+      It is updated in place after each record so it always describes the committed records
+      and the segment can be indexed without reading its records.
+    - each record stores the entry index of the device and of the data type, the timestamp and the value.
+    The positions of the records of each device are indexed in memory (on the first read for an existing segment)
+    so reading a device only unpacks its own records.
+    """
+
+    MAGIC = b"TSEG"
+    VERSION = 1
+
+    HEADER_SIZE = 64 * 1024
+
+    # magic, version, flags, segment id, record capacity, record count, min timestamp, max timestamp, entry count
+    HEADER_STRUCT = struct.Struct("<4sHHIIQddI")
+    ENTRIES_OFFSET = 64
+
+    # kind, name length, count, min timestamp, max timestamp, name
+    ENTRY_STRUCT = struct.Struct("<BxHIdd64s")
+    ENTRY_KIND_DEVICE = 0
+    ENTRY_KIND_DATA_TYPE = 1
+    MAX_NAME_SIZE = 64
+    MAX_ENTRIES = (HEADER_SIZE - ENTRIES_OFFSET) // ENTRY_STRUCT.size
+
+    # device entry index, data type entry index, timestamp, value
+    RECORD_STRUCT = struct.Struct("<IHxxdd")
+
+    def __init__(self, file_path: str, segment_id: int, segment_size: int, create: bool):
+        """Open an existing segment file or create a new empty one"""
+        self.file_path = file_path
+        self.segment_id = segment_id
+
+        if create:
+            with open(file_path, "wb") as segment_file:
+                segment_file.truncate(segment_size)
+
+        self._file = open(file_path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self.record_capacity = (len(self._mmap) - self.HEADER_SIZE) // self.RECORD_STRUCT.size
+
+        # Header state mirrored in memory
+        self.record_count = 0
+        self.min_timestamp = float("inf")
+        self.max_timestamp = float("-inf")
+
+        # Entry tables: name -> entry index for each kind and entry index -> [kind, name, count, min, max]
+        self._device_entries = {}
+        self._data_type_entries = {}
+        self._entries = []
+
+        # Device entry index -> array of record positions (built on the first read of an existing segment)
+        self._record_index = {} if create else None
+
+        if create:
+            self._write_header()
+        else:
+            self._read_header()
+
+    def _write_header(self):
+        self.HEADER_STRUCT.pack_into(self._mmap, 0, self.MAGIC, self.VERSION, 0, self.segment_id,
+                                     self.record_capacity, self.record_count, self.min_timestamp,
+                                     self.max_timestamp, len(self._entries))
+
+    def _read_header(self):
+        """Load the header and the entry table without reading any record"""
+        magic, version, _, segment_id, record_capacity, record_count, min_timestamp, max_timestamp, entry_count = \
+            self.HEADER_STRUCT.unpack_from(self._mmap, 0)
+
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Error opening the telemetry segment {} ! Invalid header !".format(self.file_path))
+
+        self.record_count = min(record_count, self.record_capacity)
+        self.min_timestamp = min_timestamp
+        self.max_timestamp = max_timestamp
+
+        for entry_index in range(entry_count):
+            kind, name_size, count, entry_min, entry_max, name = self.ENTRY_STRUCT.unpack_from(
+                self._mmap, self.ENTRIES_OFFSET + entry_index * self.ENTRY_STRUCT.size)
+            name = name[:name_size].decode("utf-8")
+            self._entries.append([kind, name, count, entry_min, entry_max])
+            if kind == self.ENTRY_KIND_DEVICE:
+                self._device_entries[name] = entry_index
+            else:
+                self._data_type_entries[name] = entry_index
+
+    def _write_entry(self, entry_index):
+        kind, name, count, entry_min, entry_max = self._entries[entry_index]
+        encoded_name = name.encode("utf-8")
+        self.ENTRY_STRUCT.pack_into(self._mmap, self.ENTRIES_OFFSET + entry_index * self.ENTRY_STRUCT.size,
+                                    kind, len(encoded_name), count, entry_min, entry_max, encoded_name)
+
+    def _get_entry(self, entry_dictionary, kind, name):
+        """Return the entry index of a name registering it if needed (None if the entry table is full)"""
+        entry_index = entry_dictionary.get(name)
+        if entry_index is None:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                return None
+            self.check_name(name)
+            entry_index = len(self._entries)
+            self._entries.append([kind, name, 0, float("inf"), float("-inf")])
+            entry_dictionary[name] = entry_index
+            self._write_entry(entry_index)
+            self._write_header()
+        return entry_index
+
+    @classmethod
+    def check_name(cls, name):
+        """Raise a ValueError if a device id or a data type does not fit in an entry"""
+        if len(name.encode("utf-8")) > cls.MAX_NAME_SIZE:
+            raise ValueError("Error logging telemetry data ! Names are limited to {} bytes !".format(cls.MAX_NAME_SIZE))
+
+    def append(self, device_id, timestamp, data_type, value):
+        """
+        Append a reading to the segment
+        :return: False if the segment is full (records or entry table) and the reading has not been written
+        """
+        if self.record_count >= self.record_capacity:
+            return False
+
+        device_entry_index = self._get_entry(self._device_entries, self.ENTRY_KIND_DEVICE, device_id)
+        if device_entry_index is None:
+            return False
+        data_type_entry_index = self._get_entry(self._data_type_entries, self.ENTRY_KIND_DATA_TYPE, data_type)
+        if data_type_entry_index is None:
+            return False
+
+        # Write the record, then the device entry and finally the record count committing the record
+        self.RECORD_STRUCT.pack_into(self._mmap, self.HEADER_SIZE + self.record_count * self.RECORD_STRUCT.size,
+                                     device_entry_index, data_type_entry_index, timestamp, value)
+
+        device_entry = self._entries[device_entry_index]
+        device_entry[2] += 1
+        device_entry[3] = min(device_entry[3], timestamp)
+        device_entry[4] = max(device_entry[4], timestamp)
+        self._write_entry(device_entry_index)
+
+        if self._record_index is not None:
+            record_positions = self._record_index.get(device_entry_index)
+            if record_positions is None:
+                record_positions = self._record_index[device_entry_index] = array("I")
+            record_positions.append(self.record_count)
+
+        self.record_count += 1
+        self.min_timestamp = min(self.min_timestamp, timestamp)
+        self.max_timestamp = max(self.max_timestamp, timestamp)
+        self._write_header()
+
+        return True
+
+    def is_full(self):
+        return self.record_count >= self.record_capacity
+
+    def device_summaries(self):
+        """Return the (device_id, count, min timestamp, max timestamp) tuples stored in the header"""
+        return [(name, count, entry_min, entry_max) for kind, name, count, entry_min, entry_max in self._entries
+                if kind == self.ENTRY_KIND_DEVICE]
+
+    def _get_record_index(self):
+        """Return the record positions of each device entry, indexing the mapped records on the first call"""
+        if self._record_index is None:
+            record_index = {}
+            records = memoryview(self._mmap)[self.HEADER_SIZE:
+                                             self.HEADER_SIZE + self.record_count * self.RECORD_STRUCT.size]
+            try:
+                for position, (entry_index, _, _, _) in enumerate(self.RECORD_STRUCT.iter_unpack(records)):
+                    record_positions = record_index.get(entry_index)
+                    if record_positions is None:
+                        record_positions = record_index[entry_index] = array("I")
+                    record_positions.append(position)
+            finally:
+                records.release()
+            self._record_index = record_index
+        return self._record_index
+
+    def read_device(self, device_id, limit: int = None):
+        """
+        Return the (timestamp, data_type, value) readings of a device in write order unpacking only its records
+        :param limit: Optional maximum number of readings (the most recent ones are kept)
+        """
+        device_entry_index = self._device_entries.get(device_id)
+        if device_entry_index is None:
+            return []
+
+        record_positions = self._get_record_index().get(device_entry_index, ())
+        if limit is not None:
+            record_positions = record_positions[max(0, len(record_positions) - limit):]
+
+        entries = self._entries
+        unpack_from = self.RECORD_STRUCT.unpack_from
+        record_size = self.RECORD_STRUCT.size
+        reading_list = []
+        for position in record_positions:
+            _, data_type_entry_index, timestamp, value = unpack_from(self._mmap, self.HEADER_SIZE + position * record_size)
+            reading_list.append((timestamp, entries[data_type_entry_index][1], value))
+        return reading_list
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.close()
+
+
+class TelemetrySegmentLog:
+    """
+    Append-only telemetry log made of fixed-size memory-mapped TelemetrySegment files.
+    On open only the segment headers are read to rebuild the per-device index
+    (device id -> segments containing its readings), so restarting does not re-parse any payload.
+    Retention works on whole segments: the oldest ones are deleted as a unit.
+    """
+
+    DEFAULT_SEGMENT_SIZE = 16 * 1024 * 1024
+    SEGMENT_FILE_FORMAT = "segment-{:08d}.tlog"
+
+    def __init__(self, directory: str, segment_size: int = DEFAULT_SEGMENT_SIZE, max_segments: int = None):
+        """Open the log in a directory rebuilding the device index from the segment headers"""
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+
+        self._lock = threading.Lock()
+
+        # Segments in creation order and device id -> {segment id: (count, min timestamp, max timestamp)}
+        self._segments = []
+        self.device_index = {}
+
+        os.makedirs(directory, exist_ok=True)
+
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.startswith("segment-") and file_name.endswith(".tlog"):
+                segment_id = int(file_name[len("segment-"):-len(".tlog")])
+                segment = TelemetrySegment(os.path.join(directory, file_name), segment_id, segment_size, create=False)
+                self._segments.append(segment)
+                self._index_segment(segment)
+
+        if len(self._segments) == 0 or self._segments[-1].is_full():
+            self._roll_segment()
+
+    def _index_segment(self, segment):
+        for device_id, count, min_timestamp, max_timestamp in segment.device_summaries():
+            self.device_index.setdefault(device_id, {})[segment.segment_id] = (count, min_timestamp, max_timestamp)
+
+    def _roll_segment(self):
+        """Create a new active segment applying the max_segments retention"""
+        if len(self._segments) > 0:
+            self._segments[-1].flush()
+            segment_id = self._segments[-1].segment_id + 1
+        else:
+            segment_id = 0
+
+        file_path = os.path.join(self.directory, self.SEGMENT_FILE_FORMAT.format(segment_id))
+        self._segments.append(TelemetrySegment(file_path, segment_id, self.segment_size, create=True))
+
+        if self.max_segments is not None:
+            while len(self._segments) > self.max_segments:
+                self._delete_segment(self._segments[0])
+
+    def _delete_segment(self, segment):
+        segment.close()
+        os.remove(segment.file_path)
+        self._segments.remove(segment)
+        for device_id in [device_id for device_id, segment_dictionary in self.device_index.items()
+                          if segment.segment_id in segment_dictionary]:
+            del self.device_index[device_id][segment.segment_id]
+            if len(self.device_index[device_id]) == 0:
+                del self.device_index[device_id]
+
+    def append(self, device_id, timestamp, data_type, value):
+        """Append a reading to the active segment rolling a new segment when it is full"""
+        with self._lock:
+            self._append(device_id, float(timestamp), str(data_type), float(value))
+
+    def append_batch(self, telemetry_rows):
+        """Append a list of (device_id, timestamp, data_type, value) readings"""
+        with self._lock:
+            for device_id, timestamp, data_type, value in telemetry_rows:
+                self._append(device_id, float(timestamp), str(data_type), float(value))
+
+    def _append(self, device_id, timestamp, data_type, value):
+        segment = self._segments[-1]
+        if not segment.append(device_id, timestamp, data_type, value):
+            self._roll_segment()
+            segment = self._segments[-1]
+            segment.append(device_id, timestamp, data_type, value)
+
+        segment_dictionary = self.device_index.setdefault(device_id, {})
+        count, min_timestamp, max_timestamp = segment_dictionary.get(segment.segment_id, (0, timestamp, timestamp))
+        segment_dictionary[segment.segment_id] = (count + 1, min(min_timestamp, timestamp), max(max_timestamp, timestamp))
+
+    def has_device(self, device_id):
+        return device_id in self.device_index
+
+    @staticmethod
+    def check_names(device_id, data_type):
+        """Raise a ValueError if a reading cannot be logged (device id or data type longer than the entry names)"""
+        TelemetrySegment.check_name(device_id)
+        TelemetrySegment.check_name(str(data_type))
+
+    def read_device(self, device_id, limit: int = None):
+        """
+        Return the most recent readings of a device reading only the segments that contain it
+        :return: List of (timestamp, data_type, value) tuples in write order
+        """
+        with self._lock:
+            segment_dictionary = self.device_index.get(device_id, {})
+            reading_list = []
+            for segment in reversed(self._segments):
+                if segment.segment_id in segment_dictionary:
+                    remaining = None if limit is None else limit - len(reading_list)
+                    reading_list = segment.read_device(device_id, remaining) + reading_list
+                    if limit is not None and len(reading_list) >= limit:
+                        return reading_list[len(reading_list) - limit:]
+            return reading_list
+
+    def delete_segments_before(self, timestamp):
+        """
+        Delete the segments whose readings are all older than timestamp (the active segment is kept)
+        :return: Number of deleted segments
+        """
+        with self._lock:
+            expired_segments = [segment for segment in self._segments[:-1] if segment.max_timestamp < timestamp]
+            for segment in expired_segments:
+                self._delete_segment(segment)
+            return len(expired_segments)
+
+    def segment_count(self):
+        return len(self._segments)
+
+    def flush(self):
+        with self._lock:
+            self._segments[-1].flush()
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
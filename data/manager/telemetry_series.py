@@ -0,0 +1,212 @@
+import sys
+import threading
+from array import array
+
+
+class TelemetrySeries:
+    """
+    Columnar, bounded time-series of telemetry readings for a single device.
+    Readings are stored in three parallel arrays (timestamps, interned data type ids and values)
+    used as a ring buffer: once the capacity is reached the oldest reading is overwritten.
+    Each reading costs 18 bytes instead of a full TelemetryMessage object.
+    Readings are kept sorted by timestamp (late readings are moved to their position) so that
+    time ranges are found with a binary search.
+    """
+
+    # Default number of readings kept for each device
+    DEFAULT_CAPACITY = 10000
+
+    # Interned data types shared by all the series (data type id -> data type and vice versa)
+    _data_type_list = []
+    _data_type_ids = {}
+    _data_type_lock = threading.Lock()
+
+    __slots__ = ("capacity", "_timestamps", "_data_type_ids_column", "_values", "_start", "_size", "append_count")
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """Initialize an empty series able to keep up to capacity readings"""
+        if capacity <= 0:
+            raise ValueError("Error creating the TelemetrySeries ! Capacity must be positive !")
+
+        self.capacity = capacity
+        self._timestamps = array('d')
+        self._data_type_ids_column = array('H')
+        self._values = array('d')
+
+        # Physical position of the oldest reading and number of stored readings
+        self._start = 0
+        self._size = 0
+
+        # Number of stored readings since the creation of the series (a version of its content)
+        self.append_count = 0
+
+    @classmethod
+    def intern_data_type(cls, data_type: str) -> int:
+        """Return the compact id associated with a data type, registering it if needed"""
+        data_type_id = cls._data_type_ids.get(data_type)
+        if data_type_id is None:
+            with cls._data_type_lock:
+                data_type_id = cls._data_type_ids.get(data_type)
+                if data_type_id is None:
+                    data_type = sys.intern(str(data_type))
+                    data_type_id = len(cls._data_type_list)
+                    cls._data_type_list.append(data_type)
+                    cls._data_type_ids[data_type] = data_type_id
+        return data_type_id
+
+    def append(self, timestamp, data_type, value):
+        """
+        Append a new reading overwriting the oldest one if the series is full
+        :return: False if the reading is older than every reading of a full series and has been discarded
+        """
+
+        # Convert before touching the columns to keep them aligned if the reading is not numeric
+        timestamp = float(timestamp)
+        value = float(value)
+        data_type_id = self.intern_data_type(data_type)
+
+        if self._size < self.capacity:
+            self._timestamps.append(timestamp)
+            self._data_type_ids_column.append(data_type_id)
+            self._values.append(value)
+            self._size += 1
+        else:
+            position = self._start
+
+            # The reading would be the first one to be overwritten
+            if timestamp < self._timestamps[position]:
+                return False
+
+            self._timestamps[position] = timestamp
+            self._data_type_ids_column[position] = data_type_id
+            self._values[position] = value
+            self._start = (position + 1) % self.capacity
+
+        # Move a late reading back to its chronological position
+        index = self._size - 1
+        if index > 0 and self._timestamps[self._position(index - 1)] > timestamp:
+            self._move_back(index)
+
+        self.append_count += 1
+        return True
+
+    def _position(self, index):
+        """Return the physical position of the reading with the given chronological index"""
+        return (self._start + index) % self.capacity
+
+    def _move_back(self, index):
+        """Shift a reading towards the beginning of the series until the timestamps are sorted again"""
+        timestamps = self._timestamps
+        data_type_ids = self._data_type_ids_column
+        values = self._values
+
+        position = self._position(index)
+        timestamp = timestamps[position]
+        data_type_id = data_type_ids[position]
+        value = values[position]
+
+        while index > 0:
+            previous_position = self._position(index - 1)
+            if timestamps[previous_position] <= timestamp:
+                break
+            timestamps[position] = timestamps[previous_position]
+            data_type_ids[position] = data_type_ids[previous_position]
+            values[position] = values[previous_position]
+            position = previous_position
+            index -= 1
+
+        timestamps[position] = timestamp
+        data_type_ids[position] = data_type_id
+        values[position] = value
+
+    def bisect_left(self, timestamp):
+        """Return the index of the first reading with a timestamp greater than or equal to the given one"""
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamps[self._position(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def bisect_right(self, timestamp):
+        """Return the index of the first reading with a timestamp greater than the given one"""
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if timestamp < self._timestamps[self._position(middle)]:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def index_range(self, from_timestamp=None, to_timestamp=None):
+        """Return the (start, end) indexes of the readings with from_timestamp <= timestamp <= to_timestamp"""
+        start = 0 if from_timestamp is None else self.bisect_left(from_timestamp)
+        end = self._size if to_timestamp is None else self.bisect_right(to_timestamp)
+        return start, max(start, end)
+
+    def _slice(self, column, start, end):
+        """Return a copy of the readings start:end (chronological indexes) of a physical column"""
+        physical_start = self._start + start
+        physical_end = self._start + end
+        if physical_end <= self.capacity:
+            return column[physical_start:physical_end]
+        if physical_start >= self.capacity:
+            return column[physical_start - self.capacity:physical_end - self.capacity]
+        return column[physical_start:] + column[:physical_end - self.capacity]
+
+    def slice_columns(self, start, end):
+        """
+        Return the readings start:end (chronological indexes) as columns
+        :return: (timestamps, data_types, values) with the data types as a list of strings
+        """
+        data_type_list = self._data_type_list
+        return (self._slice(self._timestamps, start, end),
+                [data_type_list[data_type_id] for data_type_id in self._slice(self._data_type_ids_column, start, end)],
+                self._slice(self._values, start, end))
+
+    def __len__(self):
+        return self._size
+
+    def _ordered(self, column):
+        """Return a copy of the physical column in chronological order"""
+        if self._start == 0:
+            return column[:self._size]
+        return column[self._start:] + column[:self._start]
+
+    def timestamps(self):
+        """Return the timestamps in chronological order"""
+        return self._ordered(self._timestamps)
+
+    def values(self):
+        """Return the values in chronological order"""
+        return self._ordered(self._values)
+
+    def data_types(self):
+        """Return the data types in chronological order"""
+        data_type_list = self._data_type_list
+        return [data_type_list[data_type_id] for data_type_id in self._ordered(self._data_type_ids_column)]
+
+    def rows(self):
+        """Iterate over the readings in chronological order as (timestamp, data_type, value) tuples"""
+        data_type_list = self._data_type_list
+        for index in range(self._size):
+            position = (self._start + index) % self.capacity
+            yield (self._timestamps[position],
+                   data_type_list[self._data_type_ids_column[position]],
+                   self._values[position])
+
+    def latest(self):
+        """Return the most recent reading as a (timestamp, data_type, value) tuple or None if empty"""
+        if self._size == 0:
+            return None
+        position = (self._start + self._size - 1) % self.capacity
+        return (self._timestamps[position],
+                self._data_type_list[self._data_type_ids_column[position]],
+                self._values[position])
+
+    def memory_size(self):
+        """Return the number of bytes used by the underlying columns"""
+        return sum(sys.getsizeof(column) for column in (self._timestamps, self._data_type_ids_column, self._values))
@@ -1,20 +1,92 @@
 from communication.api.rest_api_server import RestApiServer
 from communication.web.web_server import WebServer
 from communication.mqtt.mqtt_data_fetcher import MqttDataFetcher
+from communication.mqtt.mqtt_ingest_process_pool import MqttIngestProcessPool
 from application.core_manager import CoreManager
+from application.monitoring.structured_logging import configure_logging, get_logger
 from data.manager.data_manager import DataManager
+from data.manager.sqlite_data_manager import SqliteDataManager
+from data.manager.telemetry_segment_log import TelemetrySegmentLog
+from data.manager.inventory_snapshot import InventorySnapshotWriter
+import os
+import signal
+import threading
+import time
 
 API_CONFIG_FILE = "config/api_conf.yaml"
 WEB_CONFIG_FILE = "config/web_conf.yaml"
 MQTT_CONFIG_FILE = "config/mqtt_fetcher_conf.yaml"
+LOGGING_CONFIG_FILE = "config/logging_conf.yaml"
+
+# Data Storage Backend: "memory" (everything is lost on restart) or "sqlite" (persistent SQLite database)
+DATA_STORAGE_BACKEND = "memory"
+SQLITE_DATABASE_FILE = "data/storage/iot_data.db"
+
+# Append-only memory-mapped telemetry segment log (telemetry survives restarts without a database)
+TELEMETRY_SEGMENT_LOG_ENABLED = False
+TELEMETRY_SEGMENT_LOG_DIRECTORY = "data/storage/telemetry_log"
+TELEMETRY_SEGMENT_LOG_MAX_SEGMENTS = 64
+
+# Binary inventory snapshot of the in memory storage (loaded at startup, written periodically and on shutdown)
+INVENTORY_SNAPSHOT_ENABLED = True
+INVENTORY_SNAPSHOT_FILE = "data/storage/inventory.snapshot"
+INVENTORY_SNAPSHOT_INTERVAL = 60
+
+# Serve the REST API and the Web Server applications from a single listener (the REST API host and port)
+SHARED_HTTP_LISTENER = False
+
+# Number of MQTT ingest worker processes (0 runs the MQTT Data Fetcher in the main process)
+# Each process fetches a share of the telemetry and writes the decoded readings into shared memory, a single
+# consumer thread of the main process stores them (it bounds the ingest rate whatever the number of processes)
+MQTT_INGEST_PROCESSES = 0
 
 if __name__ == '__main__':
 
-    # Data Manager initialization
-    data_manager = DataManager()
+    main_app_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Structured logging written by a background thread (queued records are flushed on shutdown)
+    log_listener = configure_logging(LOGGING_CONFIG_FILE)
+    logger = get_logger("main")
+
+    # SIGTERM (e.g. service manager) and SIGINT (Ctrl+C) request the ordered shutdown below
+    shutdown_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: shutdown_event.set())
+    signal.signal(signal.SIGINT, lambda signal_number, frame: shutdown_event.set())
+
+    # Optional telemetry segment log (only segment headers are read at startup)
+    telemetry_log = None
+    if TELEMETRY_SEGMENT_LOG_ENABLED:
+        telemetry_log = TelemetrySegmentLog(os.path.join(main_app_path, TELEMETRY_SEGMENT_LOG_DIRECTORY),
+                                            max_segments=TELEMETRY_SEGMENT_LOG_MAX_SEGMENTS)
+
+    # Data Manager initialization with the selected storage backend
+    if DATA_STORAGE_BACKEND == "sqlite":
+        data_manager = SqliteDataManager(os.path.join(main_app_path, SQLITE_DATABASE_FILE),
+                                         telemetry_log=telemetry_log)
+    else:
+        data_manager = DataManager(telemetry_log=telemetry_log)
+
+    # Restore the in memory inventory from the last snapshot
+    snapshot_enabled = INVENTORY_SNAPSHOT_ENABLED and DATA_STORAGE_BACKEND == "memory"
+    snapshot_file = os.path.join(main_app_path, INVENTORY_SNAPSHOT_FILE)
+    if snapshot_enabled and os.path.exists(snapshot_file):
+        start_time = time.perf_counter()
+        location_count, device_count = data_manager.load_inventory_snapshot(snapshot_file)
+        logger.info("snapshot_loaded", "Inventory snapshot loaded instead of rebuilding it one add_location/add_device "
+                    "call at a time", locations=location_count, devices=device_count,
+                    duration_ms=round((time.perf_counter() - start_time) * 1000, 1))
 
-    # Init some demo data on the Data Manager
-    data_manager.init_demo_data()
+    # Init some demo data on the Data Manager (only if the storage is empty)
+    if len(data_manager.get_all_locations()) == 0:
+        data_manager.init_demo_data()
+
+    # Periodic inventory snapshot, with a last snapshot written on shutdown
+    if snapshot_enabled:
+        os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+        inventory_snapshot_writer = InventorySnapshotWriter(data_manager, snapshot_file, INVENTORY_SNAPSHOT_INTERVAL)
+        inventory_snapshot_writer.start()
+    else:
+        inventory_snapshot_writer = None
 
     # Create the Core Manager with the Data Manager reference
     core_manager = CoreManager(data_manager)
@@ -22,17 +94,56 @@ if __name__ == '__main__':
     # Create RESTful API Server
     rest_api_server = RestApiServer(API_CONFIG_FILE, core_manager)
 
-    # Run RESTful API Server
-    rest_api_server.start()
-
     # Create Web Server
     web_server = WebServer(WEB_CONFIG_FILE, core_manager)
 
-    # Run Web Server
-    web_server.start()
+    if SHARED_HTTP_LISTENER:
+        # Run both applications on the RESTful API Server listener
+        rest_api_server.share_listener_with(web_server)
+        rest_api_server.start()
+    else:
+        # Run RESTful API Server
+        rest_api_server.start()
+
+        # Run Web Server
+        web_server.start()
+
+    if MQTT_INGEST_PROCESSES > 0:
+        # Run the MQTT Data Fetchers in worker processes, the telemetry is consumed from shared memory
+        mqtt_ingest_process_pool = MqttIngestProcessPool(MQTT_CONFIG_FILE, core_manager, MQTT_INGEST_PROCESSES,
+                                                         logging_config_file=LOGGING_CONFIG_FILE)
+        mqtt_ingest_process_pool.start()
+        mqtt_data_fetcher = None
+    else:
+        # Create MQTT Data Fetcher
+        mqtt_data_fetcher = MqttDataFetcher(MQTT_CONFIG_FILE, core_manager)
+        mqtt_ingest_process_pool = None
+
+        # Run MQTT Data Fetcher
+        mqtt_data_fetcher.start()
+
+    # Wait for a shutdown signal (the timeout keeps the main thread responsive to signals)
+    while not shutdown_event.wait(1):
+        pass
+    logger.info("shutdown_started", "Shutdown requested, stopping the application")
+
+    # Stop the ingest first so that every stored reading is in the final snapshot
+    if mqtt_ingest_process_pool is not None:
+        mqtt_ingest_process_pool.stop()
+    else:
+        mqtt_data_fetcher.stop()
+
+    # Stop the servers draining the in-flight requests (no-op for the Web Server sharing the API listener)
+    rest_api_server.stop()
+    web_server.stop()
+
+    # Write the final inventory snapshot
+    if inventory_snapshot_writer is not None:
+        inventory_snapshot_writer.stop()
 
-    # Create MQTT Data Fetcher
-    mqtt_data_fetcher = MqttDataFetcher(MQTT_CONFIG_FILE, core_manager)
+    # Release the storage backend resources
+    data_manager.close()
 
-    # Run MQTT Data Fetcher
-    mqtt_data_fetcher.start()
\ No newline at end of file
+    # Flush the queued log records
+    logger.info("shutdown_completed", "Application stopped")
+    log_listener.stop()
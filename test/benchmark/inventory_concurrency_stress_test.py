@@ -0,0 +1,131 @@
+# Stress test of the DataManager concurrency model: writer threads (REST-like inventory updates),
+# ingest threads (MQTT-like telemetry) and reader threads (listings and page renders iterating the inventory)
+# run concurrently for a fixed duration. Any exception raised by a thread is reported as an error
+# (e.g. "dictionary changed size during iteration") and the throughput of each kind of thread is printed.
+# Run it from the project root directory: python test/benchmark/inventory_concurrency_stress_test.py
+
+import os
+import sys
+import threading
+import time
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from communication.mqtt.dto.telemetry_message import TelemetryMessage
+from data.manager.data_manager import DataManager
+
+# Configuration variables
+duration_seconds = 5
+location_count = 200
+devices_per_location = 20
+writer_thread_count = 2
+ingest_thread_count = 2
+reader_thread_count = 4
+
+
+def create_device(location_id, device_index):
+    return DeviceModel("{}-d{:03d}".format(location_id, device_index),
+                       "device-{}".format(device_index),
+                       location_id,
+                       DeviceModel.DEVICE_TYPE_SENSOR,
+                       "ACME Inc",
+                       "0.0.1beta",
+                       48.0,
+                       10.0)
+
+
+def writer(data_manager, thread_index, stop_event, counters, errors):
+    """Add, update and remove devices and replace whole locations"""
+    operation_count = 0
+    try:
+        while not stop_event.is_set():
+            location_id = "l{:04d}".format((operation_count * writer_thread_count + thread_index) % location_count)
+            device_index = devices_per_location + operation_count % devices_per_location
+            data_manager.add_device(location_id, create_device(location_id, device_index))
+            data_manager.update_device(location_id, create_device(location_id, device_index))
+            data_manager.remove_device(location_id, create_device(location_id, device_index).uuid)
+            if operation_count % 50 == 0:
+                replaced_location = LocationModel(location_id, "Building", 48.0, 10.0)
+                for index in range(devices_per_location):
+                    replaced_location.device_dictionary[create_device(location_id, index).uuid] = \
+                        create_device(location_id, index)
+                data_manager.update_location(replaced_location)
+            operation_count += 4
+    except Exception:
+        errors.append(traceback.format_exc())
+    counters["writer"] += operation_count
+
+
+def ingest(data_manager, thread_index, stop_event, counters, errors):
+    """Add telemetry readings to the devices of the locations assigned to the thread"""
+    reading_count = 0
+    try:
+        while not stop_event.is_set():
+            location_index = (reading_count * ingest_thread_count + thread_index) % location_count
+            device_id = "l{:04d}-d{:03d}".format(location_index, reading_count % devices_per_location)
+            if data_manager.get_device_by_id(device_id) is not None:
+                data_manager.add_device_telemetry_data(device_id, TelemetryMessage(time.time(), "temperature", 21.5))
+            reading_count += 1
+    except Exception:
+        errors.append(traceback.format_exc())
+    counters["ingest"] += reading_count
+
+
+def reader(data_manager, stop_event, counters, errors):
+    """Iterate the whole inventory like the location listing and the device page renders"""
+    read_count = 0
+    try:
+        while not stop_event.is_set():
+            device_id_count = 0
+            for location in data_manager.get_all_locations():
+                for device in location.device_dictionary.values():
+                    device_id_count += len(device.uuid)
+                data_manager.get_devices_by_location(location.uuid)
+            read_count += 1
+    except Exception:
+        errors.append(traceback.format_exc())
+    counters["reader"] += read_count
+
+
+if __name__ == '__main__':
+
+    data_manager = DataManager(telemetry_capacity=1000)
+    for location_index in range(location_count):
+        location_id = "l{:04d}".format(location_index)
+        data_manager.add_location(LocationModel(location_id, "Building", 48.0, 10.0))
+        for device_index in range(devices_per_location):
+            data_manager.add_device(location_id, create_device(location_id, device_index))
+
+    stop_event = threading.Event()
+    counters = {"writer": 0, "ingest": 0, "reader": 0}
+    errors = []
+
+    thread_list = [threading.Thread(target=writer, args=(data_manager, index, stop_event, counters, errors))
+                   for index in range(writer_thread_count)]
+    thread_list += [threading.Thread(target=ingest, args=(data_manager, index, stop_event, counters, errors))
+                    for index in range(ingest_thread_count)]
+    thread_list += [threading.Thread(target=reader, args=(data_manager, stop_event, counters, errors))
+                    for _ in range(reader_thread_count)]
+
+    for thread in thread_list:
+        thread.start()
+    time.sleep(duration_seconds)
+    stop_event.set()
+    for thread in thread_list:
+        thread.join()
+
+    print("Inventory: {} locations, {} devices".format(location_count, location_count * devices_per_location))
+    print("Inventory writes:   {:10.0f} ops/s ({} threads)".format(counters["writer"] / duration_seconds,
+                                                                    writer_thread_count))
+    print("Telemetry ingest:   {:10.0f} readings/s ({} threads)".format(counters["ingest"] / duration_seconds,
+                                                                        ingest_thread_count))
+    print("Full inventory scans: {:8.0f} scans/s ({} threads)".format(counters["reader"] / duration_seconds,
+                                                                      reader_thread_count))
+    print("Errors: {}".format(len(errors)))
+    for error in errors:
+        print(error)
+
+    sys.exit(1 if len(errors) > 0 else 0)
@@ -0,0 +1,59 @@
+# Startup benchmark comparing the incremental rebuild of the inventory (one add_location/add_device call
+# at a time) with the load of a binary inventory snapshot.
+# Run it from the project root directory: python test/benchmark/inventory_snapshot_benchmark.py
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from data.manager.data_manager import DataManager
+
+# Configuration variables
+location_count = 20000
+devices_per_location = 5
+
+
+def build_inventory(data_manager):
+    """Rebuild the inventory one add_location/add_device call at a time"""
+    for location_index in range(location_count):
+        location_id = "l{:06d}".format(location_index)
+        data_manager.add_location(LocationModel(location_id, "Building {}".format(location_index),
+                                                48.0 + location_index / 100000, 10.0 + location_index / 100000))
+        for device_index in range(devices_per_location):
+            data_manager.add_device(location_id, DeviceModel("{}-d{:03d}".format(location_id, device_index),
+                                                             "device-{}".format(device_index),
+                                                             location_id,
+                                                             DeviceModel.DEVICE_TYPE_SENSOR,
+                                                             "ACME Inc",
+                                                             "0.0.1beta",
+                                                             48.0 + location_index / 100000,
+                                                             10.0 + location_index / 100000))
+
+
+if __name__ == '__main__':
+
+    source_data_manager = DataManager()
+    start_time = time.perf_counter()
+    build_inventory(source_data_manager)
+    rebuild_time = time.perf_counter() - start_time
+
+    snapshot_file = os.path.join(tempfile.mkdtemp(), "inventory.snapshot")
+    start_time = time.perf_counter()
+    source_data_manager.save_inventory_snapshot(snapshot_file)
+    save_time = time.perf_counter() - start_time
+
+    restored_data_manager = DataManager()
+    start_time = time.perf_counter()
+    restored_location_count, restored_device_count = restored_data_manager.load_inventory_snapshot(snapshot_file)
+    load_time = time.perf_counter() - start_time
+
+    print(f"Inventory: {restored_location_count} locations, {restored_device_count} devices, "
+          f"snapshot size: {os.path.getsize(snapshot_file) / 1024:.1f} KiB")
+    print(f"Incremental rebuild: {rebuild_time * 1000:8.1f} ms")
+    print(f"Snapshot save:       {save_time * 1000:8.1f} ms")
+    print(f"Snapshot load:       {load_time * 1000:8.1f} ms (startup time saved: {(rebuild_time - load_time) * 1000:.1f} ms)")
@@ -0,0 +1,107 @@
+# End-to-end benchmark of the MQTT ingest pipeline driven by the load generator of test/mqtt-tester through an
+# in-process transport: messages are handed to MqttDataFetcher.on_message as paho MQTTMessage objects (no broker),
+# decoded by the ingest workers and stored in the DataManager.
+# For each scenario it reports the sustained messages/sec, the stored readings/sec, the dropped/rejected messages
+# and the p50/p99/max latency from publish (timestamp of the reading) to visibility in the DataManager.
+# The binary scenarios publish compact binary payloads with several readings on the binary telemetry topic.
+# Run it from the project root directory: python test/benchmark/mqtt_ingest_load_benchmark.py
+
+import os
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+project_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_path)
+sys.path.insert(0, os.path.join(project_path, "test", "mqtt-tester"))
+
+from application.core_manager import CoreManager
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from communication.mqtt.mqtt_data_fetcher import MqttDataFetcher
+from data.manager.data_manager import DataManager
+from model.load_generator import LoadGenerator
+
+# Configuration variables
+MQTT_CONFIG_FILE = "config/mqtt_fetcher_conf.yaml"
+device_count = 1000
+scenario_duration = 5
+
+# Scenarios: name -> LoadGenerator keyword arguments (rate 0 = as fast as possible)
+scenarios = [
+    ("steady 2k msg/s", {"rate": 2000}),
+    ("steady 10k msg/s", {"rate": 10000}),
+    ("steady 10k msg/s, 512 B payloads", {"rate": 10000, "payload_size": 512}),
+    ("bursts of 500 at 10k msg/s", {"rate": 10000, "burst_size": 500}),
+    ("2k msg/s with 1s spikes at 50k msg/s", {"rate": 2000, "spike_rate": 50000, "spike_period": 2.5,
+                                             "spike_duration": 1}),
+    ("saturation (as fast as possible)", {"rate": 0, "burst_size": 100}),
+    ("binary 2k msg/s, 10 readings per message", {"rate": 2000, "readings_per_message": 10,
+                                                  "topic_format": "device/{}/temperature/bin"}),
+    ("binary saturation, 10 readings per message", {"rate": 0, "burst_size": 100, "readings_per_message": 10,
+                                                    "topic_format": "device/{}/temperature/bin"}),
+]
+
+
+class LatencyRecordingDataManager(DataManager):
+    """DataManager recording the delay between the timestamp (publish time) of each reading and its storage"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+        self._latency_lock = threading.Lock()
+
+    def add_device_telemetry_data_batch(self, telemetry_batch):
+        rejected_list = super().add_device_telemetry_data_batch(telemetry_batch)
+        visible_time = time.time()
+        with self._latency_lock:
+            self.latencies.extend(visible_time - telemetry_data.timestamp for _, telemetry_data in telemetry_batch)
+        return rejected_list
+
+
+def percentile(sorted_values, fraction):
+    if len(sorted_values) == 0:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_scenario(name, load_arguments):
+    load_generator = LoadGenerator(device_count, **load_arguments)
+
+    data_manager = LatencyRecordingDataManager(telemetry_capacity=1000)
+    data_manager.add_location(LocationModel("l0001", "Building", 48.0, 10.0))
+    for device_id in load_generator.device_ids:
+        data_manager.add_device("l0001", DeviceModel(device_id, "device", "l0001", DeviceModel.DEVICE_TYPE_SENSOR,
+                                                     "ACME Inc", "0.0.1beta", 48.0, 10.0))
+
+    mqtt_data_fetcher = MqttDataFetcher(MQTT_CONFIG_FILE, CoreManager(data_manager))
+    mqtt_data_fetcher.start_ingest_workers()
+
+    # In-process transport: the MQTTMessage built by the paho network loop for every PUBLISH
+    def publish(topic, payload):
+        message = mqtt.MQTTMessage(topic=topic.encode("utf-8"))
+        message.payload = payload
+        mqtt_data_fetcher.on_message(None, None, message)
+
+    start_time = time.perf_counter()
+    load_generator.run(publish, duration=scenario_duration)
+    mqtt_data_fetcher.stop_ingest_workers()
+    elapsed = time.perf_counter() - start_time
+
+    statistics = mqtt_data_fetcher.get_ingest_statistics()
+    latencies = sorted(data_manager.latencies)
+    print("{:<44} published {:>8,.0f} msg/s  stored {:>8,.0f} readings/s  dropped {:>7}  rejected {:>5}  "
+          "latency p50 {:>8.1f} ms  p99 {:>8.1f} ms  max {:>8.1f} ms".format(
+              name, load_generator.published_messages / load_generator.elapsed, statistics["stored"] / elapsed,
+              statistics["dropped"], statistics["rejected"] + statistics["decode_errors"],
+              percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000,
+              (latencies[-1] if len(latencies) > 0 else float("nan")) * 1000))
+
+
+if __name__ == '__main__':
+
+    print("Devices: {}, {} s per scenario, in-process transport".format(device_count, scenario_duration))
+    for scenario_name, scenario_arguments in scenarios:
+        run_scenario(scenario_name, scenario_arguments)
@@ -0,0 +1,175 @@
+# Benchmark of the MQTT ingest throughput in a single process and with ingest worker processes writing into the
+# shared-memory telemetry store (MqttIngestProcessPool). No broker is needed: the raw JSON messages are handed to
+# MqttDataFetcher.on_message as paho MQTTMessage objects, delivered like the broker would:
+# - shared subscription: each message is delivered to a single worker process of the group (round robin)
+# - topic filtering (broker without shared subscriptions): each message is delivered to every worker process,
+#   which ignores the devices of the other partitions
+# The main process consumes the store into the DataManager like the consumer thread of the pool, and the
+# throughput is measured until every reading has been consumed (end to end, consumer included). The rate at which
+# the worker processes finished decoding and the time the consumer was busy are also reported: the single consumer
+# thread of the main process bounds the total throughput whatever the number of worker processes, which only take
+# the MQTT receive and decode work off the main process.
+# Run it from the project root directory: python test/benchmark/multiprocess_ingest_benchmark.py
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import paho.mqtt.client as mqtt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from application.core_manager import CoreManager
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from communication.mqtt.mqtt_data_fetcher import MqttDataFetcher
+from communication.mqtt.mqtt_ingest_process_pool import MqttIngestProcessPool, SharedTelemetryWriter
+from data.manager.data_manager import DataManager
+from data.manager.shared_telemetry_store import SharedTelemetryStore
+
+# Configuration variables
+MQTT_CONFIG_FILE = "config/mqtt_fetcher_conf.yaml"
+reading_count = 400000
+device_count = 1000
+process_counts = [1, 2, 4]
+
+# Broker delivery modes
+DELIVERY_SHARED_SUBSCRIPTION = "shared subscription"
+DELIVERY_TOPIC_FILTERING = "topic filtering"
+
+# Messages handed to on_message between two checks of the ingest queues (waiting while they are half full)
+BACKPRESSURE_CHECK_INTERVAL = 100
+
+
+def create_payloads():
+    return [json.dumps({"timestamp": 1700000000.0 + index,
+                        "data_type": "TEMPERATURE_SENSOR",
+                        "value": 20.0 + (index % 200) / 10.0}).encode("utf-8")
+            for index in range(1000)]
+
+
+def create_core_manager():
+    data_manager = DataManager(telemetry_capacity=1000)
+    data_manager.add_location(LocationModel("l0001", "Building", 48.0, 10.0))
+    for device_index in range(device_count):
+        data_manager.add_device("l0001", DeviceModel("d{:05d}".format(device_index), "device", "l0001",
+                                                     DeviceModel.DEVICE_TYPE_SENSOR, "ACME Inc", "0.0.1beta",
+                                                     48.0, 10.0))
+    return CoreManager(data_manager)
+
+
+def create_fetcher(core_manager, partition_index=0, partition_count=1, delivery=DELIVERY_SHARED_SUBSCRIPTION):
+    mqtt_data_fetcher = MqttDataFetcher(MQTT_CONFIG_FILE, core_manager, partition_index, partition_count)
+    if delivery == DELIVERY_TOPIC_FILTERING:
+        mqtt_data_fetcher.shared_subscription_group = None
+    return mqtt_data_fetcher
+
+
+def deliver_messages(mqtt_data_fetcher, delivery, process_index=0, process_count=1):
+    """Hand the messages delivered to a fetcher by the broker to on_message and wait for the ingest workers"""
+    payloads = create_payloads()
+    topics = [mqtt_data_fetcher.mqtt_topic.replace("+", "d{:05d}".format(device_index))
+              for device_index in range(device_count)]
+    queue_limit = mqtt_data_fetcher.ingest_queue_size * mqtt_data_fetcher.ingest_worker_count // 2
+
+    mqtt_data_fetcher.start_ingest_workers()
+    delivered_count = 0
+    for index in range(reading_count):
+        # The broker delivers a shared subscription message to one member of the group
+        if delivery == DELIVERY_SHARED_SUBSCRIPTION and index % process_count != process_index:
+            continue
+        message = mqtt.MQTTMessage(topic=topics[index % device_count].encode("utf-8"))
+        message.payload = payloads[index % 1000]
+        mqtt_data_fetcher.on_message(None, None, message)
+
+        delivered_count += 1
+        if delivered_count % BACKPRESSURE_CHECK_INTERVAL == 0:
+            while mqtt_data_fetcher.get_queue_depth() > queue_limit:
+                time.sleep(0.001)
+    mqtt_data_fetcher.stop_ingest_workers()
+    return mqtt_data_fetcher.get_ingest_statistics()
+
+
+def worker_process(store_name, partition_index, partition_count, delivery, start_event, result_queue):
+    telemetry_store = SharedTelemetryStore(store_name, create=False)
+    mqtt_data_fetcher = create_fetcher(SharedTelemetryWriter(telemetry_store, partition_index),
+                                       partition_index, partition_count, delivery)
+    start_event.wait()
+    statistics = deliver_messages(mqtt_data_fetcher, delivery, partition_index, partition_count)
+    result_queue.put(statistics["received"] + statistics["ignored"])
+    telemetry_store.close()
+
+
+def single_process_ingest():
+    core_manager = create_core_manager()
+    mqtt_data_fetcher = create_fetcher(core_manager)
+    start_time = time.perf_counter()
+    statistics = deliver_messages(mqtt_data_fetcher, DELIVERY_SHARED_SUBSCRIPTION)
+    return time.perf_counter() - start_time, statistics["stored"]
+
+
+def multi_process_ingest(process_count, delivery):
+    core_manager = create_core_manager()
+    pool = MqttIngestProcessPool(MQTT_CONFIG_FILE, core_manager, process_count)
+    # Large enough rings: the consumer measures the end-to-end throughput, not the drop policy
+    pool.telemetry_store = SharedTelemetryStore(partition_count=process_count, record_capacity=reading_count)
+
+    process_context = multiprocessing.get_context("spawn")
+    start_event = process_context.Event()
+    result_queue = process_context.Queue()
+    processes = [process_context.Process(target=worker_process,
+                                         args=(pool.telemetry_store.name, partition_index, process_count, delivery,
+                                               start_event, result_queue))
+                 for partition_index in range(process_count)]
+    for process in processes:
+        process.start()
+    # Let the workers import the modules and attach the store before starting the clock
+    time.sleep(3)
+
+    start_time = time.perf_counter()
+    consumer_time = 0.0
+    workers_elapsed = None
+    start_event.set()
+    while True:
+        workers_done = not any(process.is_alive() for process in processes)
+        if workers_done and workers_elapsed is None:
+            workers_elapsed = time.perf_counter() - start_time
+        consume_start_time = time.perf_counter()
+        consumed_count = pool.consume_partitions()
+        consumer_time += time.perf_counter() - consume_start_time
+        if consumed_count == 0:
+            if workers_done:
+                break
+            time.sleep(0.001)
+    elapsed = time.perf_counter() - start_time
+
+    # Messages received by the worker processes (including the ones of other partitions they ignored)
+    handled_messages = 0
+    for _ in processes:
+        handled_messages += result_queue.get()
+    for process in processes:
+        process.join()
+    pool.telemetry_store.close()
+    return (elapsed, workers_elapsed, pool.consumed_readings - pool.rejected_readings, consumer_time / elapsed,
+            handled_messages)
+
+
+if __name__ == '__main__':
+
+    print("Readings: {} from {} devices, CPU cores: {}".format(reading_count, device_count, os.cpu_count()))
+
+    elapsed, stored = single_process_ingest()
+    baseline = reading_count / elapsed
+    print("{:<52} {:>10,.0f} readings/s (stored {})".format("Single process (in-process fetcher)", baseline, stored))
+
+    for delivery in (DELIVERY_SHARED_SUBSCRIPTION, DELIVERY_TOPIC_FILTERING):
+        for process_count in process_counts:
+            elapsed, workers_elapsed, stored, consumer_busy, handled_messages = multi_process_ingest(process_count,
+                                                                                                      delivery)
+            print("{:<52} {:>10,.0f} readings/s (stored {}, {:.2f}x, workers done at {:,.0f} readings/s, "
+                  "consumer busy {:.0%}, messages received by the workers {})".format(
+                      "{} ingest process(es), {}".format(process_count, delivery), reading_count / elapsed, stored,
+                      reading_count / elapsed / baseline, reading_count / workers_elapsed, consumer_busy,
+                      handled_messages))
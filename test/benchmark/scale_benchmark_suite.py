@@ -0,0 +1,280 @@
+# Repeatable benchmark suite of the DataManager / CoreManager hot paths on a synthesized inventory at scale
+# (locations, devices and telemetry readings) including the REST collection GETs (Flask test client).
+# Each operation is timed in batches of calls for at least min_time seconds and the results (ops/s and the
+# mean/p50/p99 latency of a call) are written as JSON, so the results of two versions can be compared:
+#   python test/benchmark/scale_benchmark_suite.py --scale small --output results.json
+#   python test/benchmark/scale_benchmark_suite.py --scale small --compare results.json
+# --compare exits with status 1 if an operation is slower than the baseline by more than --threshold.
+# The "production" scale (10k locations, 500k devices, 100M readings) needs several GB of memory and
+# synthesizing its readings takes several minutes.
+# Run it from the project root directory.
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+project_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_path)
+
+from application.core_manager import CoreManager
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from communication.api.rest_api_server import RestApiServer
+from communication.mqtt.dto.telemetry_message import TelemetryMessage
+from data.manager.data_manager import DataManager
+
+API_CONFIG_FILE = "config/api_conf.yaml"
+RESULT_FORMAT_VERSION = 1
+
+# Indexed attributes of the synthesized devices (assigned round robin)
+DEVICE_TYPES = (DeviceModel.DEVICE_TYPE_SENSOR, DeviceModel.DEVICE_TYPE_ACTUATOR, DeviceModel.DEVICE_TYPE_MOBILE,
+                DeviceModel.DEVICE_TYPE_DEFAULT)
+SOFTWARE_VERSIONS = ("0.0.1beta", "0.0.2", "0.1.0", "1.0.0", "1.1.0")
+
+# Scales: (locations, devices, readings)
+SCALES = {
+    "small": (1000, 20000, 1000000),
+    "medium": (5000, 100000, 10000000),
+    "production": (10000, 500000, 100000000)
+}
+
+
+def synthesize_inventory(data_manager, location_count, device_count):
+    """Add the locations with their devices (devices are spread evenly over the locations)"""
+    devices_per_location = max(1, device_count // location_count)
+    device_ids = []
+    for location_index in range(location_count):
+        location_id = "l{:06d}".format(location_index)
+        location = LocationModel(location_id, "Building {}".format(location_index),
+                                 48.0 + location_index / 100000, 10.0 + location_index / 100000)
+        for device_index in range(devices_per_location):
+            device_id = "{}-d{:04d}".format(location_id, device_index)
+            location.device_dictionary[device_id] = DeviceModel(device_id, "device-{}".format(device_index),
+                                                                location_id, DEVICE_TYPES[device_index % 4],
+                                                                "ACME Inc", SOFTWARE_VERSIONS[device_index % 5],
+                                                                location.latitude, location.longitude)
+            device_ids.append(device_id)
+        data_manager.add_location(location)
+    return device_ids
+
+
+def synthesize_telemetry(data_manager, device_ids, reading_count, batch_size=10000):
+    """Add reading_count readings spread over the devices (one reading per device every 10 seconds)"""
+    start_timestamp = 1700000000.0
+    batch = []
+    for reading_index in range(reading_count):
+        device_index = reading_index % len(device_ids)
+        timestamp = start_timestamp + (reading_index // len(device_ids)) * 10
+        batch.append((device_ids[device_index], TelemetryMessage(timestamp, "TEMPERATURE_SENSOR",
+                                                                 20.0 + reading_index % 100 / 10)))
+        if len(batch) == batch_size:
+            data_manager.add_device_telemetry_data_batch(batch)
+            batch = []
+    if len(batch) > 0:
+        data_manager.add_device_telemetry_data_batch(batch)
+
+
+def measure(operation, calls_per_batch, min_time, max_batches=100000):
+    """
+    Call operation(call_index) in batches of calls_per_batch calls for at least min_time seconds (3 batches minimum)
+    :return: Dictionary with the calls, ops/s and the mean/p50/p99 latency of a call in microseconds
+    """
+    batch_times = []
+    call_index = 0
+    start_time = time.perf_counter()
+    while len(batch_times) < 3 or (time.perf_counter() - start_time < min_time and len(batch_times) < max_batches):
+        batch_start = time.perf_counter()
+        for _ in range(calls_per_batch):
+            operation(call_index)
+            call_index += 1
+        batch_times.append((time.perf_counter() - batch_start) / calls_per_batch)
+
+    total_time = sum(batch_times) * calls_per_batch
+    batch_times.sort()
+    return {
+        "calls": call_index,
+        "ops_per_second": call_index / total_time,
+        "mean_us": total_time / call_index * 1e6,
+        "p50_us": batch_times[len(batch_times) // 2] * 1e6,
+        "p99_us": batch_times[min(len(batch_times) - 1, int(len(batch_times) * 0.99))] * 1e6
+    }
+
+
+def run_suite(location_count, device_count, reading_count, min_time, seed):
+    random_generator = random.Random(seed)
+
+    data_manager = DataManager()
+    core_manager = CoreManager(data_manager)
+
+    setup_start = time.perf_counter()
+    device_ids = synthesize_inventory(data_manager, location_count, device_count)
+    synthesize_telemetry(data_manager, device_ids, reading_count)
+    setup_seconds = time.perf_counter() - setup_start
+    print("Setup: {} locations, {} devices, {} readings in {:.1f} s".format(location_count, len(device_ids),
+                                                                             reading_count, setup_seconds))
+
+    location_ids = list(data_manager.location_dictionary.keys())
+    random_device_ids = [random_generator.choice(device_ids) for _ in range(10000)]
+    random_location_ids = [random_generator.choice(location_ids) for _ in range(10000)]
+
+    rest_api_server = RestApiServer(API_CONFIG_FILE, core_manager)
+    api_prefix = rest_api_server.configuration_dict["rest"]["api_prefix"]
+    test_client = rest_api_server.app.test_client()
+
+    def rest_get(path):
+        response = test_client.get(path)
+        if response.status_code != 200:
+            raise ValueError("Error GET {} ! Status code {} !".format(path, response.status_code))
+        return response.data
+
+    # Readings added by the add_device_telemetry_data benchmark are newer than the synthesized ones
+    next_timestamp = [1800000000.0]
+
+    def add_device_telemetry_data(call_index):
+        next_timestamp[0] += 0.001
+        core_manager.add_device_telemetry_data(random_device_ids[call_index % 10000],
+                                               TelemetryMessage(next_timestamp[0], "TEMPERATURE_SENSOR", 21.5))
+
+    def iterate_all_locations(_):
+        for _ in core_manager.get_all_locations():
+            pass
+
+    # Locations removed by the remove_location benchmark (re-added after the measure)
+    removed_locations = []
+
+    def remove_location(call_index):
+        location_id = location_ids[call_index % len(location_ids)]
+        removed_locations.append(data_manager.location_dictionary[location_id])
+        core_manager.remove_location(location_id)
+
+    # Operation name -> (operation(call_index), calls per batch)
+    operations = [
+        ("get_device_by_id", lambda call_index: core_manager.get_device_by_id(random_device_ids[call_index % 10000]), 1000),
+        ("get_devices_by_location",
+         lambda call_index: core_manager.get_devices_by_location(random_location_ids[call_index % 10000]), 1000),
+        ("get_all_locations", iterate_all_locations, 1),
+        ("add_device_telemetry_data", add_device_telemetry_data, 1000),
+        ("get_telemetry_data_in_range (last 100)",
+         lambda call_index: core_manager.get_telemetry_data_in_range(random_device_ids[call_index % 10000], limit=100), 100),
+        ("remove_location", remove_location, 10),
+        ("REST GET /location/<id>/device",
+         lambda call_index: rest_get("{}/location/{}/device".format(api_prefix, random_location_ids[call_index % 10000])), 10),
+        ("REST GET /location/<id>/device/<id>",
+         lambda call_index: rest_get("{}/location/{}/device/{}".format(
+             api_prefix, data_manager.get_device_location_id(random_device_ids[call_index % 10000]),
+             random_device_ids[call_index % 10000])), 10),
+        ("REST GET /location", lambda _: rest_get("{}/location".format(api_prefix)), 1),
+        ("search_devices (type + version, 100)",
+         lambda _: core_manager.search_devices({"type": DeviceModel.DEVICE_TYPE_SENSOR,
+                                                "software_version": "0.0.1beta"}, limit=100), 10),
+        ("search_devices (type in location)",
+         lambda call_index: core_manager.search_devices({"type": DeviceModel.DEVICE_TYPE_SENSOR},
+                                                        random_location_ids[call_index % 10000]), 100),
+        ("REST GET /device?type=&software_version=",
+         lambda _: rest_get("{}/device?type={}&software_version=0.0.1beta&limit=100".format(
+             api_prefix, DeviceModel.DEVICE_TYPE_SENSOR)), 10),
+    ]
+
+    results = {}
+    for name, operation, calls_per_batch in operations:
+        results[name] = measure(operation, calls_per_batch, min_time,
+                                # Do not remove more than a tenth of the locations
+                                max_batches=max(3, location_count // 10 // calls_per_batch)
+                                if name == "remove_location" else 100000)
+        if name == "remove_location":
+            for location in removed_locations:
+                core_manager.add_location(location)
+            removed_locations.clear()
+        print("{:<40} {:>14,.0f} ops/s  mean {:>12.2f} us  p50 {:>12.2f} us  p99 {:>12.2f} us".format(
+            name, results[name]["ops_per_second"], results[name]["mean_us"], results[name]["p50_us"],
+            results[name]["p99_us"]))
+
+    return setup_seconds, results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=project_path, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result_document, baseline_file, threshold):
+    """
+    Print the mean latency of each operation against a baseline result file
+    :return: Names of the operations slower than the baseline by more than threshold
+    """
+    with open(baseline_file, "r") as file:
+        baseline = json.load(file)
+
+    print("Comparison with {} (commit {}):".format(baseline_file, baseline.get("git_commit")))
+    if baseline.get("scale") != result_document["scale"]:
+        print("Warning: the baseline was measured at a different scale: {}".format(baseline.get("scale")))
+
+    regression_list = []
+    for name, result in result_document["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None:
+            print("{:<40} {:>12}".format(name, "new"))
+            continue
+        ratio = result["mean_us"] / baseline_result["mean_us"]
+        regression = ratio > 1 + threshold
+        if regression:
+            regression_list.append(name)
+        print("{:<40} {:>12.2f} us -> {:>12.2f} us  {:>6.2f}x{}".format(name, baseline_result["mean_us"],
+                                                                       result["mean_us"], ratio,
+                                                                       "  REGRESSION" if regression else ""))
+    return regression_list
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="DataManager / CoreManager scale benchmark suite")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--locations", type=int, help="override the number of locations of the scale")
+    parser.add_argument("--devices", type=int, help="override the number of devices of the scale")
+    parser.add_argument("--readings", type=int, help="override the number of readings of the scale")
+    parser.add_argument("--min-time", type=float, default=1.0, help="minimum seconds of measure per operation")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON result file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown of the mean latency reported as a regression")
+    arguments = parser.parse_args()
+
+    location_count, device_count, reading_count = SCALES[arguments.scale]
+    location_count = arguments.locations or location_count
+    device_count = arguments.devices or device_count
+    reading_count = arguments.readings if arguments.readings is not None else reading_count
+
+    setup_seconds, results = run_suite(location_count, device_count, reading_count, arguments.min_time, arguments.seed)
+
+    result_document = {
+        "format_version": RESULT_FORMAT_VERSION,
+        "suite": "scale_benchmark_suite",
+        "timestamp": time.time(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": {"name": arguments.scale, "locations": location_count, "devices": device_count,
+                  "readings": reading_count},
+        "setup_seconds": setup_seconds,
+        "results": results
+    }
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(result_document, file, indent=2)
+        print("Results written to {}".format(arguments.output))
+
+    if arguments.compare:
+        regression_list = compare(result_document, arguments.compare, arguments.threshold)
+        if len(regression_list) > 0:
+            print("Regressions: {}".format(", ".join(regression_list)))
+            sys.exit(1)
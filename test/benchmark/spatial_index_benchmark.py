@@ -0,0 +1,105 @@
+# Latency benchmark of the spatial queries of the DataManager (SpatialGridIndex) on a synthesized inventory of
+# devices clustered around their locations, compared with a linear scan of the device index.
+# Nearest neighbour queries are measured near the data (around a random location) and far from the data
+# (random points of the globe and the null island 0, 0), where the ring search of the grid is bounded and the
+# occupied coarse cells are read by increasing distance.
+# Run it from the project root directory: python test/benchmark/spatial_index_benchmark.py
+
+import gc
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from application.model.device_model import DeviceModel
+from application.model.location_model import LocationModel
+from data.manager.data_manager import DataManager
+from data.manager.spatial_grid_index import great_circle_distance
+
+# Configuration variables
+location_count = 2000
+devices_per_location = 500
+query_count = 200
+nearest_count = 20
+seed = 42
+
+
+def build_inventory(data_manager, random_generator):
+    """Locations spread over Europe with their devices within a few km (Gaussian spread)"""
+    location_list = []
+    for location_index in range(location_count):
+        location = LocationModel("l{:05d}".format(location_index), "Building {}".format(location_index),
+                                 random_generator.uniform(35, 60), random_generator.uniform(-10, 30))
+        for device_index in range(devices_per_location):
+            device_id = "{}-d{:03d}".format(location.uuid, device_index)
+            location.device_dictionary[device_id] = DeviceModel(device_id, "device-{}".format(device_index),
+                                                                location.uuid, DeviceModel.DEVICE_TYPE_SENSOR,
+                                                                "ACME Inc", "0.0.1beta",
+                                                                location.latitude + random_generator.gauss(0, 0.05),
+                                                                location.longitude + random_generator.gauss(0, 0.05))
+        location_list.append(location)
+    data_manager._replace_inventory(location_list)
+    return location_list
+
+
+def measure(name, operation, argument_list):
+    """Time every call and print the mean, p50, p99 and max latency"""
+    latency_list = []
+    for argument in argument_list:
+        start_time = time.perf_counter()
+        operation(*argument)
+        latency_list.append(time.perf_counter() - start_time)
+    latency_list.sort()
+    print("{:<48} mean {:>10.1f} us  p50 {:>10.1f} us  p99 {:>10.1f} us  max {:>10.1f} us".format(
+        name, sum(latency_list) / len(latency_list) * 1e6, latency_list[len(latency_list) // 2] * 1e6,
+        latency_list[int(len(latency_list) * 0.99)] * 1e6, latency_list[-1] * 1e6))
+
+
+def linear_nearest(data_manager, latitude, longitude, count):
+    """Nearest devices by computing the distance of every device"""
+    distance_list = [(great_circle_distance(latitude, longitude, device.latitude, device.longitude), device_id)
+                     for device_id, (_, device) in data_manager.device_index.items()]
+    distance_list.sort()
+    return distance_list[:count]
+
+
+if __name__ == '__main__':
+
+    random_generator = random.Random(seed)
+    data_manager = DataManager()
+
+    start_time = time.perf_counter()
+    location_list = build_inventory(data_manager, random_generator)
+    print("Inventory: {} locations, {} devices built in {:.1f} s".format(
+        location_count, location_count * devices_per_location, time.perf_counter() - start_time))
+    gc.collect()
+    gc.freeze()
+
+    near_points = [(location.latitude + random_generator.gauss(0, 0.02),
+                    location.longitude + random_generator.gauss(0, 0.02))
+                   for location in random_generator.sample(location_list, query_count)]
+    far_points = [(random_generator.uniform(-90, 90), random_generator.uniform(-180, 180))
+                  for _ in range(query_count)]
+
+    measure("nearest {} near the data".format(nearest_count),
+            lambda latitude, longitude: data_manager.get_nearest_devices(latitude, longitude, nearest_count),
+            near_points)
+    measure("nearest {} far from the data (random points)".format(nearest_count),
+            lambda latitude, longitude: data_manager.get_nearest_devices(latitude, longitude, nearest_count),
+            far_points)
+    measure("nearest {} at 0, 0".format(nearest_count),
+            lambda latitude, longitude: data_manager.get_nearest_devices(latitude, longitude, nearest_count),
+            [(0.0, 0.0)] * 20)
+    measure("nearest {} within 1 km far from the data".format(nearest_count),
+            lambda latitude, longitude: data_manager.get_nearest_devices(latitude, longitude, nearest_count, 1000),
+            far_points)
+    measure("viewport 0.05 x 0.08 degrees near the data",
+            lambda latitude, longitude: data_manager.get_devices_in_area(latitude - 0.025, longitude - 0.04,
+                                                                         latitude + 0.025, longitude + 0.04,
+                                                                         limit=1000),
+            near_points)
+    measure("linear scan nearest {}".format(nearest_count),
+            lambda latitude, longitude: linear_nearest(data_manager, latitude, longitude, nearest_count),
+            near_points[:3])
@@ -0,0 +1,129 @@
+# Microbenchmark comparing the original decoding path (json.loads + DTO(**json_data), paho topic_matches_sub + split)
+# with the schema-compiled decoders and the compiled topic filter used by the MQTT fetcher and the REST resources,
+# and the JSON telemetry payloads with the compact binary payloads (single and multiple readings per message).
+# Run it from the project root directory: python test/benchmark/telemetry_decoder_benchmark.py
+
+import json
+import os
+import sys
+import time
+
+import paho.mqtt.client as mqtt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from communication.api.dto.device_creation_request import DeviceCreationRequest
+from communication.codec.binary_telemetry import decode_binary_telemetry, encode_binary_telemetry
+from communication.codec.schema_decoder import DecodeError
+from communication.mqtt.dto.telemetry_message import TelemetryMessage
+from communication.mqtt.mqtt_data_fetcher import MqttDataFetcher
+
+# Configuration variables
+message_count = 200000
+topic_filter = "device/+/temperature"
+readings_per_binary_message = 10
+
+telemetry_payloads = [json.dumps({"timestamp": 1700000000.0 + index,
+                                  "data_type": "TEMPERATURE_SENSOR",
+                                  "value": 20.0 + (index % 200) / 10.0}).encode("utf-8")
+                      for index in range(1000)]
+invalid_telemetry_payload = b'{"timestamp": 1700000000.0, "data_type": "TEMPERATURE_SENSOR", "value": "hot"}'
+device_payload = json.dumps({"uuid": "d0001", "name": "demo-device", "device_type": "device.default",
+                             "manufacturer": "ACME Inc", "software_version": "0.0.1beta",
+                             "latitude": 48.312321, "longitude": 10.433423211}).encode("utf-8")
+topics = ["device/d{:04d}/temperature".format(index) for index in range(1000)]
+binary_payloads = [encode_binary_telemetry([(1700000000.0 + index, "TEMPERATURE_SENSOR", 20.0 + (index % 200) / 10.0)])
+                   for index in range(1000)]
+multi_reading_binary_payloads = [encode_binary_telemetry([(1700000000.0 + index + offset, "TEMPERATURE_SENSOR",
+                                                           20.0 + (index % 200) / 10.0)
+                                                          for offset in range(readings_per_binary_message)])
+                                 for index in range(1000)]
+
+
+def measure(label, function):
+    """Run function message_count times and print the messages/sec"""
+    start_time = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start_time
+    print("{:<45} {:>12,.0f} msg/s".format(label, message_count / elapsed))
+    return message_count / elapsed
+
+
+def original_telemetry_decoding():
+    for index in range(message_count):
+        TelemetryMessage(**json.loads(telemetry_payloads[index % 1000]))
+
+
+def compiled_telemetry_decoding():
+    decode = TelemetryMessage.from_json
+    for index in range(message_count):
+        decode(telemetry_payloads[index % 1000])
+
+
+def invalid_telemetry_decoding():
+    for _ in range(message_count):
+        try:
+            TelemetryMessage.from_json(invalid_telemetry_payload)
+        except DecodeError:
+            pass
+
+
+def binary_telemetry_decoding():
+    for index in range(message_count):
+        decode_binary_telemetry(binary_payloads[index % 1000])
+
+
+def multi_reading_binary_telemetry_decoding():
+    for index in range(message_count):
+        decode_binary_telemetry(multi_reading_binary_payloads[index % 1000])
+
+
+def original_device_decoding():
+    for _ in range(message_count):
+        DeviceCreationRequest(**json.loads(device_payload))
+
+
+def compiled_device_decoding():
+    decode = DeviceCreationRequest.from_json
+    for _ in range(message_count):
+        decode(device_payload)
+
+
+def original_topic_matching():
+    for index in range(message_count):
+        topic = topics[index % 1000]
+        if mqtt.topic_matches_sub(topic_filter, topic):
+            topic.split('/')[1]
+
+
+def compiled_topic_matching():
+    match_topic = MqttDataFetcher.compile_topic_filter(topic_filter)
+    for index in range(message_count):
+        match_topic(topics[index % 1000])
+
+
+if __name__ == '__main__':
+
+    print("Messages: {}".format(message_count))
+
+    before = measure("Telemetry: json.loads + TelemetryMessage(**)", original_telemetry_decoding)
+    after = measure("Telemetry: compiled decoder", compiled_telemetry_decoding)
+    print("{:<45} {:>12.2f}x".format("Speedup", after / before))
+    measure("Telemetry: compiled decoder (invalid value)", invalid_telemetry_decoding)
+
+    print("Payload size: JSON {} bytes, binary {} bytes, binary with {} readings {} bytes".format(
+        len(telemetry_payloads[0]), len(binary_payloads[0]), readings_per_binary_message,
+        len(multi_reading_binary_payloads[0])))
+    binary = measure("Telemetry: binary (1 reading)", binary_telemetry_decoding)
+    print("{:<45} {:>12.2f}x".format("Speedup vs compiled JSON decoder", binary / after))
+    multi_reading_binary = measure("Telemetry: binary ({} readings)".format(readings_per_binary_message),
+                                   multi_reading_binary_telemetry_decoding)
+    print("{:<45} {:>12,.0f} readings/s".format("", multi_reading_binary * readings_per_binary_message))
+
+    before = measure("Device: json.loads + DeviceCreationRequest(**)", original_device_decoding)
+    after = measure("Device: compiled decoder", compiled_device_decoding)
+    print("{:<45} {:>12.2f}x".format("Speedup", after / before))
+
+    before = measure("Topic: topic_matches_sub + split", original_topic_matching)
+    after = measure("Topic: compiled topic filter", compiled_topic_matching)
+    print("{:<45} {:>12.2f}x".format("Speedup", after / before))
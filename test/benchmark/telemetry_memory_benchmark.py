@@ -0,0 +1,53 @@
+# Memory benchmark comparing the original telemetry layout (list of TelemetryMessage objects)
+# with the columnar TelemetrySeries used by the DataManager.
+# Run it from the project root directory: python test/benchmark/telemetry_memory_benchmark.py
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from communication.mqtt.dto.telemetry_message import TelemetryMessage
+from data.manager.telemetry_series import TelemetrySeries
+
+# Configuration variables
+reading_count = 1000000
+data_type = "TEMPERATURE_SENSOR"
+start_timestamp = 1700000000
+
+
+def build_object_list():
+    """Original layout: one TelemetryMessage object for each reading in an unbounded list"""
+    telemetry_list = []
+    for index in range(reading_count):
+        telemetry_list.append(TelemetryMessage(start_timestamp + index, data_type, 20.0 + (index % 200) / 10.0))
+    return telemetry_list
+
+
+def build_columnar_series():
+    """New layout: columnar ring buffer with a capacity large enough to keep every reading"""
+    series = TelemetrySeries(reading_count)
+    for index in range(reading_count):
+        series.append(start_timestamp + index, data_type, 20.0 + (index % 200) / 10.0)
+    return series
+
+
+def measure(name, builder):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = builder()
+    elapsed = time.perf_counter() - start_time
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<32} readings: {len(result):>9} memory: {current / (1024 * 1024):8.1f} MiB "
+          f"({current / reading_count:6.1f} bytes/reading) peak: {peak / (1024 * 1024):8.1f} MiB "
+          f"build time: {elapsed:6.2f} s")
+    return current
+
+
+if __name__ == '__main__':
+    object_list_bytes = measure("List of TelemetryMessage", build_object_list)
+    columnar_bytes = measure("Columnar TelemetrySeries", build_columnar_series)
+    print(f"Memory reduction: {object_list_bytes / columnar_bytes:.1f}x")
@@ -0,0 +1,31 @@
+import json
+
+import requests
+
+LOCATION_ID = "l0001"
+DEVICE_COUNT = 20000
+
+# Target API URL
+api_url = "http://127.0.0.1:7070/api/iot/inventory/bulk/device"
+
+
+def generate_device_lines():
+    """Yield one JSON line per device (the body is sent with chunked transfer encoding)"""
+    for index in range(DEVICE_COUNT):
+        device_dictionary = {
+            "uuid": "bulk_device_{}".format(index),
+            "name": "Bulk Device {}".format(index),
+            "locationId": LOCATION_ID,
+            "type": "device.sensor",
+            "manufacturer": "ACME Inc",
+            "software_version": "0.0.1beta",
+            "latitude": 48.312321,
+            "longitude": 10.433423211
+        }
+        yield (json.dumps(device_dictionary) + "\n").encode("utf-8")
+
+
+# Send the POST Request with the newline-delimited JSON body
+response = requests.post(api_url, data=generate_device_lines(), headers={"Content-Type": "application/x-ndjson"})
+
+print(f'HTTP Response Code: {response.status_code} - Buffer Body: {response.content[:1000]}')
@@ -0,0 +1,50 @@
+# For this example we rely on the Paho MQTT Library for Python
+# You can install it through the following command: pip install paho-mqtt
+
+from model.temperature_sensor import TemperatureSensor
+from model.binary_message_descriptor import BinaryMessageDescriptor
+import paho.mqtt.client as mqtt
+import time
+
+
+# The callback for when the client receives a CONNACK response from the server.
+def on_connect(client, userdata, flags, rc):
+    print("Connected with result code " + str(rc))
+
+
+# Configuration variables
+device_id = "d0001"
+client_id = "clientId0001-BinaryProducer"
+broker_ip = "127.0.0.1"
+broker_port = 1883
+default_topic = "device/{}/temperature/bin".format(device_id)
+message_limit = 1000
+# Number of readings sent with each binary message (one reading per second)
+readings_per_message = 5
+
+mqtt_client = mqtt.Client(client_id)
+mqtt_client.on_connect = on_connect
+
+print("Connecting to "+ broker_ip + " port: " + str(broker_port))
+mqtt_client.connect(broker_ip, broker_port)
+
+mqtt_client.loop_start()
+
+# Create Demo Temperature Sensor
+temperature_sensor = TemperatureSensor()
+
+for message_id in range(message_limit):
+
+    # Collect the readings of the message
+    message_descriptor = BinaryMessageDescriptor()
+    for _ in range(readings_per_message):
+        temperature_sensor.measure_temperature()
+        message_descriptor.add_reading(time.time(), "TEMPERATURE_SENSOR", temperature_sensor.temperature_value)
+        time.sleep(1)
+
+    payload_bytes = message_descriptor.to_bytes()
+    infot = mqtt_client.publish(default_topic, payload_bytes)
+    infot.wait_for_publish()
+    print(f"Message Sent: {message_id} Topic: {default_topic} Readings: {readings_per_message} Size: {len(payload_bytes)} bytes")
+
+mqtt_client.loop_stop()
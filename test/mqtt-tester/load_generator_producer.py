@@ -0,0 +1,70 @@
+# For this example we rely on the Paho MQTT Library for Python
+# You can install it through the following command: pip install paho-mqtt
+# Configurable load generator publishing the telemetry of N simulated devices to an MQTT broker.
+# Example: python load_generator_producer.py --devices 1000 --rate 5000 --payload-size 128 --duration 60
+
+from model.load_generator import LoadGenerator
+import paho.mqtt.client as mqtt
+import argparse
+
+
+# The callback for when the client receives a CONNACK response from the server.
+def on_connect(client, userdata, flags, rc):
+    print("Connected with result code " + str(rc))
+
+
+parser = argparse.ArgumentParser(description="MQTT telemetry load generator")
+parser.add_argument("--broker-ip", default="127.0.0.1")
+parser.add_argument("--broker-port", type=int, default=1883)
+parser.add_argument("--client-id", default="clientId0001-LoadGenerator")
+parser.add_argument("--devices", type=int, default=100, help="number of simulated devices")
+parser.add_argument("--rate", type=float, default=1000, help="messages/sec (0 = as fast as possible)")
+parser.add_argument("--payload-size", type=int, default=0, help="minimum payload size in bytes")
+parser.add_argument("--burst-size", type=int, default=1, help="messages published back-to-back at each tick")
+parser.add_argument("--spike-rate", type=float, default=None, help="messages/sec during the spikes")
+parser.add_argument("--spike-period", type=float, default=None, help="seconds between the start of two spikes")
+parser.add_argument("--spike-duration", type=float, default=0, help="seconds of each spike")
+parser.add_argument("--readings-per-message", type=int, default=None,
+                    help="publish binary messages with this number of readings "
+                         "(with --topic-format device/{}/temperature/bin)")
+parser.add_argument("--topic-format", default="device/{}/temperature", help="topic of a device ({} is the device id)")
+parser.add_argument("--duration", type=float, default=60, help="seconds of load")
+parser.add_argument("--qos", type=int, default=0)
+arguments = parser.parse_args()
+
+load_generator = LoadGenerator(arguments.devices, arguments.rate, payload_size=arguments.payload_size,
+                               burst_size=arguments.burst_size, spike_rate=arguments.spike_rate,
+                               spike_period=arguments.spike_period, spike_duration=arguments.spike_duration,
+                               topic_format=arguments.topic_format,
+                               readings_per_message=arguments.readings_per_message)
+
+mqtt_client = mqtt.Client(arguments.client_id)
+mqtt_client.on_connect = on_connect
+# Do not limit the number of QoS 1/2 messages waiting for an acknowledgement
+mqtt_client.max_inflight_messages_set(0)
+mqtt_client.max_queued_messages_set(0)
+
+print("Connecting to " + arguments.broker_ip + " port: " + str(arguments.broker_port))
+mqtt_client.connect(arguments.broker_ip, arguments.broker_port)
+
+mqtt_client.loop_start()
+
+last_message_info = [None]
+
+
+def publish(topic, payload):
+    last_message_info[0] = mqtt_client.publish(topic, payload, qos=arguments.qos)
+
+
+published_count = load_generator.run(publish, duration=arguments.duration)
+
+# Wait until the queued messages have been sent before stopping the network loop
+if last_message_info[0] is not None:
+    last_message_info[0].wait_for_publish()
+
+mqtt_client.loop_stop()
+mqtt_client.disconnect()
+
+print("Published {} messages of {} devices in {:.1f} s: {:.0f} msg/s".format(
+    published_count, arguments.devices, load_generator.elapsed, published_count / load_generator.elapsed))
+print("Readings are stored only for registered devices: register load-d00000, load-d00001, ... through the REST API")
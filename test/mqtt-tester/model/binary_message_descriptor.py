@@ -0,0 +1,33 @@
+import struct
+
+
+class BinaryMessageDescriptor:
+    """
+    Compact binary telemetry message with one or more readings (little endian):
+    header (version, flags, data type count, record count), data type table (length + UTF-8 name)
+    and records (timestamp float64, data type index uint8, value float32)
+    """
+
+    VERSION = 1
+    HEADER_STRUCT = struct.Struct("<BBBH")
+    RECORD_STRUCT = struct.Struct("<dBf")
+
+    def __init__(self):
+        self.readings = []
+
+    def add_reading(self, timestamp, data_type, value):
+        self.readings.append((timestamp, data_type, value))
+
+    def to_bytes(self):
+        data_type_indexes = {}
+        for _, data_type, _ in self.readings:
+            data_type_indexes.setdefault(data_type, len(data_type_indexes))
+
+        payload = bytearray(self.HEADER_STRUCT.pack(self.VERSION, 0, len(data_type_indexes), len(self.readings)))
+        for data_type in data_type_indexes:
+            encoded_data_type = data_type.encode("utf-8")
+            payload.append(len(encoded_data_type))
+            payload += encoded_data_type
+        for timestamp, data_type, value in self.readings:
+            payload += self.RECORD_STRUCT.pack(timestamp, data_type_indexes[data_type], value)
+        return bytes(payload)
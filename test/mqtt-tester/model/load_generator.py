@@ -0,0 +1,105 @@
+import json
+import time
+
+from model.binary_message_descriptor import BinaryMessageDescriptor
+
+
+class LoadGenerator:
+    """
+    Telemetry load of N simulated devices published at a target rate.
+    - rate: average messages/sec (0 publishes as fast as possible)
+    - payload_size: minimum JSON payload size in bytes (padded with an extra "padding" field)
+    - readings_per_message: if set, every message is a binary payload (BinaryMessageDescriptor) carrying
+      this number of readings instead of a JSON reading (publish it on the binary telemetry topic)
+    - burst_size: messages published back-to-back at each tick (same average rate)
+    - spike_rate, spike_period, spike_duration: the rate is spike_rate during the first
+      spike_duration seconds of every spike_period seconds
+    The timestamp of each reading is its publish time (time.time()), so consumers can measure the latency.
+    Devices are published round-robin: every device sends one reading every device_count messages.
+    """
+
+    def __init__(self, device_count: int, rate: float, payload_size: int = 0, burst_size: int = 1,
+                 spike_rate: float = None, spike_period: float = None, spike_duration: float = 0,
+                 topic_format: str = "device/{}/temperature", device_id_format: str = "load-d{:05d}",
+                 data_type: str = "TEMPERATURE_SENSOR", readings_per_message: int = None):
+
+        if device_count <= 0 or burst_size <= 0:
+            raise ValueError("Error creating the LoadGenerator ! device_count and burst_size must be positive !")
+
+        self.device_count = device_count
+        self.rate = rate
+        self.payload_size = payload_size
+        self.burst_size = burst_size
+        self.spike_rate = spike_rate
+        self.spike_period = spike_period
+        self.spike_duration = spike_duration
+        self.data_type = data_type
+        self.readings_per_message = readings_per_message
+
+        self.device_ids = [device_id_format.format(index) for index in range(device_count)]
+        self.topics = [topic_format.format(device_id) for device_id in self.device_ids]
+
+        # Statistics of the last run
+        self.published_messages = 0
+        self.elapsed = 0
+
+    def current_rate(self, elapsed: float):
+        """Return the target rate at elapsed seconds since the start of the run"""
+        if self.spike_rate is not None and self.spike_period and elapsed % self.spike_period < self.spike_duration:
+            return self.spike_rate
+        return self.rate
+
+    def build_payload(self, timestamp: float, value: float):
+        """Return the JSON payload of a reading padded to payload_size bytes
+        (or the binary payload of readings_per_message readings)"""
+        if self.readings_per_message is not None:
+            message_descriptor = BinaryMessageDescriptor()
+            for _ in range(self.readings_per_message):
+                message_descriptor.add_reading(timestamp, self.data_type, value)
+            return message_descriptor.to_bytes()
+
+        payload = json.dumps({"timestamp": timestamp, "data_type": self.data_type, "value": value})
+        missing = self.payload_size - len(payload)
+        if missing > 0:
+            # ', "padding": ""' adds 15 bytes before the padding characters
+            payload = payload[:-1] + ', "padding": "{}"}}'.format("x" * max(0, missing - 15))
+        return payload.encode("utf-8")
+
+    def run(self, publish, duration: float = None, message_limit: int = None):
+        """
+        Publish readings calling publish(topic, payload) until duration seconds or message_limit messages
+        :return: Number of published messages
+        """
+        if duration is None and message_limit is None:
+            raise ValueError("Error running the LoadGenerator ! A duration or a message limit is required !")
+
+        start_time = time.perf_counter()
+        next_tick = start_time
+        message_count = 0
+        device_index = 0
+
+        while True:
+            elapsed = time.perf_counter() - start_time
+            if duration is not None and elapsed >= duration:
+                break
+            if message_limit is not None and message_count >= message_limit:
+                break
+
+            # Wait for the next tick of the current rate
+            rate = self.current_rate(elapsed)
+            if rate:
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                # Do not accumulate a backlog of ticks if the publisher is slower than the target rate
+                next_tick = max(next_tick, time.perf_counter() - 1.0) + self.burst_size / rate
+
+            burst_size = self.burst_size if message_limit is None else min(self.burst_size, message_limit - message_count)
+            for _ in range(burst_size):
+                publish(self.topics[device_index], self.build_payload(time.time(), 20.0 + device_index % 20))
+                device_index = (device_index + 1) % self.device_count
+            message_count += burst_size
+
+        self.published_messages = message_count
+        self.elapsed = time.perf_counter() - start_time
+        return message_count